@@ -0,0 +1,169 @@
+import sys
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from risk_engine import (RISK_FACTORS, RISK_LEVELS, RECOMMENDATIONS, RECOMMENDED_ACTIONS, feature_matrix,
+                         contribution_matrix, heuristic_scores, risk_level_codes, contributions_by_factor)
+from bulk_export import format_text_report, report_frame
+
+_LEVEL_CODES = {level: code for code, level in enumerate(RISK_LEVELS)}
+
+
+class AssessmentResult:
+    """One assessment: numbers only, with every display string formatted on demand
+
+    Slots keep a result to a handful of machine values (score, level code, contribution
+    row and timestamp) instead of a dict of string keys and pre-formatted strings.
+    """
+
+    __slots__ = ('risk_score', 'level_code', 'contributions', 'assessed_at', 'patient_id', 'patient')
+
+    def __init__(self, risk_score, risk_level, contributions, patient=None, patient_id=None, assessed_at=None):
+        self.risk_score = float(risk_score)
+        self.level_code = _LEVEL_CODES[risk_level]
+        self.contributions = contributions
+        self.assessed_at = (assessed_at or datetime.now()).timestamp()
+        self.patient_id = patient_id
+        # The caller's input mapping, kept by reference for exports
+        self.patient = patient
+
+    @property
+    def risk_level(self):
+        return RISK_LEVELS[self.level_code]
+
+    @property
+    def recommendations(self):
+        return RECOMMENDATIONS[self.risk_level]
+
+    @property
+    def recommended_action(self):
+        return RECOMMENDED_ACTIONS[self.risk_level]
+
+    @property
+    def assessed_datetime(self):
+        return datetime.fromtimestamp(self.assessed_at)
+
+    @property
+    def factor_contributions(self):
+        """{display name: contribution}, built when asked for"""
+        return contributions_by_factor(self.contributions)
+
+    def text_report(self):
+        return format_text_report(self.patient, self.risk_score, self.risk_level, self.recommendations,
+                                  self.factor_contributions, self.assessed_datetime)
+
+    def report_frame(self):
+        """The app's one-row CSV layout"""
+        return report_frame(pd.DataFrame([self.patient]), np.array([self.risk_score]), [self.risk_level],
+                            np.asarray(self.contributions)[np.newaxis, :], self.assessed_datetime)
+
+    def __repr__(self):
+        return f"AssessmentResult(patient_id={self.patient_id!r}, risk_score={self.risk_score:.3f}, risk_level={self.risk_level!r})"
+
+
+class AssessmentBatch:
+    """Struct-of-arrays container for many assessments
+
+    Scores, int8 level codes, the contribution matrix and timestamps are stored as one array
+    each, so a result costs roughly 100 bytes rather than a dict per patient. Indexing yields
+    an AssessmentResult view; strings are only produced by the export methods. `patients`
+    is the scored input rows, kept by reference (not counted in nbytes) so items and
+    exports can show them.
+    """
+
+    def __init__(self, risk_scores, level_codes, contributions, assessed_at, patient_ids=None, patients=None):
+        self.risk_scores = np.asarray(risk_scores, dtype=np.float64)
+        self.level_codes = np.asarray(level_codes, dtype=np.int8)
+        self.contributions = np.asarray(contributions)
+        self.assessed_at = np.asarray(assessed_at, dtype=np.float64)
+        self.patient_ids = None if patient_ids is None else np.asarray(patient_ids)
+        self.patients = patients
+
+    @classmethod
+    def score(cls, records, patient_ids=None, assessed_at=None, contribution_dtype=np.float32):
+        """Score a DataFrame, list of dicts or raw feature matrix in one vectorized pass"""
+        if isinstance(records, np.ndarray):
+            matrix = records
+            # A view of the matrix, so items still carry their factor values
+            patients = pd.DataFrame(matrix, columns=RISK_FACTORS, copy=False)
+        else:
+            matrix = feature_matrix(records)
+            patients = records if isinstance(records, pd.DataFrame) else pd.DataFrame(
+                [records] if isinstance(records, dict) else list(records))
+            if patient_ids is None and 'patient_id' in patients:
+                patient_ids = patients['patient_id'].to_numpy()
+        contributions = contribution_matrix(matrix)
+        scores = heuristic_scores(None, contributions)
+        timestamp = (assessed_at or datetime.now()).timestamp()
+        return cls(scores, risk_level_codes(scores), contributions.astype(contribution_dtype, copy=False),
+                   np.full(len(scores), timestamp), patient_ids, patients)
+
+    @classmethod
+    def concat(cls, batches):
+        batches = list(batches)
+        ids = None
+        if all(batch.patient_ids is not None for batch in batches):
+            ids = np.concatenate([batch.patient_ids for batch in batches])
+        patients = None
+        if all(batch.patients is not None for batch in batches):
+            patients = pd.concat([batch.patients for batch in batches], ignore_index=True)
+        return cls(np.concatenate([batch.risk_scores for batch in batches]),
+                   np.concatenate([batch.level_codes for batch in batches]),
+                   np.concatenate([batch.contributions for batch in batches]),
+                   np.concatenate([batch.assessed_at for batch in batches]), ids, patients)
+
+    def __len__(self):
+        return len(self.risk_scores)
+
+    def __getitem__(self, i):
+        return AssessmentResult(self.risk_scores[i], RISK_LEVELS[self.level_codes[i]], self.contributions[i],
+                                patient=None if self.patients is None else self.patients.iloc[i].to_dict(),
+                                patient_id=None if self.patient_ids is None else self.patient_ids[i:i + 1].tolist()[0],
+                                assessed_at=datetime.fromtimestamp(self.assessed_at[i]))
+
+    @property
+    def risk_levels(self):
+        return np.array(RISK_LEVELS, dtype=object)[self.level_codes]
+
+    @property
+    def nbytes(self):
+        arrays = [self.risk_scores, self.level_codes, self.contributions, self.assessed_at]
+        if self.patient_ids is not None:
+            arrays.append(self.patient_ids)
+        return sum(array.nbytes for array in arrays)
+
+    def level_counts(self):
+        """Number of assessments per risk level, without materialising level names"""
+        counts = np.bincount(self.level_codes, minlength=len(RISK_LEVELS))
+        return dict(zip(RISK_LEVELS, counts.tolist()))
+
+    def report_frame(self, patients=None):
+        """The app's CSV layout for these results; `patients` defaults to the scored input rows"""
+        patients = self.patients if patients is None else patients
+        return report_frame(patients, self.risk_scores, self.risk_levels, self.contributions,
+                            datetime.fromtimestamp(self.assessed_at[0]) if len(self) else None)
+
+
+if __name__ == "__main__":
+    from data_generator import MentalHealthDataGenerator
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    patients = MentalHealthDataGenerator(seed=42).generate_dataset(n)
+    batch = AssessmentBatch.score(patients)
+
+    # Size of the same results held the old way, as dicts with formatted strings
+    sample = [{
+        'risk_score': float(score),
+        'risk_level': level,
+        'risk_percentage': f"{score * 100:.1f}%",
+        'recommendations': RECOMMENDATIONS[level],
+        'contributions': {k: f"{v:.3f}" for k, v in contributions_by_factor(row).items()}
+    } for score, level, row in zip(batch.risk_scores[:1000], batch.risk_levels[:1000], batch.contributions[:1000])]
+    dict_bytes = sum(sys.getsizeof(d) + sum(sys.getsizeof(v) for v in d.values())
+                     + sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in d['contributions'].items())
+                     for d in sample) / len(sample)
+
+    print(f"{len(batch):,} results: {batch.nbytes / 1024**2:.1f} MB as arrays "
+          f"({batch.nbytes / len(batch):.0f} bytes each) vs ~{dict_bytes:.0f} bytes each as dicts")
+    print(batch.level_counts())
+    print(batch[0])
@@ -0,0 +1,213 @@
+import json
+import sqlite3
+import threading
+import pandas as pd
+from datetime import datetime
+
+STORE_PATH = 'assessments.db'
+
+# A slope is only reported once a patient's visits span at least this many days; over
+# shorter spans a few points of score noise would read as a huge change per day
+MIN_TREND_SPAN_DAYS = 1.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS assessments (
+    id INTEGER PRIMARY KEY,
+    patient_id TEXT NOT NULL,
+    assessed_at REAL NOT NULL,
+    risk_score REAL NOT NULL,
+    risk_level TEXT NOT NULL,
+    inputs TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_assessments_patient_time ON assessments (patient_id, assessed_at);
+CREATE TABLE IF NOT EXISTS patient_trends (
+    patient_id TEXT PRIMARY KEY,
+    n INTEGER NOT NULL,
+    first_at REAL NOT NULL,
+    last_at REAL NOT NULL,
+    last_score REAL NOT NULL,
+    last_level TEXT NOT NULL,
+    window_sum REAL NOT NULL,
+    mean_t REAL NOT NULL,
+    mean_y REAL NOT NULL,
+    m2_t REAL NOT NULL,
+    c_ty REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def _update_moments(n, mean_t, mean_y, m2_t, c_ty, t, y):
+    """One Welford step: running means of t and y, squared t deviations and the t-y co-moment"""
+    n += 1
+    dt = t - mean_t
+    mean_t += dt / n
+    mean_y += (y - mean_y) / n
+    m2_t += dt * (t - mean_t)
+    c_ty += dt * (y - mean_y)
+    return n, mean_t, mean_y, m2_t, c_ty
+
+
+class AssessmentStore:
+    """Append-only SQLite store of assessments with incrementally maintained per-patient trends
+
+    History lookups use the (patient_id, assessed_at) index. Each patient's trend row keeps
+    running aggregates, so the rolling mean over the last `window` assessments and the
+    least-squares slope (score change per day) are updated in O(log n) per append without
+    rescanning history. The slope uses Welford-style running means and co-moments, which stay
+    accurate when visits are close together, unlike raw sums of t and t squared.
+    """
+
+    def __init__(self, path=STORE_PATH, window=5):
+        self.path = path
+        self.default_window = window
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._migrate_trends()
+
+        # The rolling window is fixed for the lifetime of the store
+        row = self._conn.execute("SELECT value FROM store_meta WHERE key = 'window'").fetchone()
+        if row is None:
+            with self._conn:
+                self._conn.execute("INSERT INTO store_meta (key, value) VALUES ('window', ?)", (str(window),))
+            self.window = window
+        else:
+            self.window = int(row[0])
+
+    def close(self):
+        self._conn.close()
+
+    def _migrate_trends(self):
+        """Rebuild trend rows kept as raw sums by older versions of the store, once"""
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(patient_trends)")]
+        if 'sum_tt' not in columns:
+            return
+        row = self._conn.execute("SELECT value FROM store_meta WHERE key = 'window'").fetchone()
+        window = int(row[0]) if row else self.default_window
+
+        trends = {}
+        for patient_id, assessed_at, risk_score, risk_level in self._conn.execute(
+                "SELECT patient_id, assessed_at, risk_score, risk_level FROM assessments "
+                "ORDER BY patient_id, assessed_at"):
+            if patient_id not in trends:
+                trends[patient_id] = {'first_at': assessed_at, 'moments': (0, 0.0, 0.0, 0.0, 0.0), 'recent': []}
+            trend = trends[patient_id]
+            trend['moments'] = _update_moments(*trend['moments'], (assessed_at - trend['first_at']) / 86400,
+                                               risk_score)
+            trend['recent'] = (trend['recent'] + [risk_score])[-window:]
+            trend['last'] = (assessed_at, risk_score, risk_level)
+
+        with self._conn:
+            self._conn.execute("DROP TABLE patient_trends")
+            self._conn.executescript(SCHEMA)
+            self._conn.executemany(
+                "INSERT INTO patient_trends "
+                "(patient_id, n, first_at, last_at, last_score, last_level, window_sum, mean_t, mean_y, m2_t, c_ty) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(patient_id, trend['moments'][0], trend['first_at'], *trend['last'], sum(trend['recent']),
+                  *trend['moments'][1:]) for patient_id, trend in trends.items()]
+            )
+
+    def record(self, patient_id, risk_score, risk_level, inputs=None, assessed_at=None):
+        """Append one assessment and update the patient's trend aggregates"""
+        assessed_at = (assessed_at or datetime.now()).timestamp()
+        patient_id = str(patient_id)
+
+        with self._lock, self._conn:
+            trend = self._conn.execute(
+                "SELECT n, first_at, last_at, window_sum, mean_t, mean_y, m2_t, c_ty "
+                "FROM patient_trends WHERE patient_id = ?", (patient_id,)
+            ).fetchone()
+
+            if trend is None:
+                n, first_at, window_sum, mean_t, mean_y, m2_t, c_ty = 0, assessed_at, 0.0, 0.0, 0.0, 0.0, 0.0
+            else:
+                n, first_at, last_at, window_sum, mean_t, mean_y, m2_t, c_ty = trend
+                if assessed_at < last_at:
+                    raise ValueError(f"Assessment for patient {patient_id} is older than their latest one")
+
+            # Drop the score that falls out of the rolling window
+            if n >= self.window:
+                evicted = self._conn.execute(
+                    "SELECT risk_score FROM assessments WHERE patient_id = ? "
+                    "ORDER BY assessed_at DESC LIMIT 1 OFFSET ?", (patient_id, self.window - 1)
+                ).fetchone()[0]
+                window_sum -= evicted
+            window_sum += risk_score
+
+            # Running moments for the least-squares slope, with time in days since the first visit
+            n, mean_t, mean_y, m2_t, c_ty = _update_moments(n, mean_t, mean_y, m2_t, c_ty,
+                                                            (assessed_at - first_at) / 86400, risk_score)
+
+            self._conn.execute(
+                "INSERT INTO assessments (patient_id, assessed_at, risk_score, risk_level, inputs) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (patient_id, assessed_at, risk_score, risk_level, json.dumps(inputs) if inputs else None)
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO patient_trends "
+                "(patient_id, n, first_at, last_at, last_score, last_level, window_sum, mean_t, mean_y, m2_t, c_ty) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (patient_id, n, first_at, assessed_at, risk_score, risk_level,
+                 window_sum, mean_t, mean_y, m2_t, c_ty)
+            )
+
+        return self.trend(patient_id)
+
+    def history(self, patient_id, since=None, until=None, limit=None):
+        """Assessments of one patient in chronological order, optionally within a time range"""
+        query = "SELECT assessed_at, risk_score, risk_level, inputs FROM assessments WHERE patient_id = ?"
+        params = [str(patient_id)]
+        if since is not None:
+            query += " AND assessed_at >= ?"
+            params.append(since.timestamp())
+        if until is not None:
+            query += " AND assessed_at <= ?"
+            params.append(until.timestamp())
+        query += " ORDER BY assessed_at"
+        if limit is not None:
+            # Most recent `limit` rows, still returned oldest first
+            query = f"SELECT * FROM ({query} DESC LIMIT ?) ORDER BY assessed_at"
+            params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+
+        history = pd.DataFrame(rows, columns=['assessed_at', 'risk_score', 'risk_level', 'inputs'])
+        history['assessed_at'] = [datetime.fromtimestamp(at) for at in history['assessed_at']]
+        history['inputs'] = [json.loads(inputs) if inputs else None for inputs in history['inputs']]
+        return history
+
+    def trend(self, patient_id):
+        """Current trend aggregates of one patient, or None if they have no assessments
+
+        slope_per_day is None until the visits span MIN_TREND_SPAN_DAYS.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT n, first_at, last_at, last_score, last_level, window_sum, mean_y, m2_t, c_ty "
+                "FROM patient_trends WHERE patient_id = ?", (str(patient_id),)
+            ).fetchone()
+        if row is None:
+            return None
+
+        n, first_at, last_at, last_score, last_level, window_sum, mean_y, m2_t, c_ty = row
+        span_days = (last_at - first_at) / 86400
+        slope = c_ty / m2_t if n > 1 and span_days >= MIN_TREND_SPAN_DAYS and m2_t > 0 else None
+
+        return {
+            'assessments': n,
+            'last_assessed_at': datetime.fromtimestamp(last_at),
+            'last_score': last_score,
+            'last_level': last_level,
+            'rolling_mean': window_sum / min(n, self.window),
+            'mean': mean_y,
+            'span_days': span_days,
+            'slope_per_day': slope
+        }
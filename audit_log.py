@@ -0,0 +1,390 @@
+import os
+import json
+import time
+import queue
+import atexit
+import shutil
+import sqlite3
+import hashlib
+import argparse
+import tempfile
+import threading
+import pandas as pd
+from datetime import datetime
+from risk_engine import RISK_WEIGHTS, FACTOR_SCALES, RISK_LEVEL_CUTOFFS
+
+AUDIT_PATH = 'audit_log.jsonl'
+
+# When written batches are forced to disk: after every batch, at most every
+# fsync_interval seconds, or never (left to the operating system)
+FSYNC_POLICIES = ('batch', 'interval', 'never')
+
+# Columns of every audit record, in file and table order
+AUDIT_FIELDS = ['recorded_at', 'event', 'patient_id', 'risk_score', 'risk_level', 'inputs', 'version', 'backend']
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS audit_log (
+    id INTEGER PRIMARY KEY,
+    recorded_at TEXT NOT NULL,
+    event TEXT NOT NULL,
+    patient_id TEXT,
+    risk_score REAL,
+    risk_level TEXT,
+    inputs TEXT,
+    version TEXT,
+    backend TEXT
+);
+"""
+
+_STOP = object()
+
+
+def _json_default(value):
+    # numpy scalars and other values from DataFrames
+    return value.item() if hasattr(value, 'item') else str(value)
+
+
+def scoring_version():
+    """Short fingerprint of the scoring rules (weights, scales and cutoffs)
+
+    Changes whenever the heuristic changes, so every audit record says which rules
+    produced its score.
+    """
+    rules = json.dumps([RISK_WEIGHTS, FACTOR_SCALES, RISK_LEVEL_CUTOFFS], sort_keys=True)
+    return hashlib.sha1(rules.encode()).hexdigest()[:12]
+
+
+def _rotated_paths(path, backups):
+    return [f"{path}.{i}" for i in range(1, backups + 1)]
+
+
+def _rotate(path, backups):
+    """Shift path -> path.1 -> path.2 ..., dropping the oldest beyond `backups`"""
+    if backups <= 0:
+        os.remove(path)
+        return
+    paths = [path] + _rotated_paths(path, backups)
+    for older, newer in reversed(list(zip(paths[:-1], paths[1:]))):
+        if os.path.exists(older):
+            os.replace(older, newer)
+
+
+class _JsonlAuditSink:
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def write(self, records):
+        self._file.write(''.join(json.dumps(record, separators=(',', ':'), default=_json_default) + '\n'
+                                 for record in records))
+        self._file.flush()
+
+    def fsync(self):
+        os.fsync(self._file.fileno())
+
+    def size(self):
+        return self._file.tell()
+
+    def close(self):
+        self._file.close()
+
+
+class _SqliteAuditSink:
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # Each batch is one transaction; durability is left to the fsync policy
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.executescript(SQLITE_SCHEMA)
+
+    def write(self, records):
+        with self._conn:
+            self._conn.executemany(
+                f"INSERT INTO audit_log ({', '.join(AUDIT_FIELDS)}) VALUES ({', '.join('?' * len(AUDIT_FIELDS))})",
+                [tuple(json.dumps(record[field], default=_json_default) if field == 'inputs' else record[field] for field in AUDIT_FIELDS)
+                 for record in records]
+            )
+
+    def fsync(self):
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def size(self):
+        return os.path.getsize(self.path)
+
+    def close(self):
+        self._conn.close()
+
+
+AUDIT_SINKS = {
+    'jsonl': _JsonlAuditSink,
+    'sqlite': _SqliteAuditSink
+}
+
+
+class AuditLog:
+    """Append-only audit trail of assessments, written in batches by a background thread
+
+    record() only puts the event on a bounded in-memory queue, so callers never wait for
+    disk. The writer thread takes up to batch_size events at a time (or whatever arrived
+    within flush_interval), appends them to a JSON lines file or SQLite database in one
+    write, applies the fsync policy and rotates the file once it exceeds max_bytes.
+
+    When the queue is full, record() waits up to block_timeout seconds for room and then
+    drops the event, counting it in `dropped`; memory therefore never grows past
+    max_queue events. A batch whose write fails is retried write_retries times with
+    exponential backoff from retry_backoff seconds; if it still fails, its events are
+    counted in `failed` and the error is kept in `error`.
+    """
+
+    def __init__(self, path=AUDIT_PATH, fmt=None, max_queue=10000, batch_size=256, flush_interval=0.5,
+                 fsync='batch', fsync_interval=5.0, max_bytes=50 * 1024**2, backups=5, block_timeout=1.0,
+                 write_retries=3, retry_backoff=0.1):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy '{fsync}' (expected one of {', '.join(FSYNC_POLICIES)})")
+        if fmt is None:
+            fmt = 'sqlite' if os.path.splitext(path)[1].lower() in ('.db', '.sqlite') else 'jsonl'
+        if fmt not in AUDIT_SINKS:
+            raise ValueError(f"Unknown audit log format '{fmt}' (expected one of {', '.join(AUDIT_SINKS)})")
+
+        self.path = path
+        self.fmt = fmt
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.block_timeout = block_timeout
+        self.write_retries = write_retries
+        self.retry_backoff = retry_backoff
+        self.version = scoring_version()
+
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        self.rotations = 0
+        self.error = None
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._sink = AUDIT_SINKS[fmt](path)
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._last_fsync = time.monotonic()
+        self._unsynced = False
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+        self._thread.start()
+        # Daemon thread: make sure queued events reach the file when the process exits
+        atexit.register(self.close)
+
+    def record(self, event='assessment', patient_id=None, risk_score=None, risk_level=None, inputs=None,
+               backend=None, recorded_at=None):
+        """Queue one event; returns False if it had to be dropped because the queue stayed full"""
+        if self._closed:
+            raise RuntimeError("Audit log is closed")
+        if not self._thread.is_alive():
+            # Nothing would ever drain the queue; drop instead of blocking every caller
+            self.dropped += 1
+            return False
+        record = {
+            'recorded_at': (recorded_at or datetime.now()).isoformat(timespec='microseconds'),
+            'event': event,
+            'patient_id': None if patient_id is None else str(patient_id),
+            'risk_score': None if risk_score is None else float(risk_score),
+            'risk_level': risk_level,
+            # Copied, so later changes to the caller's dict do not reach the log
+            'inputs': None if inputs is None else dict(inputs),
+            'version': self.version,
+            'backend': backend
+        }
+        try:
+            self._queue.put(record, timeout=self.block_timeout)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def log_assessment(self, result, backend=None):
+        """Queue an AssessmentResult"""
+        return self.record('assessment', patient_id=result.patient_id, risk_score=result.risk_score,
+                           risk_level=result.risk_level, inputs=result.patient, backend=backend,
+                           recorded_at=result.assessed_datetime)
+
+    def _next_batch(self):
+        """Block for the first event, then take whatever else is queued up to batch_size"""
+        try:
+            first = self._queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return [], False
+        batch = [first]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        stop = any(record is _STOP for record in batch)
+        return [record for record in batch if record is not _STOP], stop
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch, stop = self._next_batch()
+            try:
+                if batch:
+                    if self._write_batch(batch):
+                        self.written += len(batch)
+                        self.batches += 1
+                        self._unsynced = True
+                    else:
+                        self.failed += len(batch)
+                self._apply_fsync_policy()
+                if batch and self.max_bytes and self._sink.size() >= self.max_bytes:
+                    self._rotate()
+            except Exception as e:
+                # Keep the thread alive so the queue keeps draining; surface the error via .error
+                self.error = e
+            finally:
+                for _ in range(len(batch) + stop):
+                    self._queue.task_done()
+
+    def _write_batch(self, batch):
+        """Write a batch, retrying with exponential backoff; False once every attempt has failed"""
+        for attempt in range(self.write_retries + 1):
+            try:
+                self._sink.write(batch)
+                return True
+            except Exception as e:
+                self.error = e
+                if attempt < self.write_retries:
+                    time.sleep(self.retry_backoff * 2 ** attempt)
+        return False
+
+    def _apply_fsync_policy(self):
+        if not self._unsynced or self.fsync == 'never':
+            return
+        now = time.monotonic()
+        if self.fsync == 'batch' or now - self._last_fsync >= self.fsync_interval:
+            self._sink.fsync()
+            self._last_fsync = now
+            self._unsynced = False
+
+    def _rotate(self):
+        self._sink.fsync()
+        self._sink.close()
+        _rotate(self.path, self.backups)
+        self._sink = AUDIT_SINKS[self.fmt](self.path)
+        self._unsynced = False
+        self.rotations += 1
+
+    def flush(self):
+        """Wait until every event queued so far has been written, or the writer has stopped"""
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks and self._thread.is_alive():
+                self._queue.all_tasks_done.wait(0.1)
+
+    def close(self):
+        """Write everything still queued, fsync and stop the writer thread"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        try:
+            self._sink.fsync()
+            self._sink.close()
+        except Exception as e:
+            self.error = e
+        atexit.unregister(self.close)
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize(),
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'batches': self.batches,
+            'rotations': self.rotations,
+            'writer_alive': self._thread.is_alive(),
+            'error': None if self.error is None else str(self.error)
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def read_audit_log(path=AUDIT_PATH, backups=5):
+    """All audit records, oldest first, including rotated files"""
+    paths = [p for p in reversed(_rotated_paths(path, backups)) if os.path.exists(p)]
+    if os.path.exists(path):
+        paths.append(path)
+    sqlite = os.path.splitext(path)[1].lower() in ('.db', '.sqlite')
+
+    frames = []
+    for p in paths:
+        if sqlite:
+            with sqlite3.connect(p) as conn:
+                frame = pd.read_sql_query(f"SELECT {', '.join(AUDIT_FIELDS)} FROM audit_log ORDER BY id", conn)
+            frame['inputs'] = [json.loads(inputs) if inputs else None for inputs in frame['inputs']]
+        else:
+            with open(p, encoding='utf-8') as f:
+                frame = pd.DataFrame([json.loads(line) for line in f], columns=AUDIT_FIELDS)
+        frames.append(frame)
+    if not frames:
+        return pd.DataFrame(columns=AUDIT_FIELDS)
+    return pd.concat(frames, ignore_index=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect the audit log, or compare queued and synchronous writes")
+    parser.add_argument('path', nargs='?', default=None,
+                        help=f"Audit log to read (default: {AUDIT_PATH}); for --benchmark, a scratch file "
+                             "to write (default: a temporary file, deleted afterwards)")
+    parser.add_argument('--tail', type=int, default=10, help="Show this many of the latest records")
+    parser.add_argument('--benchmark', type=int, default=0,
+                        help="Write this many test events, queued and then synchronously, and compare latency")
+    parser.add_argument('--fsync', choices=FSYNC_POLICIES, default='batch')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        inputs = {factor: 1 for factor in RISK_WEIGHTS}
+        # Never write synthetic events into the real audit trail unless asked to
+        scratch_dir = tempfile.mkdtemp(prefix='audit_benchmark_') if args.path is None else None
+        path = args.path or os.path.join(scratch_dir, 'audit_benchmark.jsonl')
+
+        with AuditLog(path, fsync=args.fsync) as audit:
+            start = time.perf_counter()
+            for i in range(args.benchmark):
+                audit.record('benchmark', patient_id=i, risk_score=0.5, risk_level='High', inputs=inputs)
+            queued = time.perf_counter() - start
+            audit.flush()
+            total = time.perf_counter() - start
+        print(f"Queued: {queued / args.benchmark * 1e6:,.1f} us per record on the caller, "
+              f"{total:.2f}s until all {audit.written:,} were on disk in {audit.batches:,} batches")
+
+        # One write and fsync per record, as a synchronous logger would do
+        sink = AUDIT_SINKS[audit.fmt](path)
+        start = time.perf_counter()
+        for i in range(args.benchmark):
+            sink.write([{'recorded_at': datetime.now().isoformat(timespec='microseconds'), 'event': 'benchmark',
+                         'patient_id': str(i), 'risk_score': 0.5, 'risk_level': 'High', 'inputs': inputs,
+                         'version': audit.version, 'backend': None}])
+            sink.fsync()
+        sink.close()
+        synchronous = time.perf_counter() - start
+        print(f"Synchronous: {synchronous / args.benchmark * 1e6:,.1f} us per record on the caller")
+        if scratch_dir is not None:
+            shutil.rmtree(scratch_dir)
+    else:
+        path = args.path or AUDIT_PATH
+        records = read_audit_log(path)
+        print(f"{len(records):,} audit records in {path} and its rotated files")
+        if len(records):
+            print(records.tail(args.tail).drop(columns=['inputs']).to_string(index=False))
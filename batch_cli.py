@@ -0,0 +1,199 @@
+import os
+import time
+import argparse
+import pandas as pd
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from risk_engine import RISK_LEVELS, RECOMMENDATIONS
+from bulk_export import BulkExporter, SINKS
+from ingestion import validate_batch
+from scoring_backends import BACKENDS, get_backend
+
+# PDF generator of each PDF worker process, created once by init_pdf_worker
+_pdf_generator = None
+
+# Scoring backend of each scoring worker process, chosen once by init_score_worker
+_scoring_backend = None
+
+_LEVEL_NAMES = np.array(RISK_LEVELS, dtype=object)
+
+
+def read_chunks(path, chunksize=100000):
+    """Stream a CSV, JSON lines or Parquet input as DataFrame chunks"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        yield from pd.read_csv(path, chunksize=chunksize)
+    elif extension in ('.jsonl', '.json'):
+        yield from pd.read_json(path, lines=True, chunksize=chunksize)
+    elif extension == '.parquet':
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet input requires pyarrow: pip install pyarrow")
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        raise ValueError(f"Unsupported input format: {path} (expected .csv, .jsonl or .parquet)")
+
+
+def score_chunk(chunk):
+    """Validate and score one chunk: (valid mask, rejection reasons, scores, levels, contributions)
+
+    Scores, levels and contributions cover the valid rows only.
+    """
+    batch = validate_batch(chunk)
+    scores, codes, contributions = (_scoring_backend or get_backend()).score(batch.valid_matrix())
+    return batch.valid, batch.error_messages(), scores, _LEVEL_NAMES[codes], contributions
+
+
+def init_score_worker(backend=None):
+    global _scoring_backend
+    _scoring_backend = get_backend(backend)
+
+
+def bounded_map(pool, fn, iterable, window):
+    """Like pool.map, in order, but with at most `window` tasks in flight
+
+    Keeps memory bounded when the input is much larger than RAM.
+    """
+    pending = deque()
+    for item in iterable:
+        pending.append((item, pool.submit(fn, item)))
+        if len(pending) >= window:
+            item, future = pending.popleft()
+            yield item, future.result()
+    while pending:
+        item, future = pending.popleft()
+        yield item, future.result()
+
+
+def init_pdf_worker():
+    global _pdf_generator
+    from pdf_generator import MentalHealthPDFGenerator
+    _pdf_generator = MentalHealthPDFGenerator()
+
+
+def render_pdf(job):
+    """Render one patient's PDF in a worker process and return the bytes written"""
+    path, patient_data, risk_score, risk_level, contributions = job
+    with open(path, 'wb') as f:
+        return _pdf_generator.write_pdf_report(f, patient_data, risk_score, risk_level,
+                                               RECOMMENDATIONS[risk_level], contributions)
+
+
+def pdf_jobs(chunk, scores, levels, contributions, pdf_dir):
+    """One render job per patient; files are named by patient_id, or by row number without one"""
+    for i, patient_data in enumerate(chunk.to_dict('records')):
+        name = patient_data.get('patient_id', chunk.index[i])
+        yield (os.path.join(pdf_dir, f"patient_{name}.pdf"), patient_data,
+               float(scores[i]), levels[i], contributions[i])
+
+
+def run_batch(input_path, outputs, workers=None, chunksize=100000, pdf_dir=None, pdf_workers=None, rejects=None,
+              backend=None):
+    """Score an input file with a process pool, export it and optionally render PDFs
+
+    Rows failing schema validation are skipped and, if `rejects` is a path, written there
+    as CSV with an `errors` column describing every problem. `backend` names the scoring
+    backend; by default RISK_SCORING_BACKEND decides.
+    """
+    workers = workers or os.cpu_count()
+    start = time.perf_counter()
+    rows = 0
+    rejected = 0
+    rejects_file = None
+    pdfs = 0
+    pdf_bytes = 0
+
+    pdf_pool = None
+    pending_pdfs = deque()
+    if pdf_dir:
+        os.makedirs(pdf_dir, exist_ok=True)
+        pdf_pool = ProcessPoolExecutor(max_workers=pdf_workers or workers, initializer=init_pdf_worker)
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_score_worker, initargs=(backend,)) as pool, \
+                BulkExporter(outputs) as exporter:
+            for chunk, (valid, reasons, scores, levels, contributions) in bounded_map(
+                    pool, score_chunk, read_chunks(input_path, chunksize), window=workers * 2):
+                if not valid.all():
+                    rejected += len(reasons)
+                    if rejects:
+                        if rejects_file is None:
+                            rejects_file = open(rejects, 'w', newline='')
+                        chunk[~valid].assign(errors=reasons).to_csv(rejects_file, header=rejected == len(reasons),
+                                                                    index=False)
+                    chunk = chunk[valid]
+                exporter.write(chunk, scores, levels, contributions)
+                rows += len(chunk)
+
+                if pdf_pool is not None:
+                    for job in pdf_jobs(chunk, scores, levels, contributions, pdf_dir):
+                        pending_pdfs.append(pdf_pool.submit(render_pdf, job))
+                        # Rendering is much slower than scoring, so cap the queued jobs
+                        while len(pending_pdfs) >= (pdf_workers or workers) * 4:
+                            pdf_bytes += pending_pdfs.popleft().result()
+                            pdfs += 1
+        export_stats = exporter.stats
+
+        while pending_pdfs:
+            pdf_bytes += pending_pdfs.popleft().result()
+            pdfs += 1
+    finally:
+        if pdf_pool is not None:
+            pdf_pool.shutdown(cancel_futures=True)
+        if rejects_file is not None:
+            rejects_file.close()
+
+    elapsed = time.perf_counter() - start
+    return {
+        'rows': rows,
+        'rejected': rejected,
+        'elapsed_seconds': elapsed,
+        'rows_per_sec': rows / elapsed if elapsed > 0 else 0.0,
+        'export_bytes': export_stats['bytes_written'],
+        'pdfs': pdfs,
+        'pdf_bytes': pdf_bytes,
+        'pdfs_per_sec': pdfs / elapsed if elapsed > 0 else 0.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless batch risk assessment of a patient file")
+    parser.add_argument('input', help="Patient records (.csv, .jsonl or .parquet)")
+    parser.add_argument('--csv', help="Report-style CSV output path")
+    parser.add_argument('--jsonl', help="JSON lines output path")
+    parser.add_argument('--parquet', help="Parquet output path (requires pyarrow)")
+    parser.add_argument('--text', help="Concatenated text report output path")
+    parser.add_argument('--pdf-dir', help="Render one PDF report per patient into this directory")
+    parser.add_argument('--workers', type=int, default=None, help="Scoring processes (default: CPU count)")
+    parser.add_argument('--pdf-workers', type=int, default=None, help="PDF rendering processes (default: --workers)")
+    parser.add_argument('--chunksize', type=int, default=100000)
+    parser.add_argument('--rejects', help="Write rows that fail schema validation here (CSV with an errors column)")
+    parser.add_argument('--backend', choices=list(BACKENDS), default=None,
+                        help="Scoring backend (default: $RISK_SCORING_BACKEND, else numpy)")
+    args = parser.parse_args()
+
+    outputs = {fmt: getattr(args, fmt) for fmt in SINKS if getattr(args, fmt)}
+    if not outputs and not args.pdf_dir:
+        parser.error("Specify at least one output: --csv, --jsonl, --parquet, --text or --pdf-dir")
+
+    stats = run_batch(args.input, outputs, workers=args.workers, chunksize=args.chunksize,
+                      pdf_dir=args.pdf_dir, pdf_workers=args.pdf_workers, rejects=args.rejects,
+                      backend=args.backend)
+
+    print(f"Scored {stats['rows']:,} patients in {stats['elapsed_seconds']:.1f}s "
+          f"({stats['rows_per_sec']:,.0f} rows/sec)")
+    if stats['rejected']:
+        print(f"Rejected {stats['rejected']:,} rows that failed validation"
+              + (f" (see {args.rejects})" if args.rejects else " (use --rejects to keep them)"))
+    for fmt, size in stats['export_bytes'].items():
+        print(f"  {fmt}: {outputs[fmt]} ({size / 1024**2:,.1f} MB)")
+    if args.pdf_dir:
+        print(f"Rendered {stats['pdfs']:,} PDFs into {args.pdf_dir} "
+              f"({stats['pdfs_per_sec']:,.1f} PDFs/sec, {stats['pdf_bytes'] / 1024**2:,.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+import os
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from risk_engine import (RISK_FACTORS, RECOMMENDATIONS, RECOMMENDED_ACTIONS, CONTRIBUTION_COLUMNS,
+                         feature_matrix, contribution_matrix, heuristic_scores, risk_levels,
+                         contributions_by_factor)
+
+BUFFER_SIZE = 1 << 20
+
+# Report-style CSV columns and the patient fields they come from
+REPORT_FIELDS = {
+    'Age': 'age',
+    'Gender': 'gender',
+    'Ethnicity': 'ethnicity',
+    'PHQ9_Score': 'phq9_score',
+    'GAD7_Score': 'gad7_score',
+    'Hopelessness_Score': 'hopelessness_score',
+    'CSSRS_Score': 'cssrs_score',
+    'Social_Isolation': 'social_isolation',
+    'Substance_Use': 'substance_use',
+    'Recent_Life_Events': 'recent_life_events',
+    'Previous_Suicide_Attempts': 'previous_suicide_attempts'
+}
+
+
+def format_text_report(patient, risk_score, risk_level, recommendations, factor_contributions,
+                       assessed_at=None):
+    """Plain-text assessment report for one patient"""
+    assessed_at = assessed_at or datetime.now()
+    return f"""
+MENTAL HEALTH RISK ASSESSMENT REPORT
+====================================
+Assessment Date: {assessed_at.strftime('%Y-%m-%d %H:%M:%S')}
+
+PATIENT INFORMATION:
+- Age: {patient.get('age', 'N/A')}
+- Gender: {patient.get('gender', 'N/A')}
+- Ethnicity: {patient.get('ethnicity', 'N/A')}
+
+CLINICAL ASSESSMENT:
+- PHQ-9 Score (Depression): {patient['phq9_score']:g}/27
+- GAD-7 Score (Anxiety): {patient['gad7_score']:g}/21
+- Hopelessness Score: {patient['hopelessness_score']:g}/20
+- CSSRS Score (Suicide Risk): {patient['cssrs_score']:g}/25
+
+BEHAVIORAL INDICATORS:
+- Social Isolation: {patient['social_isolation']:g}/10
+- Substance Use: {patient['substance_use']:g}/10
+- Recent Life Events: {patient['recent_life_events']:g}/8
+
+TREATMENT HISTORY:
+- Previous Suicide Attempts: {patient['previous_suicide_attempts']:g}
+- Treatment Compliance: {patient['treatment_compliance']:g}%
+- Family History of Suicide: {"Yes" if patient['family_suicide'] else "No"}
+
+RISK ASSESSMENT RESULTS:
+- Risk Probability: {risk_score:.3f} ({risk_score*100:.1f}%)
+- Risk Level: {risk_level}
+- Recommended Action: {RECOMMENDED_ACTIONS.get(risk_level, "Consult with mental health professional")}
+
+RISK FACTOR CONTRIBUTIONS:
+{chr(10).join(f"- {factor}: {value:.3f}" for factor, value in factor_contributions.items())}
+
+CLINICAL RECOMMENDATIONS:
+{chr(10).join(f"{i+1}. {rec}" for i, rec in enumerate(recommendations))}
+
+IMPORTANT NOTES:
+- This assessment is for clinical reference only
+- All decisions should be made by qualified mental health professionals
+- For emergency situations, contact 911 or emergency services immediately
+- This report should be kept confidential and secure
+
+Generated by Mental Health Risk Assessment System
+        """
+
+
+def report_frame(patients, scores, levels, contributions, assessed_at=None):
+    """Report-style export rows (the app's CSV layout) for a scored batch, built column-wise"""
+    assessed_at = assessed_at or datetime.now()
+    levels = pd.Series(levels, index=patients.index)
+
+    report = pd.DataFrame(index=patients.index)
+    report['Assessment_Date'] = assessed_at.strftime('%Y-%m-%d %H:%M:%S')
+    report['Risk_Probability'] = np.char.mod('%.3f', scores)
+    report['Risk_Level'] = levels
+    report['Risk_Percentage'] = np.char.add(np.char.mod('%.1f', scores * 100), '%')
+    report['Recommended_Action'] = levels.map(RECOMMENDED_ACTIONS)
+    for column, field in REPORT_FIELDS.items():
+        report[column] = patients[field] if field in patients else 'N/A'
+    report['Treatment_Compliance'] = np.char.add(
+        np.char.mod('%g', patients['treatment_compliance'].to_numpy(dtype=np.float64)), '%')
+    report['Family_History_Suicide'] = np.where(patients['family_suicide'].to_numpy() > 0, 'Yes', 'No')
+    for j, factor in enumerate(RISK_FACTORS):
+        report[CONTRIBUTION_COLUMNS[factor]] = np.char.mod('%.3f', contributions[:, j])
+    report['Clinical_Recommendations'] = levels.map({level: "; ".join(recs) for level, recs in RECOMMENDATIONS.items()})
+    return report
+
+
+def scored_frame(patients, scores, levels, contributions):
+    """Numeric export rows for machine-readable formats: inputs, score, level and contributions"""
+    scored = patients.copy()
+    scored['risk_score'] = scores
+    scored['risk_level'] = levels
+    for j, factor in enumerate(RISK_FACTORS):
+        scored[CONTRIBUTION_COLUMNS[factor].lower()] = contributions[:, j]
+    return scored
+
+
+class _CsvSink:
+    def __init__(self, path, buffer_size):
+        self.path = path
+        self.f = open(path, 'w', newline='', buffering=buffer_size)
+        self.header = True
+
+    def write(self, patients, scores, levels, contributions, assessed_at):
+        report_frame(patients, scores, levels, contributions, assessed_at).to_csv(
+            self.f, header=self.header, index=False)
+        self.header = False
+
+    def close(self):
+        self.f.close()
+
+
+class _JsonlSink:
+    def __init__(self, path, buffer_size):
+        self.path = path
+        self.f = open(path, 'w', buffering=buffer_size)
+
+    def write(self, patients, scores, levels, contributions, assessed_at):
+        lines = scored_frame(patients, scores, levels, contributions).to_json(orient='records', lines=True)
+        self.f.write(lines if lines.endswith('\n') else lines + '\n')
+
+    def close(self):
+        self.f.close()
+
+
+class _ParquetSink:
+    def __init__(self, path, buffer_size):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet export requires pyarrow: pip install pyarrow")
+        self.pa = pa
+        self.pq = pq
+        self.path = path
+        self.writer = None
+
+    def write(self, patients, scores, levels, contributions, assessed_at):
+        frame = scored_frame(patients, scores, levels, contributions)
+        if self.writer is None:
+            table = self.pa.Table.from_pandas(frame, preserve_index=False)
+            self.writer = self.pq.ParquetWriter(self.path, table.schema)
+        else:
+            table = self.pa.Table.from_pandas(frame, preserve_index=False, schema=self.writer.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class _TextSink:
+    def __init__(self, path, buffer_size):
+        self.path = path
+        self.f = open(path, 'w', buffering=buffer_size)
+
+    def write(self, patients, scores, levels, contributions, assessed_at):
+        reports = []
+        for patient, score, level, row in zip(patients.to_dict('records'), scores, levels, contributions):
+            reports.append(format_text_report(patient, score, level, RECOMMENDATIONS[level],
+                                              contributions_by_factor(row), assessed_at))
+        self.f.write('\n'.join(reports))
+
+    def close(self):
+        self.f.close()
+
+
+SINKS = {
+    'csv': _CsvSink,
+    'jsonl': _JsonlSink,
+    'parquet': _ParquetSink,
+    'text': _TextSink
+}
+
+
+class BulkExporter:
+    """Stream scored cohort batches to CSV, JSONL, Parquet and text reports
+
+    Only one batch is held in memory at a time; every sink writes through a large
+    buffer, so exporting is bounded by disk throughput rather than cohort size.
+    """
+
+    def __init__(self, outputs, buffer_size=BUFFER_SIZE):
+        unknown = set(outputs) - set(SINKS)
+        if unknown:
+            raise ValueError(f"Unknown export formats: {', '.join(sorted(unknown))}")
+        self.sinks = {fmt: SINKS[fmt](path, buffer_size) for fmt, path in outputs.items()}
+        self.rows = 0
+        self.busy_seconds = 0.0
+        self.started = time.perf_counter()
+        self.stats = None
+
+    def write(self, patients, scores=None, levels=None, contributions=None, assessed_at=None):
+        """Export one batch; scores, levels and contributions are computed if not supplied"""
+        start = time.perf_counter()
+        if contributions is None:
+            contributions = contribution_matrix(feature_matrix(patients))
+        if scores is None:
+            scores = heuristic_scores(None, contributions)
+        if levels is None:
+            levels = risk_levels(scores)
+        assessed_at = assessed_at or datetime.now()
+
+        for sink in self.sinks.values():
+            sink.write(patients, scores, levels, contributions, assessed_at)
+
+        self.rows += len(patients)
+        self.busy_seconds += time.perf_counter() - start
+
+    def close(self):
+        """Flush and close every sink and return throughput statistics"""
+        for sink in self.sinks.values():
+            sink.close()
+
+        elapsed = time.perf_counter() - self.started
+        bytes_written = {fmt: os.path.getsize(sink.path) for fmt, sink in self.sinks.items()}
+        total_bytes = sum(bytes_written.values())
+        self.stats = {
+            'rows': self.rows,
+            'elapsed_seconds': elapsed,
+            'rows_per_sec': self.rows / elapsed if elapsed > 0 else 0.0,
+            'bytes_written': bytes_written,
+            'bytes_per_sec': total_bytes / elapsed if elapsed > 0 else 0.0
+        }
+        return self.stats
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.stats is None:
+            self.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score a cohort CSV and export it in bulk")
+    parser.add_argument('dataset', nargs='?', default='mental_health_dataset.csv')
+    parser.add_argument('--csv', help="Report-style CSV output path")
+    parser.add_argument('--jsonl', help="JSON lines output path")
+    parser.add_argument('--parquet', help="Parquet output path (requires pyarrow)")
+    parser.add_argument('--text', help="Concatenated text report output path")
+    parser.add_argument('--chunksize', type=int, default=100000)
+    args = parser.parse_args()
+
+    outputs = {fmt: getattr(args, fmt) for fmt in SINKS if getattr(args, fmt)}
+    if not outputs:
+        parser.error("Specify at least one of --csv, --jsonl, --parquet, --text")
+
+    with BulkExporter(outputs) as exporter:
+        for chunk in pd.read_csv(args.dataset, chunksize=args.chunksize):
+            exporter.write(chunk)
+    stats = exporter.stats
+
+    print(f"Exported {stats['rows']:,} rows in {stats['elapsed_seconds']:.1f}s "
+          f"({stats['rows_per_sec']:,.0f} rows/sec, {stats['bytes_per_sec'] / 1024**2:,.1f} MB/sec)")
+    for fmt, size in stats['bytes_written'].items():
+        print(f"  {fmt}: {outputs[fmt]} ({size / 1024**2:,.1f} MB)")
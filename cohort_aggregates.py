@@ -0,0 +1,194 @@
+import os
+import json
+import argparse
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+AGGREGATES_PATH = 'cohort_aggregates.json'
+
+# Grouping dimensions; 'cohort' is a single group holding the whole population
+DIMENSIONS = ('cohort', 'risk_level', 'gender', 'ethnicity', 'socioeconomic_status')
+
+
+class GroupStats:
+    """Mergeable count/mean/variance and fixed-bin histogram sketch for one group"""
+
+    def __init__(self, bins):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.crisis_events = 0
+        self.histogram = np.zeros(bins, dtype=np.int64)
+
+    def merge(self, count, mean, m2, crisis_events, histogram):
+        """Combine another set of statistics into this one (Chan et al. parallel update)"""
+        if count == 0:
+            return
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+        self.crisis_events += crisis_events
+        self.histogram += histogram
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'm2': self.m2,
+            'crisis_events': self.crisis_events,
+            'histogram': self.histogram.tolist()
+        }
+
+
+class CohortAggregator:
+    """Streaming per-group risk statistics with constant memory and constant-time reads
+
+    Every group keeps a count, Welford mean/M2 of the risk score, crisis event count and a
+    histogram over a fixed score range used as a quantile sketch. All of these merge
+    exactly, so aggregators built by separate workers can be combined with merge().
+    """
+
+    def __init__(self, score_range=(0.0, 1.0), bins=200, dimensions=DIMENSIONS):
+        self.score_range = tuple(score_range)
+        self.bins = bins
+        self.dimensions = tuple(dimensions)
+        self.groups = {dimension: {} for dimension in self.dimensions}
+        self.updated_at = None
+
+    def _group(self, dimension, value):
+        group = self.groups[dimension].get(value)
+        if group is None:
+            group = self.groups[dimension][value] = GroupStats(self.bins)
+        return group
+
+    def update(self, scored):
+        """Fold a batch of scored records (DataFrame or list of dicts) into the aggregates"""
+        if not isinstance(scored, pd.DataFrame):
+            scored = pd.DataFrame(scored)
+        if len(scored) == 0:
+            return
+
+        scores = scored['risk_score'].to_numpy(dtype=np.float64)
+        if 'crisis_event' in scored:
+            crisis = scored['crisis_event'].fillna(0).to_numpy(dtype=np.int64)
+        else:
+            crisis = np.zeros(len(scored), dtype=np.int64)
+
+        low, high = self.score_range
+        bin_index = ((scores - low) / (high - low) * self.bins).astype(np.int64)
+        bin_index = np.clip(bin_index, 0, self.bins - 1)
+
+        for dimension in self.dimensions:
+            if dimension == 'cohort':
+                codes, values = np.zeros(len(scored), dtype=np.int64), np.array(['All'])
+            elif dimension in scored:
+                codes, values = pd.factorize(scored[dimension].fillna('Unknown').astype(str))
+            else:
+                codes, values = np.zeros(len(scored), dtype=np.int64), np.array(['Unknown'])
+
+            # Per-group batch statistics in a handful of bincount passes
+            n_groups = len(values)
+            counts = np.bincount(codes, minlength=n_groups)
+            means = np.bincount(codes, weights=scores, minlength=n_groups) / np.maximum(counts, 1)
+            m2 = np.bincount(codes, weights=(scores - means[codes]) ** 2, minlength=n_groups)
+            events = np.bincount(codes, weights=crisis, minlength=n_groups)
+            histograms = np.bincount(codes * self.bins + bin_index,
+                                     minlength=n_groups * self.bins).reshape(n_groups, self.bins)
+
+            for i, value in enumerate(values):
+                self._group(dimension, value).merge(int(counts[i]), float(means[i]), float(m2[i]),
+                                                    int(events[i]), histograms[i])
+
+        self.updated_at = datetime.now().isoformat(timespec='seconds')
+
+    def merge(self, other):
+        """Merge aggregates from another worker into this one"""
+        if other.score_range != self.score_range or other.bins != self.bins:
+            raise ValueError("Aggregators use different score ranges or bin counts")
+        for dimension, groups in other.groups.items():
+            for value, stats in groups.items():
+                self._group(dimension, value).merge(stats.count, stats.mean, stats.m2,
+                                                    stats.crisis_events, stats.histogram)
+        self.updated_at = max(filter(None, [self.updated_at, other.updated_at]), default=None)
+        return self
+
+    def quantiles(self, dimension, value, qs=(0.5, 0.9, 0.99)):
+        """Approximate score quantiles of one group from its histogram sketch"""
+        stats = self.groups[dimension][value]
+        low, high = self.score_range
+        cumulative = np.cumsum(stats.histogram) / max(stats.count, 1)
+        edges = np.linspace(low, high, self.bins + 1)
+        # Interpolate linearly within the bin that crosses each quantile
+        return np.interp(qs, np.concatenate(([0.0], cumulative)), edges)
+
+    def summary(self, dimension):
+        """One row per group with count, mean, std, quantiles and crisis rate"""
+        rows = []
+        for value, stats in self.groups[dimension].items():
+            p50, p90, p99 = self.quantiles(dimension, value)
+            rows.append({
+                dimension: value,
+                'patients': stats.count,
+                'mean_score': stats.mean,
+                'std_score': np.sqrt(stats.m2 / stats.count) if stats.count else 0.0,
+                'p50_score': p50,
+                'p90_score': p90,
+                'p99_score': p99,
+                'crisis_events': stats.crisis_events,
+                'crisis_rate': stats.crisis_events / stats.count if stats.count else 0.0
+            })
+        return pd.DataFrame(rows).sort_values('patients', ascending=False, ignore_index=True)
+
+    def to_dict(self):
+        return {
+            'score_range': list(self.score_range),
+            'bins': self.bins,
+            'updated_at': self.updated_at,
+            'groups': {
+                dimension: {value: stats.to_dict() for value, stats in groups.items()}
+                for dimension, groups in self.groups.items()
+            }
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        aggregator = cls(score_range=data['score_range'], bins=data['bins'], dimensions=data['groups'].keys())
+        for dimension, groups in data['groups'].items():
+            for value, stats in groups.items():
+                aggregator._group(dimension, value).merge(stats['count'], stats['mean'], stats['m2'],
+                                                          stats['crisis_events'], np.array(stats['histogram']))
+        aggregator.updated_at = data['updated_at']
+        return aggregator
+
+    def save(self, path=AGGREGATES_PATH):
+        """Write a snapshot atomically so readers never see a partial file"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=AGGREGATES_PATH):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build cohort aggregates from a dataset CSV in chunks")
+    parser.add_argument('dataset', nargs='?', default='mental_health_dataset.csv')
+    parser.add_argument('--output', default=AGGREGATES_PATH)
+    parser.add_argument('--chunksize', type=int, default=500000)
+    parser.add_argument('--score-max', type=float, default=100.0,
+                        help="Upper end of the risk_score scale (100 for generated data, 1 for app scores)")
+    args = parser.parse_args()
+
+    aggregator = CohortAggregator(score_range=(0.0, args.score_max))
+    for chunk in pd.read_csv(args.dataset, chunksize=args.chunksize):
+        aggregator.update(chunk)
+    aggregator.save(args.output)
+
+    print(f"Aggregates saved to {args.output}")
+    print(aggregator.summary('risk_level').to_string(index=False))
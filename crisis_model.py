@@ -0,0 +1,249 @@
+import os
+import json
+import time
+import queue
+import argparse
+import threading
+import numpy as np
+import pandas as pd
+import joblib
+from datetime import datetime
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.metrics import roc_auc_score, log_loss
+from sklearn.model_selection import train_test_split
+from risk_engine import RISK_FACTORS, feature_matrix, normalize_factors, heuristic_scores
+
+MODEL_DIR = 'crisis_model'
+
+
+class CrisisModelTrainer:
+    """Train a crisis_event classifier on the generated dataset"""
+
+    MODEL_FILE = 'model.joblib'
+    COEF_FILE = 'coef.npy'
+    INTERCEPT_FILE = 'intercept.npy'
+    META_FILE = 'meta.json'
+
+    def __init__(self, C=1.0, test_size=0.2, random_state=42):
+        self.C = C
+        self.test_size = test_size
+        self.random_state = random_state
+        self.model = None
+        self.metrics = {}
+
+    def load_training_data(self, dataset):
+        """Load the raw risk factor matrix and crisis labels from a CSV path or DataFrame"""
+        if not isinstance(dataset, pd.DataFrame):
+            dataset = pd.read_csv(dataset, usecols=RISK_FACTORS + ['crisis_event'])
+        X = feature_matrix(dataset)
+        y = dataset['crisis_event'].to_numpy(dtype=np.int8)
+        return X, y
+
+    def train(self, dataset):
+        """Fit the model and record hold-out metrics"""
+        X, y = self.load_training_data(dataset)
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=self.test_size, random_state=self.random_state, stratify=y
+        )
+
+        self.model = LogisticRegression(C=self.C, max_iter=1000)
+        self.model.fit(normalize_factors(X_train), y_train)
+
+        test_proba = self.model.predict_proba(normalize_factors(X_test))[:, 1]
+        self.metrics = {
+            'n_train': int(len(y_train)),
+            'n_test': int(len(y_test)),
+            'crisis_rate': float(y.mean()),
+            'model_auc': float(roc_auc_score(y_test, test_proba)),
+            'heuristic_auc': float(roc_auc_score(y_test, heuristic_scores(X_test)))
+        }
+        return self.metrics
+
+    def save(self, model_dir=MODEL_DIR):
+        """Serialize the fitted model plus its raw parameters for the fast inference path"""
+        if self.model is None:
+            raise ValueError("Model has not been trained yet")
+
+        os.makedirs(model_dir, exist_ok=True)
+        joblib.dump(self.model, os.path.join(model_dir, self.MODEL_FILE))
+        np.save(os.path.join(model_dir, self.COEF_FILE), self.model.coef_[0].astype(np.float64))
+        np.save(os.path.join(model_dir, self.INTERCEPT_FILE), self.model.intercept_.astype(np.float64))
+
+        meta = {
+            'factors': RISK_FACTORS,
+            'model_type': type(self.model).__name__,
+            'trained_at': datetime.now().isoformat(timespec='seconds'),
+            'metrics': self.metrics
+        }
+        with open(os.path.join(model_dir, self.META_FILE), 'w') as f:
+            json.dump(meta, f, indent=2)
+
+
+def csv_chunks(path, chunksize=500000):
+    """Stream training chunks from a dataset CSV on disk"""
+    return pd.read_csv(path, usecols=RISK_FACTORS + ['crisis_event'], chunksize=chunksize)
+
+
+def generator_chunks(n_samples, batch_size=500000, seed=42):
+    """Stream training chunks straight from MentalHealthDataGenerator"""
+    from data_generator import MentalHealthDataGenerator
+    return MentalHealthDataGenerator(seed=seed).iter_batches(n_samples, batch_size=batch_size)
+
+
+def prefetch(chunks, depth=2):
+    """Produce chunks on a background thread so loading overlaps with training
+
+    At most depth chunks are buffered, which bounds memory regardless of dataset size.
+    """
+    buffer = queue.Queue(maxsize=depth)
+    done = object()
+
+    def producer():
+        try:
+            for chunk in chunks:
+                buffer.put(chunk)
+        except Exception as e:
+            buffer.put(e)
+        buffer.put(done)
+
+    threading.Thread(target=producer, daemon=True).start()
+    while True:
+        item = buffer.get()
+        if item is done:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+
+class IncrementalCrisisTrainer(CrisisModelTrainer):
+    """Out-of-core trainer that fits a logistic model chunk by chunk with partial_fit"""
+
+    def __init__(self, alpha=1e-4, random_state=42):
+        super().__init__(random_state=random_state)
+        self.alpha = alpha
+        self.model = SGDClassifier(loss='log_loss', alpha=alpha, random_state=random_state)
+
+    def train(self, chunks, prefetch_depth=2, progress=True):
+        """Fit on an iterable of DataFrame chunks and report throughput
+
+        Each chunk is scored before it is learned from (progressive validation), so the
+        reported log loss is a hold-out estimate that needs no separate test set.
+        """
+        rows = 0
+        loss_sum = 0.0
+        scored_rows = 0
+        start = time.perf_counter()
+
+        for chunk in prefetch(chunks, depth=prefetch_depth):
+            X, y = self.load_training_data(chunk)
+            X = normalize_factors(X)
+
+            if rows > 0:
+                proba = self.model.predict_proba(X)[:, 1]
+                loss_sum += log_loss(y, proba, labels=[0, 1]) * len(y)
+                scored_rows += len(y)
+
+            self.model.partial_fit(X, y, classes=np.array([0, 1]))
+            rows += len(y)
+
+            if progress:
+                elapsed = time.perf_counter() - start
+                print(f"  {rows:,} rows trained ({rows / elapsed:,.0f} rows/sec)")
+
+        elapsed = time.perf_counter() - start
+        self.metrics = {
+            'n_train': rows,
+            'elapsed_seconds': elapsed,
+            'rows_per_sec': rows / elapsed if elapsed > 0 else 0.0,
+            'progressive_log_loss': loss_sum / scored_rows if scored_rows else None
+        }
+        return self.metrics
+
+
+class CrisisModelInference:
+    """Batch scorer that loads the serialized model once and memory-maps its parameters"""
+
+    def __init__(self, model_dir=MODEL_DIR):
+        self.model_dir = model_dir
+        with open(os.path.join(model_dir, CrisisModelTrainer.META_FILE)) as f:
+            self.meta = json.load(f)
+        if self.meta['factors'] != RISK_FACTORS:
+            raise ValueError(f"Model at {model_dir} was trained on different risk factors; retrain it")
+
+        self.coef = np.load(os.path.join(model_dir, CrisisModelTrainer.COEF_FILE), mmap_mode='r')
+        self.intercept = float(np.load(os.path.join(model_dir, CrisisModelTrainer.INTERCEPT_FILE))[0])
+
+    def predict_proba(self, matrix):
+        """Crisis probability for each row of a raw feature matrix"""
+        logits = normalize_factors(matrix) @ self.coef + self.intercept
+        return 1 / (1 + np.exp(-logits))
+
+    def score_records(self, records):
+        """Crisis probability for a DataFrame or list of patient dicts"""
+        return self.predict_proba(feature_matrix(records))
+
+    def parity_check(self, matrix, repeats=5):
+        """Compare latency against the heuristic scorer and outputs against the joblib model"""
+        timings = {}
+        for name, scorer in (('heuristic', heuristic_scores), ('model', self.predict_proba)):
+            best = float('inf')
+            for _ in range(repeats):
+                start = time.perf_counter()
+                scorer(matrix)
+                best = min(best, time.perf_counter() - start)
+            timings[name] = best
+
+        estimator = joblib.load(os.path.join(self.model_dir, CrisisModelTrainer.MODEL_FILE))
+        reference = estimator.predict_proba(normalize_factors(matrix))[:, 1]
+
+        return {
+            'rows': int(len(matrix)),
+            'heuristic_rows_per_sec': len(matrix) / timings['heuristic'],
+            'model_rows_per_sec': len(matrix) / timings['model'],
+            'latency_ratio': timings['model'] / timings['heuristic'],
+            'max_abs_diff_vs_estimator': float(np.max(np.abs(self.predict_proba(matrix) - reference)))
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the crisis_event model on a generated dataset")
+    parser.add_argument('dataset', nargs='?', default='mental_health_dataset.csv')
+    parser.add_argument('--model-dir', default=MODEL_DIR)
+    parser.add_argument('--C', type=float, default=1.0)
+    parser.add_argument('--incremental', action='store_true',
+                        help="Train out-of-core over chunks instead of loading the whole dataset")
+    parser.add_argument('--chunksize', type=int, default=500000)
+    parser.add_argument('--generate', type=int, default=0,
+                        help="With --incremental, train on this many freshly generated rows instead of a CSV")
+    args = parser.parse_args()
+
+    if args.incremental:
+        trainer = IncrementalCrisisTrainer()
+        if args.generate:
+            chunks = generator_chunks(args.generate, batch_size=args.chunksize)
+        else:
+            chunks = csv_chunks(args.dataset, chunksize=args.chunksize)
+        metrics = trainer.train(chunks)
+        trainer.save(args.model_dir)
+
+        print(f"Model saved to {args.model_dir}")
+        print(f"Trained on {metrics['n_train']:,} rows at {metrics['rows_per_sec']:,.0f} rows/sec")
+        if metrics['progressive_log_loss'] is not None:
+            print(f"Progressive validation log loss: {metrics['progressive_log_loss']:.4f}")
+    else:
+        trainer = CrisisModelTrainer(C=args.C)
+        metrics = trainer.train(args.dataset)
+        trainer.save(args.model_dir)
+
+        print(f"Model saved to {args.model_dir}")
+        print(f"Hold-out AUC: model {metrics['model_auc']:.3f}, heuristic {metrics['heuristic_auc']:.3f}")
+
+    # Parity check on a sample of the dataset (skipped when training on generated data)
+    if not args.generate:
+        data = pd.read_csv(args.dataset, usecols=RISK_FACTORS, nrows=1000000)
+        report = CrisisModelInference(args.model_dir).parity_check(feature_matrix(data))
+        print(f"Heuristic scorer: {report['heuristic_rows_per_sec']:,.0f} rows/sec")
+        print(f"Model scorer: {report['model_rows_per_sec']:,.0f} rows/sec "
+              f"({report['latency_ratio']:.2f}x heuristic latency)")
+        print(f"Max difference vs serialized estimator: {report['max_abs_diff_vs_estimator']:.2e}")
@@ -2,27 +2,244 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import random
+import argparse
 from tqdm import tqdm
+from scipy.special import ndtri, log_ndtr
+from risk_engine import OUTCOME_RISK_CUTOFFS, risk_levels
+from cohort_aggregates import CohortAggregator, AGGREGATES_PATH
+
+# Categorical distributions: (categories, probabilities)
+GENDERS = (['Male', 'Female', 'Non-binary'], [0.45, 0.50, 0.05])
+ETHNICITIES = (['White', 'Black', 'Hispanic', 'Asian', 'Native American', 'Other'],
+               [0.60, 0.12, 0.18, 0.06, 0.02, 0.02])
+SOCIOECONOMIC_STATUSES = (['Low', 'Lower-middle', 'Middle', 'Upper-middle', 'High'],
+                          [0.20, 0.25, 0.30, 0.20, 0.05])
+EMPLOYMENT_STATUSES = (['Employed', 'Unemployed', 'Part-time', 'Student', 'Retired', 'Disabled'],
+                       [0.60, 0.15, 0.10, 0.08, 0.05, 0.02])
+
+# Marginal distribution of every copula-generated column, matching the independent generator:
+# ('normal', mean, sd, low, high, integer), ('poisson', mean, high), ('bernoulli', p),
+# ('exponential', scale, high) or ('ordinal', (categories, probabilities)) for ordered categories
+MARGINALS = {
+    'age': ('normal', 35, 15, 18, 85, True),
+    'socioeconomic_status': ('ordinal', SOCIOECONOMIC_STATUSES),
+    'family_depression': ('bernoulli', 0.35),
+    'family_anxiety': ('bernoulli', 0.30),
+    'family_suicide': ('bernoulli', 0.08),
+    'family_substance_abuse': ('bernoulli', 0.25),
+    'phq9_score': ('poisson', 8, 27),
+    'gad7_score': ('poisson', 6, 21),
+    'hopelessness_score': ('poisson', 5, 20),
+    'cssrs_score': ('poisson', 3, 25),
+    'sleep_hours': ('normal', 7.2, 1.5, 3, 12, False),
+    'social_isolation': ('poisson', 4, 10),
+    'recent_life_events': ('poisson', 2, 8),
+    'substance_use': ('poisson', 2, 10),
+    'risk_taking_behaviors': ('poisson', 3, 10),
+    'previous_suicide_attempts': ('poisson', 0.3, 5),
+    'hospitalizations': ('poisson', 0.5, 8),
+    'current_medications': ('poisson', 1.5, 6),
+    'treatment_compliance': ('normal', 75, 20, 0, 100, False),
+    'days_since_therapy': ('exponential', 30, 365),
+    'housing_stability': ('normal', 7, 2, 0, 10, False),
+    'healthcare_access': ('normal', 7, 2, 0, 10, False),
+    'social_support': ('normal', 6, 2, 0, 10, False)
+}
+
+# Column order of every generated batch, as produced by the independent generator
+FEATURE_COLUMNS = [
+    'age', 'gender', 'ethnicity', 'socioeconomic_status',
+    'family_depression', 'family_anxiety', 'family_suicide', 'family_substance_abuse',
+    'phq9_score', 'gad7_score', 'hopelessness_score', 'cssrs_score',
+    'sleep_hours', 'social_isolation', 'recent_life_events', 'substance_use', 'risk_taking_behaviors',
+    'previous_suicide_attempts', 'hospitalizations', 'current_medications', 'treatment_compliance',
+    'days_since_therapy', 'housing_stability', 'employment_status', 'healthcare_access', 'social_support'
+]
+
+# Columns that stay fixed across a patient's visits (age only advances with time)
+STATIC_COLUMNS = ('age', 'socioeconomic_status', 'family_depression', 'family_anxiety',
+                  'family_suicide', 'family_substance_abuse')
+
+# Lifetime counts that can only grow from one visit to the next
+CUMULATIVE_COLUMNS = ('previous_suicide_attempts', 'hospitalizations')
+
+# Loadings of each column on the shared latent factors of the copula model; the remaining
+# variance of each column is its own noise, so the sum of squared loadings must stay below 1
+LATENT_FACTORS = ('distress', 'social_adversity', 'disengagement', 'family_risk')
+DEFAULT_LOADINGS = {
+    'socioeconomic_status': {'social_adversity': -0.4},
+    'family_depression': {'family_risk': 0.6, 'distress': 0.2},
+    'family_anxiety': {'family_risk': 0.5, 'distress': 0.2},
+    'family_suicide': {'family_risk': 0.6, 'distress': 0.15},
+    'family_substance_abuse': {'family_risk': 0.5, 'social_adversity': 0.2},
+    'phq9_score': {'distress': 0.8},
+    'gad7_score': {'distress': 0.7},
+    'hopelessness_score': {'distress': 0.75, 'social_adversity': 0.15},
+    'cssrs_score': {'distress': 0.65, 'family_risk': 0.15},
+    'sleep_hours': {'distress': -0.4},
+    'social_isolation': {'social_adversity': 0.6, 'distress': 0.3},
+    'recent_life_events': {'social_adversity': 0.4, 'distress': 0.2},
+    'substance_use': {'social_adversity': 0.4, 'distress': 0.2, 'family_risk': 0.2},
+    'risk_taking_behaviors': {'social_adversity': 0.3, 'distress': 0.2},
+    'previous_suicide_attempts': {'distress': 0.5, 'family_risk': 0.2},
+    'hospitalizations': {'distress': 0.5},
+    'current_medications': {'distress': 0.4, 'disengagement': -0.3},
+    'treatment_compliance': {'disengagement': -0.7},
+    'days_since_therapy': {'disengagement': 0.6},
+    'housing_stability': {'social_adversity': -0.6},
+    'healthcare_access': {'social_adversity': -0.4, 'disengagement': -0.3},
+    'social_support': {'social_adversity': -0.7}
+}
+
+
+def _poisson_cdf(mean, high):
+    """CDF of a Poisson distribution at 0..high-1; values at or above `high` are clipped anyway"""
+    pmf = np.empty(high)
+    pmf[0] = np.exp(-mean)
+    for k in range(1, high):
+        pmf[k] = pmf[k - 1] * mean / k
+    return np.cumsum(pmf)
+
 
 class MentalHealthDataGenerator:
-    def __init__(self, seed=42):
+    """Synthetic patient generator
+
+    In the default 'independent' mode every feature is drawn on its own. In 'copula' mode the
+    numeric and ordinal features come from a Gaussian copula: correlated standard normals (from
+    latent-factor loadings or an explicit correlation matrix) are mapped through each column's
+    marginal, so the marginals are unchanged but features co-vary realistically.
+    """
+    
+    def __init__(self, seed=42, mode='independent', loadings=None, correlation=None, block_size=1000000):
         np.random.seed(seed)
         random.seed(seed)
+        if mode not in ('independent', 'copula'):
+            raise ValueError(f"Unknown generator mode '{mode}' (expected 'independent' or 'copula')")
+        self.mode = mode
+        self.block_size = block_size
+        if mode == 'copula':
+            self.rng = np.random.default_rng(seed)
+            self._setup_copula(loadings, correlation)
+    
+    def _setup_copula(self, loadings=None, correlation=None):
+        """Precompute the latent mixing matrix and every marginal's lookup table"""
+        self.copula_columns = list(MARGINALS)
+        n = len(self.copula_columns)
+        
+        if correlation is not None:
+            if isinstance(correlation, pd.DataFrame):
+                correlation = correlation.loc[self.copula_columns, self.copula_columns].to_numpy()
+            try:
+                self.mixing = np.linalg.cholesky(np.asarray(correlation, dtype=np.float64))
+            except np.linalg.LinAlgError:
+                raise ValueError("Copula correlation matrix must be symmetric positive definite")
+            self.noise_scale = None
+        else:
+            loadings = DEFAULT_LOADINGS if loadings is None else loadings
+            self.mixing = np.zeros((n, len(LATENT_FACTORS)))
+            for i, column in enumerate(self.copula_columns):
+                for factor, loading in loadings.get(column, {}).items():
+                    self.mixing[i, LATENT_FACTORS.index(factor)] = loading
+            communality = (self.mixing ** 2).sum(axis=1)
+            if np.any(communality >= 1):
+                bad = [column for column, c in zip(self.copula_columns, communality) if c >= 1]
+                raise ValueError(f"Squared loadings must sum to less than 1 for: {', '.join(bad)}")
+            self.noise_scale = np.sqrt(1 - communality)
+        
+        # Discrete margins become a searchsorted against CDF tables mapped onto the normal scale
+        # with ndtri, so the latent normals never need converting to uniforms
+        self.tables = {}
+        for column, marginal in MARGINALS.items():
+            if marginal[0] == 'poisson':
+                self.tables[column] = ndtri(_poisson_cdf(marginal[1], marginal[2])).astype(np.float32)
+            elif marginal[0] == 'ordinal':
+                self.tables[column] = ndtri(np.cumsum(marginal[1][1])[:-1]).astype(np.float32)
+            elif marginal[0] == 'bernoulli':
+                self.tables[column] = np.float32(ndtri(1 - marginal[1]))
+        self.mixing = self.mixing.astype(np.float32)
+        if self.noise_scale is not None:
+            self.noise_scale = self.noise_scale.astype(np.float32)[:, np.newaxis]
+    
+    def _draw_state(self, n_samples):
+        """Independent standard normals driving the copula: latent factors, then per-feature noise
+        
+        Drawn feature-major in float32 so each row of the state is contiguous.
+        """
+        n_state = len(self.copula_columns)
+        if self.noise_scale is not None:
+            n_state += self.mixing.shape[1]
+        return self.rng.standard_normal((n_state, n_samples), dtype=np.float32)
+    
+    def _mix(self, state):
+        """Correlated standard normals, one row per copula-generated feature"""
+        if self.noise_scale is None:
+            return self.mixing @ state
+        n_factors = self.mixing.shape[1]
+        z = state[n_factors:] * self.noise_scale
+        z += self.mixing @ state[:n_factors]
+        return z
+    
+    def _latent_normals(self, n_samples):
+        return self._mix(self._draw_state(n_samples))
+    
+    def _nominal_columns(self, n_samples):
+        """Nominal categories have no natural order, so they stay independent of the copula"""
+        columns = {}
+        for column, (categories, p) in (('gender', GENDERS), ('ethnicity', ETHNICITIES),
+                                        ('employment_status', EMPLOYMENT_STATUSES)):
+            columns[column] = np.array(categories, dtype=object)[
+                np.searchsorted(np.cumsum(p)[:-1], self.rng.random(n_samples), side='right')]
+        return columns
+    
+    def _apply_marginal(self, column, z):
+        """Map standard normals onto one column's marginal distribution"""
+        marginal = MARGINALS[column]
+        kind = marginal[0]
+        if kind == 'normal':
+            _, mean, sd, low, high, integer = marginal
+            values = np.clip(mean + sd * z.astype(np.float64), low, high)
+            return values.astype(int) if integer else values
+        if kind == 'bernoulli':
+            return (z > self.tables[column]).astype(int)
+        if kind == 'poisson':
+            return np.searchsorted(self.tables[column], z, side='right')
+        if kind == 'exponential':
+            _, scale, high = marginal
+            # -log(1 - u) with u = ndtr(z), computed as -log_ndtr(-z) to keep the upper tail exact
+            return np.clip(-scale * log_ndtr(-z.astype(np.float64)), 0, high)
+        categories = np.array(marginal[1][0], dtype=object)
+        return categories[np.searchsorted(self.tables[column], z, side='right')]
+    
+    def generate_correlated_features(self, n_samples):
+        """Generate every feature column from the copula model, block by block
+        
+        Only one block of latent normals is alive at a time; results are written into
+        preallocated columns, so peak memory is the output plus one block.
+        """
+        columns = {}
+        for start in range(0, n_samples, self.block_size):
+            size = min(self.block_size, n_samples - start)
+            z = self._latent_normals(size)
+            block = {column: self._apply_marginal(column, z[j]) for j, column in enumerate(self.copula_columns)}
+            block.update(self._nominal_columns(size))
+            
+            for column, values in block.items():
+                if column not in columns:
+                    columns[column] = np.empty(n_samples, dtype=values.dtype)
+                columns[column][start:start + size] = values
+        
+        return pd.DataFrame({column: columns[column] for column in FEATURE_COLUMNS}, copy=False)
         
     def generate_demographics(self, n_samples):
         """Generate demographic data"""
         ages = np.random.normal(35, 15, n_samples).astype(int)
         ages = np.clip(ages, 18, 85)
         
-        genders = np.random.choice(['Male', 'Female', 'Non-binary'], n_samples, p=[0.45, 0.50, 0.05])
+        genders = np.random.choice(GENDERS[0], n_samples, p=GENDERS[1])
         
-        ethnicities = np.random.choice([
-            'White', 'Black', 'Hispanic', 'Asian', 'Native American', 'Other'
-        ], n_samples, p=[0.60, 0.12, 0.18, 0.06, 0.02, 0.02])
+        ethnicities = np.random.choice(ETHNICITIES[0], n_samples, p=ETHNICITIES[1])
         
-        socioeconomic_status = np.random.choice([
-            'Low', 'Lower-middle', 'Middle', 'Upper-middle', 'High'
-        ], n_samples, p=[0.20, 0.25, 0.30, 0.20, 0.05])
+        socioeconomic_status = np.random.choice(SOCIOECONOMIC_STATUSES[0], n_samples, p=SOCIOECONOMIC_STATUSES[1])
         
         return pd.DataFrame({
             'age': ages,
@@ -137,9 +354,7 @@ class MentalHealthDataGenerator:
         housing_stability = np.clip(housing_stability, 0, 10)
         
         # Employment status
-        employment_status = np.random.choice([
-            'Employed', 'Unemployed', 'Part-time', 'Student', 'Retired', 'Disabled'
-        ], n_samples, p=[0.60, 0.15, 0.10, 0.08, 0.05, 0.02])
+        employment_status = np.random.choice(EMPLOYMENT_STATUSES[0], n_samples, p=EMPLOYMENT_STATUSES[1])
         
         # Access to healthcare (0-10 scale)
         healthcare_access = np.random.normal(7, 2, n_samples)
@@ -181,16 +396,7 @@ class MentalHealthDataGenerator:
         risk_score = np.clip(risk_score, 0, 100)
         
         # Determine risk level with more realistic thresholds
-        risk_levels = []
-        for score in risk_score:
-            if score < 15:
-                risk_levels.append('Low')
-            elif score < 35:
-                risk_levels.append('Moderate')
-            elif score < 55:
-                risk_levels.append('High')
-            else:
-                risk_levels.append('Critical')
+        levels = risk_levels(risk_score, OUTCOME_RISK_CUTOFFS)
         
         # Generate actual crisis events with higher base probability
         crisis_probability = np.maximum(risk_score / 100 * 0.15, 0.001)  # Minimum 0.1% probability
@@ -205,7 +411,7 @@ class MentalHealthDataGenerator:
         
         return pd.DataFrame({
             'risk_score': risk_score,
-            'risk_level': risk_levels,
+            'risk_level': levels,
             'crisis_event': crisis_events,
             'time_to_crisis_days': time_to_crisis
         })
@@ -213,20 +419,31 @@ class MentalHealthDataGenerator:
     def generate_dataset(self, n_samples=10000):
         """Generate complete dataset"""
         print(f"Generating {n_samples} patient records...")
-        
-        # Generate all feature categories
-        demographics = self.generate_demographics(n_samples)
-        family_history = self.generate_family_history(n_samples)
-        clinical_scores = self.generate_clinical_scores(n_samples)
-        behavioral = self.generate_behavioral_indicators(n_samples)
-        treatment_history = self.generate_treatment_history(n_samples)
-        environmental = self.generate_environmental_factors(n_samples)
-        
-        # Combine all features
-        features_df = pd.concat([
-            demographics, family_history, clinical_scores, 
-            behavioral, treatment_history, environmental
-        ], axis=1)
+        return self._generate_batch(n_samples)
+    
+    def iter_batches(self, n_samples, batch_size=100000):
+        """Generate the dataset as a stream of DataFrames of at most batch_size rows"""
+        for start in range(0, n_samples, batch_size):
+            yield self._generate_batch(min(batch_size, n_samples - start), first_id=start + 1)
+    
+    def _generate_batch(self, n_samples, first_id=1):
+        """Generate n_samples complete patient records numbered from first_id"""
+        if self.mode == 'copula':
+            features_df = self.generate_correlated_features(n_samples)
+        else:
+            # Generate all feature categories
+            demographics = self.generate_demographics(n_samples)
+            family_history = self.generate_family_history(n_samples)
+            clinical_scores = self.generate_clinical_scores(n_samples)
+            behavioral = self.generate_behavioral_indicators(n_samples)
+            treatment_history = self.generate_treatment_history(n_samples)
+            environmental = self.generate_environmental_factors(n_samples)
+            
+            # Combine all features
+            features_df = pd.concat([
+                demographics, family_history, clinical_scores, 
+                behavioral, treatment_history, environmental
+            ], axis=1)
         
         # Generate outcomes
         outcomes = self.generate_risk_outcomes(features_df, n_samples)
@@ -235,13 +452,97 @@ class MentalHealthDataGenerator:
         final_df = pd.concat([features_df, outcomes], axis=1)
         
         # Add patient ID
-        final_df.insert(0, 'patient_id', range(1, n_samples + 1))
+        final_df.insert(0, 'patient_id', range(first_id, first_id + n_samples))
         
         # Add timestamp
         final_df['assessment_date'] = datetime.now().strftime('%Y-%m-%d')
         
         return final_df
     
+    def iter_visit_batches(self, n_patients, n_visits, interval_days=30, persistence=0.85,
+                           patient_block=None, start_date=None):
+        """Longitudinal data: one DataFrame of visits per patient block and timestep
+        
+        Each patient's copula state (latent factors and per-feature noise) follows an AR(1)
+        process, state = persistence * state + sqrt(1 - persistence^2) * noise, updated for a
+        whole block of patients at once. Scores therefore drift gradually from visit to visit
+        while every visit keeps the snapshot marginals. Demographics and family history stay
+        fixed, age advances with time and attempt/hospitalization counts never decrease.
+        Memory is bounded by one block of patients, whatever the number of visits.
+        """
+        if not hasattr(self, 'tables'):
+            # Independent mode: the same machinery with no shared factors between features
+            self.rng = np.random.default_rng(np.random.randint(2**31))
+            self._setup_copula(loadings={})
+        patient_block = patient_block or self.block_size
+        start_date = np.datetime64(start_date or datetime.now().strftime('%Y-%m-%d'), 'D')
+        innovation = np.float32(np.sqrt(1 - persistence ** 2))
+        dynamic = [(j, column) for j, column in enumerate(self.copula_columns) if column not in STATIC_COLUMNS]
+        
+        for first in range(0, n_patients, patient_block):
+            size = min(patient_block, n_patients - first)
+            patient_ids = np.arange(first + 1, first + size + 1)
+            state = self._draw_state(size)
+            z = self._mix(state)
+            static = {column: self._apply_marginal(column, z[self.copula_columns.index(column)])
+                      for column in STATIC_COLUMNS}
+            static.update(self._nominal_columns(size))
+            running_max = {}
+            
+            for visit in range(n_visits):
+                if visit > 0:
+                    state *= np.float32(persistence)
+                    state += innovation * self.rng.standard_normal(state.shape, dtype=np.float32)
+                    z = self._mix(state)
+                    # Visits land a few days either side of the schedule
+                    days = visit * interval_days + self.rng.integers(-3, 4, size)
+                else:
+                    days = np.zeros(size, dtype=np.int64)
+                
+                features = dict(static)
+                for j, column in dynamic:
+                    values = self._apply_marginal(column, z[j])
+                    if column in CUMULATIVE_COLUMNS:
+                        values = running_max[column] = np.maximum(running_max.get(column, values), values)
+                    features[column] = values
+                features['age'] = np.minimum(static['age'] + days // 365, 85)
+                
+                features_df = pd.DataFrame({column: features[column] for column in FEATURE_COLUMNS}, copy=False)
+                batch = pd.concat([features_df, self.generate_risk_outcomes(features_df, size)], axis=1)
+                batch.insert(0, 'patient_id', patient_ids)
+                batch.insert(1, 'visit', visit)
+                batch['assessment_date'] = np.datetime_as_string(start_date + days.astype('timedelta64[D]'))
+                yield batch
+    
+    def save_batches(self, batches, filename):
+        """Stream batches into one CSV or Parquet file, holding a single batch in memory"""
+        rows = 0
+        if filename.endswith('.parquet'):
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise ImportError("Parquet output requires pyarrow: pip install pyarrow")
+            writer = None
+            try:
+                for batch in batches:
+                    table = pa.Table.from_pandas(batch, preserve_index=False,
+                                                 schema=writer.schema if writer else None)
+                    if writer is None:
+                        writer = pq.ParquetWriter(filename, table.schema)
+                    writer.write_table(table)
+                    rows += len(batch)
+            finally:
+                if writer is not None:
+                    writer.close()
+        else:
+            with open(filename, 'w', newline='', buffering=1 << 20) as f:
+                for batch in batches:
+                    batch.to_csv(f, header=rows == 0, index=False)
+                    rows += len(batch)
+        print(f"{rows:,} rows saved to {filename}")
+        return rows
+    
     def save_dataset(self, df, filename='mental_health_dataset.csv'):
         """Save dataset to CSV"""
         df.to_csv(filename, index=False)
@@ -250,16 +551,43 @@ class MentalHealthDataGenerator:
         print(f"Memory usage: {df.memory_usage(deep=True).sum() / 1024**2:.2f} MB")
 
 if __name__ == "__main__":
-    # Generate dataset
-    generator = MentalHealthDataGenerator(seed=42)
-    dataset = generator.generate_dataset(n_samples=50000)  # 50k records
+    parser = argparse.ArgumentParser(description="Generate the synthetic mental health dataset")
+    parser.add_argument('--samples', type=int, default=50000)
+    parser.add_argument('--mode', choices=['independent', 'copula'], default='independent',
+                        help="Draw features independently or from the correlated copula model")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='mental_health_dataset.csv')
+    parser.add_argument('--visits', type=int, default=1,
+                        help="Visits per patient; more than 1 streams a longitudinal dataset to --output")
+    parser.add_argument('--interval-days', type=int, default=30)
+    parser.add_argument('--persistence', type=float, default=0.85,
+                        help="Visit-to-visit autocorrelation of each patient's latent state")
+    args = parser.parse_args()
     
-    # Save dataset
-    generator.save_dataset(dataset, 'mental_health_dataset.csv')
+    generator = MentalHealthDataGenerator(seed=args.seed, mode=args.mode)
     
-    # Print summary statistics
-    print("\nDataset Summary:")
-    print(f"Total patients: {len(dataset)}")
-    print(f"Crisis events: {dataset['crisis_event'].sum()} ({dataset['crisis_event'].mean()*100:.2f}%)")
-    print(f"Risk level distribution:")
-    print(dataset['risk_level'].value_counts()) 
\ No newline at end of file
+    if args.visits > 1:
+        # Longitudinal visits are streamed straight to disk, one patient block and visit at a time
+        blocks = -(-args.samples // generator.block_size)
+        batches = generator.iter_visit_batches(args.samples, args.visits, args.interval_days, args.persistence)
+        generator.save_batches(tqdm(batches, total=blocks * args.visits, unit='batch'), args.output)
+    else:
+        # Generate dataset
+        dataset = generator.generate_dataset(n_samples=args.samples)
+        
+        # Save dataset
+        generator.save_dataset(dataset, args.output)
+        
+        # Cohort aggregates for the dashboard, built in chunks as a scoring worker would
+        aggregator = CohortAggregator(score_range=(0, 100))
+        for start in range(0, len(dataset), 10000):
+            aggregator.update(dataset.iloc[start:start + 10000])
+        aggregator.save(AGGREGATES_PATH)
+        
+        # Print summary statistics
+        cohort = aggregator.groups['cohort']['All']
+        print("\nDataset Summary:")
+        print(f"Total patients: {cohort.count}")
+        print(f"Crisis events: {cohort.crisis_events} ({cohort.crisis_events / cohort.count * 100:.2f}%)")
+        print(f"Risk level distribution:")
+        print(aggregator.summary('risk_level')[['risk_level', 'patients', 'crisis_rate']].to_string(index=False))
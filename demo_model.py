@@ -2,50 +2,18 @@ import pandas as pd
 import numpy as np
 import json
 from datetime import datetime
+from risk_engine import RISK_LEVEL_CUTOFFS, LEVEL_ASSETS, DEFAULT_LEVEL_ASSETS, explain, contributions_by_factor
+from assessment_result import AssessmentResult
+from scoring_backends import get_backend
 
 class SimpleMentalHealthDemo:
-    def __init__(self):
-        self.risk_weights = {
-            'phq9_score': 0.20,
-            'gad7_score': 0.15,
-            'hopelessness_score': 0.25,
-            'cssrs_score': 0.30,
-            'previous_suicide_attempts': 0.35,
-            'social_isolation': 0.10,
-            'substance_use': 0.12,
-            'recent_life_events': 0.08,
-            'family_suicide': 0.20,
-            'treatment_compliance': 0.05
-        }
-        
+    def __init__(self, backend=None):
+        # Shared heuristic scorer, chosen by RISK_SCORING_BACKEND unless given
+        self.scoring_backend = get_backend(backend)
+    
     def calculate_risk_score(self, patient_data):
         """Calculate risk score based on patient data"""
-        risk_score = 0
-        
-        # Add weighted contributions from each factor
-        for factor, weight in self.risk_weights.items():
-            if factor in patient_data:
-                # Normalize values based on their ranges
-                if factor == 'phq9_score':
-                    normalized_value = patient_data[factor] / 27
-                elif factor == 'gad7_score':
-                    normalized_value = patient_data[factor] / 21
-                elif factor == 'hopelessness_score':
-                    normalized_value = patient_data[factor] / 20
-                elif factor == 'cssrs_score':
-                    normalized_value = patient_data[factor] / 25
-                elif factor == 'social_isolation':
-                    normalized_value = patient_data[factor] / 10
-                elif factor == 'substance_use':
-                    normalized_value = patient_data[factor] / 10
-                elif factor == 'recent_life_events':
-                    normalized_value = patient_data[factor] / 8
-                elif factor == 'treatment_compliance':
-                    normalized_value = (100 - patient_data[factor]) / 100  # Inverted
-                else:
-                    normalized_value = min(patient_data[factor] / 5, 1)  # Cap at 1
-                
-                risk_score += normalized_value * weight
+        risk_score, _ = self.scoring_backend.score_patient(patient_data)
         
         # Add some randomness for realism
         risk_score += np.random.normal(0, 0.05)
@@ -55,48 +23,19 @@ class SimpleMentalHealthDemo:
     
     def determine_risk_level(self, risk_score):
         """Determine risk level based on score"""
-        if risk_score < 0.2:
+        low_cutoff, moderate_cutoff, high_cutoff = RISK_LEVEL_CUTOFFS
+        if risk_score < low_cutoff:
             return "Low"
-        elif risk_score < 0.4:
+        elif risk_score < moderate_cutoff:
             return "Moderate"
-        elif risk_score < 0.6:
+        elif risk_score < high_cutoff:
             return "High"
         else:
             return "Critical"
     
     def get_recommendations(self, risk_level):
         """Get clinical recommendations based on risk level"""
-        recommendations = {
-            "Low": [
-                "Regular therapy sessions",
-                "Medication management",
-                "Lifestyle recommendations",
-                "Support group referral",
-                "Regular reassessment"
-            ],
-            "Moderate": [
-                "Weekly therapy sessions",
-                "Safety planning",
-                "Medication review",
-                "Family involvement",
-                "Crisis hotline information"
-            ],
-            "High": [
-                "Immediate psychiatric evaluation",
-                "24/7 monitoring or hospitalization",
-                "Crisis intervention team activation",
-                "Remove access to lethal means",
-                "Family/caregiver notification"
-            ],
-            "Critical": [
-                "🚨 IMMEDIATE EMERGENCY INTERVENTION",
-                "Call 911 or emergency services",
-                "24/7 monitoring required",
-                "Psychiatric hospitalization",
-                "Crisis team activation"
-            ]
-        }
-        return recommendations.get(risk_level, ["Consult with mental health professional"])
+        return LEVEL_ASSETS.get(risk_level, DEFAULT_LEVEL_ASSETS)['recommendations']
     
     def assess_patient(self, patient_data):
         """Complete patient risk assessment"""
@@ -128,34 +67,12 @@ class SimpleMentalHealthDemo:
         
         # Risk factors analysis
         print("RISK FACTOR ANALYSIS:")
-        for factor, weight in self.risk_weights.items():
-            if factor in patient_data:
-                if factor == 'phq9_score':
-                    contribution = (patient_data[factor] / 27) * weight
-                elif factor == 'gad7_score':
-                    contribution = (patient_data[factor] / 21) * weight
-                elif factor == 'hopelessness_score':
-                    contribution = (patient_data[factor] / 20) * weight
-                elif factor == 'cssrs_score':
-                    contribution = (patient_data[factor] / 25) * weight
-                elif factor == 'social_isolation':
-                    contribution = (patient_data[factor] / 10) * weight
-                elif factor == 'substance_use':
-                    contribution = (patient_data[factor] / 10) * weight
-                elif factor == 'recent_life_events':
-                    contribution = (patient_data[factor] / 8) * weight
-                elif factor == 'treatment_compliance':
-                    contribution = ((100 - patient_data[factor]) / 100) * weight
-                else:
-                    contribution = min(patient_data[factor] / 5, 1) * weight
-                
-                print(f"  {factor.replace('_', ' ').title()}: {contribution:.3f}")
+        contributions = explain(patient_data)[0]
+        for factor, contribution in contributions_by_factor(contributions).items():
+            print(f"  {factor}: {contribution:.3f}")
         
-        return {
-            'risk_score': risk_score,
-            'risk_level': risk_level,
-            'recommendations': recommendations
-        }
+        return AssessmentResult(risk_score, risk_level, contributions, patient=patient_data,
+                                patient_id=patient_data.get('patient_id', patient_data.get('name')))
     
     def demo_multiple_patients(self):
         """Demonstrate with multiple patient scenarios"""
@@ -227,12 +144,7 @@ class SimpleMentalHealthDemo:
             print(f"ASSESSING: {patient['name']}")
             print(f"{'='*60}")
             
-            result = self.assess_patient(patient)
-            results.append({
-                'patient': patient['name'],
-                'risk_score': result['risk_score'],
-                'risk_level': result['risk_level']
-            })
+            results.append(self.assess_patient(patient))
             
             print(f"{'='*60}\n")
         
@@ -240,7 +152,7 @@ class SimpleMentalHealthDemo:
         print("SUMMARY OF ALL ASSESSMENTS:")
         print("-" * 50)
         for result in results:
-            print(f"{result['patient']}: {result['risk_level']} Risk ({result['risk_score']*100:.1f}%)")
+            print(f"{result.patient_id}: {result.risk_level} Risk ({result.risk_score*100:.1f}%)")
         
         return results
 
@@ -255,7 +167,6 @@ def main():
     # Run demonstration with multiple patients
     results = demo.demo_multiple_patients()
     
-    # Interactive assessment
     print("\n" + "=" * 60)
     print("INTERACTIVE ASSESSMENT")
     print("=" * 60)
@@ -310,6 +221,11 @@ def main():
         }
         
         demo.assess_patient(default_patient)
+        
+    except EOFError:
+        # Input ran out (e.g. run from a script with nothing piped in)
+        print("\n\nNo more input, skipping the interactive assessment.")
+        print("Use `python batch_cli.py <patients.csv> --csv <results.csv>` for batch scoring.")
     
     print("\n" + "=" * 60)
     print("DEMONSTRATION COMPLETE")
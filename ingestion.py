@@ -0,0 +1,160 @@
+import argparse
+import numpy as np
+import pandas as pd
+from risk_engine import RISK_FACTORS, FACTOR_RANGES
+
+# Per-field error codes in ValidatedBatch.errors
+OK, MISSING, NOT_NUMERIC, OUT_OF_RANGE, NOT_INTEGER = range(5)
+ERROR_REASONS = {
+    MISSING: 'missing',
+    NOT_NUMERIC: 'not numeric',
+    OUT_OF_RANGE: 'out of range',
+    NOT_INTEGER: 'not an integer'
+}
+
+# Declared schema of an incoming patient record: valid range, whether values must be whole
+# numbers and whether the field is required for scoring. Ranges match the app's sliders;
+# treatment compliance may be fractional since source systems record it as a percentage.
+SCHEMA = {factor: {'range': FACTOR_RANGES[factor], 'integer': True, 'required': True} for factor in RISK_FACTORS}
+SCHEMA['treatment_compliance']['integer'] = False
+SCHEMA['age'] = {'range': (18, 85), 'integer': True, 'required': False}
+
+
+class SchemaError(ValueError):
+    """A batch is missing columns that the schema requires"""
+
+
+class ValidatedBatch:
+    """A validated batch: contiguous scoring matrix plus per-row, per-field error codes
+
+    `matrix` has one row per input record and the RISK_FACTORS columns; rows that failed
+    validation are still present (with NaN where a value could not be read), so row i of
+    every array always refers to input record i. Use `valid` to select scorable rows.
+    """
+
+    def __init__(self, matrix, errors, fields):
+        self.matrix = matrix
+        self.errors = errors
+        self.fields = fields
+        self.valid = ~errors.any(axis=1)
+
+    def __len__(self):
+        return len(self.matrix)
+
+    @property
+    def n_invalid(self):
+        return int(len(self.valid) - self.valid.sum())
+
+    def valid_matrix(self):
+        """Contiguous matrix of the valid rows only"""
+        return self.matrix if self.valid.all() else np.ascontiguousarray(self.matrix[self.valid])
+
+    def error_summary(self):
+        """Count of invalid values per field and reason"""
+        rows = []
+        for j, field in enumerate(self.fields):
+            codes, counts = np.unique(self.errors[:, j], return_counts=True)
+            for code, count in zip(codes, counts):
+                if code != OK:
+                    rows.append({'field': field, 'reason': ERROR_REASONS[code], 'rows': int(count)})
+        return pd.DataFrame(rows, columns=['field', 'reason', 'rows'])
+
+    def row_errors(self, i):
+        """Human-readable problems of one row, e.g. ['phq9_score: out of range']"""
+        return [f"{field}: {ERROR_REASONS[code]}" for field, code in zip(self.fields, self.errors[i]) if code != OK]
+
+    def error_messages(self):
+        """'; '-joined problems for every invalid row, in row order; only invalid rows are formatted"""
+        return ['; '.join(self.row_errors(i)) for i in np.flatnonzero(~self.valid)]
+
+
+def _as_frame(records):
+    if isinstance(records, dict):
+        return pd.DataFrame([records])
+    if isinstance(records, list):
+        return pd.DataFrame.from_records(records)
+    if hasattr(records, 'to_pandas') and not isinstance(records, pd.DataFrame):
+        # pyarrow Table or RecordBatch
+        return records.to_pandas()
+    return records
+
+
+def validate_batch(records, schema=SCHEMA, require_columns=True, dtype=np.float64):
+    """Validate a whole batch column by column and build its scoring matrix
+
+    Every check is a vectorized operation over a column; no Python code runs per row.
+    Numeric columns are copied once, straight into the contiguous matrix, and text columns
+    are parsed with pd.to_numeric. A required column absent from the batch raises
+    SchemaError, unless require_columns is False (e.g. for streamed JSON records, where a
+    missing key is a per-record problem) in which case every row is marked missing.
+    """
+    frame = _as_frame(records)
+    n = len(frame)
+    fields = [field for field, spec in schema.items() if spec['required'] or field in frame]
+
+    missing_columns = [field for field in fields if schema[field]['required'] and field not in frame]
+    if missing_columns and require_columns:
+        raise SchemaError(f"Missing required columns: {', '.join(missing_columns)}")
+
+    matrix = np.empty((n, len(RISK_FACTORS)), dtype=dtype, order='C')
+    errors = np.zeros((n, len(fields)), dtype=np.int8)
+
+    for j, field in enumerate(fields):
+        spec = schema[field]
+        if field not in frame:
+            values = np.full(n, np.nan)
+            errors[:, j] = MISSING
+        else:
+            column = frame[field]
+            if pd.api.types.is_bool_dtype(column) or pd.api.types.is_numeric_dtype(column):
+                values = column.to_numpy(dtype=np.float64, na_value=np.nan)
+                absent = np.isnan(values)
+                errors[absent, j] = MISSING
+            else:
+                absent = column.isna().to_numpy()
+                values = pd.to_numeric(column, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+                errors[absent, j] = MISSING
+                errors[np.isnan(values) & ~absent, j] = NOT_NUMERIC
+
+            present = ~np.isnan(values)
+            low, high = spec['range']
+            with np.errstate(invalid='ignore'):
+                out_of_range = present & ((values < low) | (values > high))
+                errors[out_of_range, j] = OUT_OF_RANGE
+                if spec['integer']:
+                    errors[present & ~out_of_range & (values != np.floor(values)), j] = NOT_INTEGER
+
+        if field in RISK_FACTORS:
+            matrix[:, RISK_FACTORS.index(field)] = values
+
+    return ValidatedBatch(matrix, errors, fields)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate a patient file against the ingestion schema")
+    parser.add_argument('path', help="Patient records (.csv, .jsonl or .parquet)")
+    parser.add_argument('--chunksize', type=int, default=100000)
+    parser.add_argument('--show', type=int, default=10, help="Print the problems of this many invalid rows")
+    args = parser.parse_args()
+
+    from batch_cli import read_chunks
+
+    total = 0
+    invalid = 0
+    summaries = []
+    examples = []
+    for chunk in read_chunks(args.path, args.chunksize):
+        batch = validate_batch(chunk)
+        total += len(batch)
+        invalid += batch.n_invalid
+        summaries.append(batch.error_summary())
+        if len(examples) < args.show and batch.n_invalid:
+            rows = np.flatnonzero(~batch.valid)[:args.show - len(examples)]
+            examples.extend((total - len(batch) + i, '; '.join(batch.row_errors(i))) for i in rows)
+
+    print(f"{total:,} rows, {invalid:,} invalid ({invalid / max(total, 1):.2%})")
+    summary = pd.concat(summaries).groupby(['field', 'reason'], as_index=False)['rows'].sum()
+    if len(summary):
+        print(summary.to_string(index=False))
+    for row, problems in examples:
+        print(f"  row {row}: {problems}")
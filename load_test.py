@@ -0,0 +1,244 @@
+import os
+import sys
+import json
+import time
+import queue
+import platform
+import argparse
+import threading
+import subprocess
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from data_generator import MentalHealthDataGenerator
+from risk_engine import RISK_FACTORS, RECOMMENDATIONS, explain, heuristic_scores, risk_levels, contributions_by_factor
+from bulk_export import format_text_report
+
+RESULTS_DIR = 'load_results'
+
+# Patient fields sent with each request, as entered in the app's sidebar
+REQUEST_FIELDS = ['patient_id', 'age', 'gender', 'ethnicity'] + RISK_FACTORS
+
+_local = threading.local()
+
+
+def score_request(patient):
+    """The app's per-assessment scoring path: score, level, contributions and text report"""
+    contributions = explain(patient)
+    risk_score = float(heuristic_scores(None, contributions)[0])
+    risk_level = risk_levels(risk_score)
+    factor_contributions = contributions_by_factor(contributions[0])
+    format_text_report(patient, risk_score, risk_level, RECOMMENDATIONS[risk_level], factor_contributions)
+    return risk_level
+
+
+def pdf_request(patient):
+    """Scoring followed by the PDF report download"""
+    generator = getattr(_local, 'pdf_generator', None)
+    if generator is None:
+        # ReportLab and the chart cache are not shared between threads
+        from pdf_generator import MentalHealthPDFGenerator
+        generator = _local.pdf_generator = MentalHealthPDFGenerator()
+    contributions = explain(patient)
+    risk_score = float(heuristic_scores(None, contributions)[0])
+    risk_level = risk_levels(risk_score)
+    generator.generate_pdf_report(patient, risk_score, risk_level, RECOMMENDATIONS[risk_level], contributions[0])
+    return risk_level
+
+
+OPERATIONS = {
+    'score': score_request,
+    'pdf': pdf_request
+}
+
+
+def parse_mix(mix):
+    """'score=0.9,pdf=0.1' -> {'score': 0.9, 'pdf': 0.1}, normalized to sum to 1"""
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation '{name}' (expected one of {', '.join(OPERATIONS)})")
+        weights[name] = float(weight or 1)
+    total = sum(weights.values())
+    return {name: weight / total for name, weight in weights.items()}
+
+
+def build_requests(n_patients, n_requests, mix, seed=42):
+    """Deterministic request mix: the same seed and settings give the same requests on every release"""
+    patients = MentalHealthDataGenerator(seed=seed).generate_dataset(n_patients)
+    patients = json.loads(patients[REQUEST_FIELDS].to_json(orient='records'))
+    rng = np.random.default_rng(seed)
+    operations = rng.choice(list(mix), size=n_requests, p=list(mix.values()))
+    picks = rng.integers(0, len(patients), size=n_requests)
+    return [(str(op), patients[i]) for op, i in zip(operations, picks)]
+
+
+def percentiles(latencies):
+    if len(latencies) == 0:
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None, 'max_ms': None, 'mean_ms': None}
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    return {
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+        'max_ms': float(np.max(latencies) * 1000),
+        'mean_ms': float(np.mean(latencies) * 1000)
+    }
+
+
+def run_load(requests, rps, workers):
+    """Issue requests open-loop at a fixed rate and measure them with a pool of worker threads
+
+    Latency is measured from each request's scheduled start, not from when a worker picked it
+    up, so a saturated system shows its queueing delay instead of hiding it.
+    """
+    pending = queue.Queue()
+    samples = []
+    samples_lock = threading.Lock()
+
+    def worker():
+        local_samples = []
+        while True:
+            item = pending.get()
+            if item is None:
+                break
+            op, patient, scheduled = item
+            started = time.perf_counter()
+            try:
+                OPERATIONS[op](patient)
+                error = None
+            except Exception as e:
+                error = type(e).__name__
+            finished = time.perf_counter()
+            local_samples.append((op, finished - scheduled, finished - started, error))
+        with samples_lock:
+            samples.extend(local_samples)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    start = time.perf_counter()
+    for i, (op, patient) in enumerate(requests):
+        scheduled = start + i / rps
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        pending.put((op, patient, scheduled))
+    for _ in threads:
+        pending.put(None)
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    return pd.DataFrame(samples, columns=['operation', 'latency', 'service_time', 'error']), elapsed
+
+
+def summarize(samples, elapsed):
+    """Latency percentiles, throughput and error rate overall and per operation"""
+    def stats(group):
+        ok = group[group['error'].isna()]
+        return {
+            'requests': len(group),
+            'errors': int(group['error'].notna().sum()),
+            'error_rate': float(group['error'].notna().mean()) if len(group) else 0.0,
+            'throughput_rps': len(ok) / elapsed if elapsed > 0 else 0.0,
+            'latency': percentiles(ok['latency'].to_numpy()),
+            'service_time': percentiles(ok['service_time'].to_numpy()),
+            'error_types': group['error'].dropna().value_counts().to_dict()
+        }
+
+    summary = {'overall': stats(samples)}
+    for op, group in samples.groupby('operation'):
+        summary[op] = stats(group)
+    return summary
+
+
+def run_metadata(args):
+    """Everything needed to tell whether two result files are comparable"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    versions = {'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__}
+    try:
+        import reportlab
+        versions['reportlab'] = reportlab.Version
+    except ImportError:
+        pass
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': commit,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'versions': versions,
+        'config': {
+            'rps': args.rps,
+            'duration': args.duration,
+            'workers': args.workers,
+            'mix': args.mix,
+            'patients': args.patients,
+            'seed': args.seed
+        }
+    }
+
+
+def print_summary(summary, baseline=None):
+    for name, stats in summary.items():
+        latency = stats['latency']
+        line = (f"{name:>8}: {stats['requests']:,} requests, {stats['throughput_rps']:,.1f} req/s, "
+                f"{stats['error_rate']:.2%} errors")
+        if latency['p50_ms'] is not None:
+            line += f", p50 {latency['p50_ms']:.1f}ms p95 {latency['p95_ms']:.1f}ms p99 {latency['p99_ms']:.1f}ms"
+        print(line)
+        if baseline and name in baseline and latency['p99_ms'] is not None:
+            previous = baseline[name]['latency']['p99_ms']
+            if previous:
+                print(f"{'':>10}p99 vs baseline: {latency['p99_ms'] / previous - 1:+.1%} "
+                      f"({previous:.1f}ms -> {latency['p99_ms']:.1f}ms)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local load test of the scoring and PDF paths")
+    parser.add_argument('--rps', type=float, default=50.0, help="Target requests per second")
+    parser.add_argument('--duration', type=float, default=30.0, help="Seconds of load")
+    parser.add_argument('--workers', type=int, default=8, help="Concurrent worker threads")
+    parser.add_argument('--mix', default='score=0.95,pdf=0.05', help="Operation weights, e.g. score=0.9,pdf=0.1")
+    parser.add_argument('--patients', type=int, default=1000, help="Distinct generated patients to draw from")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=None, help=f"Results JSON (default: {RESULTS_DIR}/<timestamp>.json)")
+    parser.add_argument('--compare', default=None, help="Earlier results JSON to compare p99 latency against")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    requests = build_requests(args.patients, int(args.rps * args.duration), mix, seed=args.seed)
+
+    # Warm up each operation once so imports and font loading are not measured
+    for op in mix:
+        OPERATIONS[op](requests[0][1])
+
+    print(f"Running {len(requests):,} requests at {args.rps:g} req/s with {args.workers} workers...")
+    samples, elapsed = run_load(requests, args.rps, args.workers)
+    summary = summarize(samples, elapsed)
+
+    metadata = run_metadata(args)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        baseline = previous['results']
+        if previous['metadata']['config'] != metadata['config']:
+            print(f"Note: {args.compare} was run with a different configuration "
+                  f"({previous['metadata']['config']}); latencies are not directly comparable.")
+    print_summary(summary, baseline)
+    if summary['overall']['throughput_rps'] < 0.9 * args.rps:
+        print(f"Target of {args.rps:g} req/s was not sustained; the system is saturated at this load.",
+              file=sys.stderr)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({'metadata': metadata, 'elapsed_seconds': elapsed, 'results': summary}, f, indent=2)
+    print(f"Results saved to {output}")
@@ -0,0 +1,66 @@
+import os
+import streamlit as st
+from cohort_aggregates import CohortAggregator, AGGREGATES_PATH
+
+st.set_page_config(
+    page_title="Cohort Risk Dashboard",
+    page_icon="📊",
+    layout="wide"
+)
+
+DIMENSION_LABELS = {
+    'risk_level': 'Risk Level',
+    'gender': 'Gender',
+    'ethnicity': 'Ethnicity',
+    'socioeconomic_status': 'Socioeconomic Status'
+}
+
+@st.cache_data
+def load_aggregates(path, modified_at):
+    """Load an aggregates snapshot; the modification time keys the cache"""
+    return CohortAggregator.load(path)
+
+def main():
+    st.title("📊 Cohort Risk Dashboard")
+    
+    path = st.sidebar.text_input("Aggregates snapshot", AGGREGATES_PATH)
+    if not os.path.exists(path):
+        st.info("No aggregates snapshot found. Run `python data_generator.py`, "
+                "`python cohort_aggregates.py <dataset>` or `python stream_scoring.py --aggregates <path>` to create one.")
+        return
+    
+    if st.sidebar.button("Refresh"):
+        st.rerun()
+    
+    # The snapshot has a fixed size, so loading it costs the same for any cohort size
+    aggregator = load_aggregates(path, os.path.getmtime(path))
+    
+    if 'cohort' in aggregator.groups and 'All' in aggregator.groups['cohort']:
+        cohort = aggregator.groups['cohort']['All']
+        p50, p90, p99 = aggregator.quantiles('cohort', 'All')
+        
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Patients", f"{cohort.count:,}")
+        with col2:
+            st.metric("Crisis Rate", f"{cohort.crisis_events / max(cohort.count, 1):.2%}")
+        with col3:
+            st.metric("Mean Risk Score", f"{cohort.mean:.3f}")
+        with col4:
+            st.metric("P90 / P99 Risk Score", f"{p90:.3f} / {p99:.3f}")
+    
+    st.caption(f"Last updated: {aggregator.updated_at}")
+    
+    for dimension, label in DIMENSION_LABELS.items():
+        if dimension not in aggregator.groups or not aggregator.groups[dimension]:
+            continue
+        st.subheader(f"By {label}")
+        summary = aggregator.summary(dimension)
+        
+        col1, col2 = st.columns([3, 2])
+        with col1:
+            st.dataframe(summary, hide_index=True)
+        with col2:
+            st.bar_chart(summary.set_index(dimension)['crisis_rate'])
+
+main()
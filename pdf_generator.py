@@ -1,5 +1,8 @@
 import io
-import matplotlib.pyplot as plt
+import re
+from array import array
+from collections import OrderedDict
+from matplotlib.figure import Figure
 import matplotlib.patches as patches
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
@@ -9,68 +12,242 @@ from reportlab.lib import colors
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
 import numpy as np
 from datetime import datetime
+from risk_engine import LEVEL_ASSETS, DEFAULT_LEVEL_ASSETS, explain, contributions_by_factor
+
+class _ChartBuffer(io.RawIOBase):
+    """Read-only seekable file over a memoryview of a rendered chart
+    
+    Cached chart PNGs stay in the buffer matplotlib rendered into; every report that
+    uses them reads through a view instead of getting its own copy.
+    """
+    
+    def __init__(self, view):
+        super().__init__()
+        self._view = view
+        self._pos = 0
+    
+    def readable(self):
+        return True
+    
+    def seekable(self):
+        return True
+    
+    def readinto(self, b):
+        n = max(0, min(len(b), len(self._view) - self._pos))
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+    
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._pos = offset
+        return self._pos
+    
+    def tell(self):
+        return self._pos
+
+class _CountingWriter:
+    """Pass-through writer for files and sockets that counts the bytes written"""
+    
+    def __init__(self, target):
+        self._write = target.write if hasattr(target, 'write') else target.sendall
+        self.name = getattr(target, 'name', '')
+        self.bytes_written = 0
+    
+    def write(self, data):
+        self._write(data)
+        self.bytes_written += len(data)
+        return len(data)
+    
+    def flush(self):
+        pass
+
+class _PdfConcatenator:
+    """Appends ReportLab-generated PDFs, one after another, to a single PDF output
+    
+    Each document's objects are copied through as soon as it is added, renumbered so
+    they follow the previous document's, and its pages are attached to one shared page
+    tree. Only the byte offset of every object is kept for the final xref table, so
+    memory does not grow with the number of documents. Relies on the layout ReportLab
+    writes: a classic xref table, a flat page tree and no encryption.
+    """
+    
+    _REF = re.compile(rb'(\d+) 0 R')
+    
+    def __init__(self, output):
+        self._out = _CountingWriter(output)
+        self._offsets = array('q')
+        self._kids = []
+        self._out.write(b"%PDF-1.4\n%\x93\x8c\x8b\x9e\n")
+    
+    def _reference(self, data, key):
+        return int(re.search(rb'/' + key + rb' (\d+) 0 R', data).group(1))
+    
+    def append(self, pdf):
+        """Copy the pages of one complete PDF (bytes) to the output"""
+        xref_at = int(pdf[pdf.rindex(b'startxref') + 9:].split()[0])
+        header, _, table = pdf[xref_at:pdf.index(b'trailer', xref_at)].partition(b'\n')
+        first, size = map(int, table.split(b'\n', 1)[0].split())
+        entries = table.split(b'\n', 1)[1].split()
+        offsets = {first + i: int(entries[3 * i]) for i in range(size)
+                   if entries[3 * i + 2] == b'n'}
+        ends = sorted(offsets.values()) + [xref_at]
+        bodies = {number: pdf[offset:ends[ends.index(offset) + 1]] for number, offset in offsets.items()}
+        
+        trailer = pdf[pdf.index(b'trailer', xref_at):]
+        root = self._reference(trailer, b'Root')
+        info = self._reference(trailer, b'Info')
+        pages = self._reference(bodies[root], b'Pages')
+        kids = [int(n) for n in self._REF.findall(re.search(rb'/Kids \[([^\]]*)\]', bodies[pages]).group(1))]
+        
+        # Catalog, page tree and document info are replaced by the combined document's own
+        kept = sorted(number for number in offsets if number not in (root, info, pages))
+        # Object 1 is the combined catalog and 2 the combined page tree; see close()
+        base = len(self._offsets) + 3
+        numbers = {number: base + i for i, number in enumerate(kept)}
+        numbers[pages] = 2
+        
+        def renumber(match):
+            return b'%d 0 R' % numbers[int(match.group(1))]
+        
+        for number in kept:
+            body = bodies[number]
+            # Only the object header and dictionary hold references; stream data is copied as is
+            split = body.find(b'stream')
+            split = len(body) if split < 0 else split
+            head = self._REF.sub(renumber, body[body.index(b'obj'):split])
+            self._offsets.append(self._out.bytes_written)
+            self._out.write(b'%d 0 ' % numbers[number] + head + body[split:])
+        self._kids.extend(numbers[kid] for kid in kids)
+    
+    def close(self):
+        """Write the shared catalog and page tree, the xref table and the trailer"""
+        catalog_at = self._out.bytes_written
+        self._out.write(b"1 0 obj\n<<\n/Pages 2 0 R /Type /Catalog\n>>\nendobj\n")
+        pages_at = self._out.bytes_written
+        kids = b' '.join(b'%d 0 R' % kid for kid in self._kids)
+        self._out.write(b"2 0 obj\n<<\n/Count %d /Kids [ %s ] /Type /Pages\n>>\nendobj\n" % (len(self._kids), kids))
+        
+        xref_at = self._out.bytes_written
+        size = len(self._offsets) + 3
+        self._out.write(b"xref\n0 %d\n0000000000 65535 f \n" % size)
+        self._out.write(b"%010d 00000 n \n%010d 00000 n \n" % (catalog_at, pages_at))
+        for offset in self._offsets:
+            self._out.write(b"%010d 00000 n \n" % offset)
+        self._out.write(b"trailer\n<<\n/Root 1 0 R /Size %d\n>>\nstartxref\n%d\n%%%%EOF\n" % (size, xref_at))
+        return self._out.bytes_written
+
+def _build_report_styles():
+    """Custom paragraph styles of the report, shared by every generator"""
+    sample = getSampleStyleSheet()
+    styles = {}
+    
+    # Title style
+    styles['title_style'] = ParagraphStyle(
+        'CustomTitle',
+        parent=sample['Heading1'],
+        fontSize=24,
+        spaceAfter=30,
+        alignment=TA_CENTER,
+        textColor=colors.HexColor('#1f77b4')
+    )
+    
+    # Section header style
+    styles['section_style'] = ParagraphStyle(
+        'CustomSection',
+        parent=sample['Heading2'],
+        fontSize=16,
+        spaceAfter=12,
+        spaceBefore=20,
+        textColor=colors.HexColor('#2c3e50')
+    )
+    
+    # Normal text style
+    styles['normal_style'] = ParagraphStyle(
+        'CustomNormal',
+        parent=sample['Normal'],
+        fontSize=11,
+        spaceAfter=6
+    )
+    
+    # Risk level style
+    styles['risk_style'] = ParagraphStyle(
+        'RiskLevel',
+        parent=sample['Normal'],
+        fontSize=14,
+        spaceAfter=6,
+        alignment=TA_CENTER,
+        textColor=colors.white,
+        backColor=colors.HexColor('#e74c3c')
+    )
+    
+    # Footer style
+    styles['footer_style'] = ParagraphStyle(
+        'Footer',
+        parent=sample['Normal'],
+        fontSize=9,
+        alignment=TA_CENTER,
+        textColor=colors.grey
+    )
+    
+    return sample, styles
+
+REPORT_SAMPLE_STYLES, REPORT_STYLES = _build_report_styles()
+
+def _build_level_texts(assets):
+    """Recommendation lines and lookups of one risk level's recommendations section"""
+    return {
+        'recommendations': list(assets['recommendations']),
+        'lines': [f"{i}. {rec}" for i, rec in enumerate(assets['recommendations'], 1)],
+        'action': assets['report_action'],
+        'color': assets['color']
+    }
+
+# Per-level report text, built once at import. Only immutable strings are shared:
+# Paragraph flowables keep layout state from wrap() and split(), so every document
+# builds its own.
+LEVEL_TEXTS = {level: _build_level_texts(assets) for level, assets in LEVEL_ASSETS.items()}
+DEFAULT_LEVEL_TEXTS = _build_level_texts(DEFAULT_LEVEL_ASSETS)
+
+# Headings, notes and footer are the same in every report
+REPORT_NOTES = [
+    "• This assessment is for clinical reference only and should not replace professional judgment",
+    "• All treatment decisions should be made by qualified mental health professionals",
+    "• For emergency situations, contact 911 or emergency services immediately",
+    "• This report should be kept confidential and secure in accordance with HIPAA guidelines",
+    "• Regular reassessment is recommended to monitor risk level changes"
+]
+REPORT_TITLE = "MENTAL HEALTH RISK ASSESSMENT REPORT"
+REPORT_FOOTER = "Generated by Mental Health Risk Assessment System"
 
 class MentalHealthPDFGenerator:
+    # Total PNG bytes of rendered chart images kept for reuse across reports
+    CHART_CACHE_BYTES = 16 * 1024**2
+    
     def __init__(self):
-        self.styles = getSampleStyleSheet()
+        self.styles = REPORT_SAMPLE_STYLES
         self.setup_custom_styles()
+        self._chart_cache = OrderedDict()
+        self._chart_cache_bytes = 0
     
     def setup_custom_styles(self):
         """Setup custom paragraph styles for the report"""
-        # Title style
-        self.title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=self.styles['Heading1'],
-            fontSize=24,
-            spaceAfter=30,
-            alignment=TA_CENTER,
-            textColor=colors.HexColor('#1f77b4')
-        )
-        
-        # Section header style
-        self.section_style = ParagraphStyle(
-            'CustomSection',
-            parent=self.styles['Heading2'],
-            fontSize=16,
-            spaceAfter=12,
-            spaceBefore=20,
-            textColor=colors.HexColor('#2c3e50')
-        )
-        
-        # Normal text style
-        self.normal_style = ParagraphStyle(
-            'CustomNormal',
-            parent=self.styles['Normal'],
-            fontSize=11,
-            spaceAfter=6
-        )
-        
-        # Risk level style
-        self.risk_style = ParagraphStyle(
-            'RiskLevel',
-            parent=self.styles['Normal'],
-            fontSize=14,
-            spaceAfter=6,
-            alignment=TA_CENTER,
-            textColor=colors.white,
-            backColor=colors.HexColor('#e74c3c')
-        )
+        for name, style in REPORT_STYLES.items():
+            setattr(self, name, style)
     
     def create_risk_gauge_chart(self, risk_score, risk_level):
         """Create a risk gauge chart"""
-        fig, ax = plt.subplots(figsize=(8, 4))
+        fig = Figure(figsize=(8, 4))
+        ax = fig.subplots()
         
         # Create gauge
         theta = np.linspace(0, np.pi, 100)
         radius = 1
         
-        # Color mapping for risk levels
-        color_map = {
-            'Low': '#2ecc71',
-            'Moderate': '#f39c12', 
-            'High': '#e67e22',
-            'Critical': '#e74c3c'
-        }
+        color = self.get_risk_color(risk_level)
         
         # Create the gauge arc
         ax.plot(radius * np.cos(theta), radius * np.sin(theta), 'k-', linewidth=3)
@@ -79,11 +256,11 @@ class MentalHealthPDFGenerator:
         risk_angle = risk_score * np.pi
         theta_fill = np.linspace(0, risk_angle, 50)
         ax.fill_between(radius * np.cos(theta_fill), 0, radius * np.sin(theta_fill), 
-                       color=color_map.get(risk_level, '#e74c3c'), alpha=0.7)
+                       color=color, alpha=0.7)
         
         # Add risk level text
         ax.text(0, -0.3, risk_level, ha='center', va='center', fontsize=16, fontweight='bold',
-               color=color_map.get(risk_level, '#e74c3c'))
+               color=color)
         
         # Add percentage
         ax.text(0, -0.6, f'{risk_score*100:.1f}%', ha='center', va='center', fontsize=14)
@@ -99,16 +276,16 @@ class MentalHealthPDFGenerator:
         
         # Save to buffer
         img_buffer = io.BytesIO()
-        plt.savefig(img_buffer, format='png', dpi=150, bbox_inches='tight', 
-                   facecolor='white', edgecolor='none')
+        fig.savefig(img_buffer, format='png', dpi=150, bbox_inches='tight', 
+                    facecolor='white', edgecolor='none')
         img_buffer.seek(0)
-        plt.close()
         
         return img_buffer
     
     def create_risk_factors_chart(self, risk_factors):
         """Create a bar chart of risk factors"""
-        fig, ax = plt.subplots(figsize=(10, 6))
+        fig = Figure(figsize=(10, 6))
+        ax = fig.subplots()
         
         factors = list(risk_factors.keys())
         values = list(risk_factors.values())
@@ -127,16 +304,16 @@ class MentalHealthPDFGenerator:
         
         # Save to buffer
         img_buffer = io.BytesIO()
-        plt.savefig(img_buffer, format='png', dpi=150, bbox_inches='tight', 
-                   facecolor='white', edgecolor='none')
+        fig.savefig(img_buffer, format='png', dpi=150, bbox_inches='tight', 
+                    facecolor='white', edgecolor='none')
         img_buffer.seek(0)
-        plt.close()
         
         return img_buffer
     
     def create_clinical_scores_chart(self, clinical_scores):
         """Create a radar chart for clinical scores"""
-        fig, ax = plt.subplots(figsize=(8, 8), subplot_kw=dict(projection='polar'))
+        fig = Figure(figsize=(8, 8))
+        ax = fig.subplots(subplot_kw=dict(projection='polar'))
         
         categories = list(clinical_scores.keys())
         values = list(clinical_scores.values())
@@ -156,35 +333,56 @@ class MentalHealthPDFGenerator:
         
         # Save to buffer
         img_buffer = io.BytesIO()
-        plt.savefig(img_buffer, format='png', dpi=150, bbox_inches='tight', 
-                   facecolor='white', edgecolor='none')
+        fig.savefig(img_buffer, format='png', dpi=150, bbox_inches='tight', 
+                    facecolor='white', edgecolor='none')
         img_buffer.seek(0)
-        plt.close()
         
         return img_buffer
     
     def get_risk_color(self, risk_level):
         """Get color for risk level"""
-        color_map = {
-            'Low': '#2ecc71',
-            'Moderate': '#f39c12',
-            'High': '#e67e22', 
-            'Critical': '#e74c3c'
-        }
-        return color_map.get(risk_level, '#e74c3c')
+        return LEVEL_TEXTS.get(risk_level, DEFAULT_LEVEL_TEXTS)['color']
     
-    def generate_pdf_report(self, patient_data, risk_score, risk_level, recommendations):
-        """Generate comprehensive PDF report"""
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=72, leftMargin=72, 
-                              topMargin=72, bottomMargin=72)
+    def _chart_image(self, key, render, width, height):
+        """Image flowable for a chart, rendering it only if an identical one is not cached
+        
+        Identical charts share the same PNG bytes, which ReportLab also embeds only once
+        per document.
+        """
+        png = self._chart_cache.get(key)
+        if png is None:
+            png = render().getbuffer()
+            self._chart_cache[key] = png
+            self._chart_cache_bytes += png.nbytes
+            # The newest chart always stays, even if it alone is over the limit
+            while self._chart_cache_bytes > self.CHART_CACHE_BYTES and len(self._chart_cache) > 1:
+                self._chart_cache_bytes -= self._chart_cache.popitem(last=False)[1].nbytes
+        else:
+            self._chart_cache.move_to_end(key)
+        return Image(_ChartBuffer(png), width=width, height=height)
+    
+    def _create_doc(self, output):
+        """Document template writing to a path or file handle"""
+        return SimpleDocTemplate(output, pagesize=A4, rightMargin=72, leftMargin=72, 
+                                 topMargin=72, bottomMargin=72)
+    
+    def build_report_story(self, patient_data, risk_score, risk_level, recommendations, contributions=None):
+        """Flowables of one patient's report
         
+        contributions is the patient's row of the risk_engine contribution matrix; it is
+        computed here only when the caller has not already done so.
+        """
         story = []
         
         # Title
-        story.append(Paragraph("MENTAL HEALTH RISK ASSESSMENT REPORT", self.title_style))
+        story.append(Paragraph(REPORT_TITLE, self.title_style))
         story.append(Spacer(1, 20))
         
+        # Patient identifier, when reports are combined
+        patient_label = patient_data.get('name') or patient_data.get('patient_id')
+        if patient_label is not None:
+            story.append(Paragraph(f"Patient: {patient_label}", self.normal_style))
+        
         # Assessment date
         story.append(Paragraph(f"Assessment Date: {datetime.now().strftime('%B %d, %Y at %I:%M %p')}", 
                               self.normal_style))
@@ -194,8 +392,11 @@ class MentalHealthPDFGenerator:
         story.append(Paragraph("RISK ASSESSMENT SUMMARY", self.section_style))
         
         # Risk gauge chart
-        gauge_img = self.create_risk_gauge_chart(risk_score, risk_level)
-        story.append(Image(gauge_img, width=6*inch, height=3*inch))
+        story.append(self._chart_image(
+            ('gauge', round(risk_score, 3), risk_level),
+            lambda: self.create_risk_gauge_chart(risk_score, risk_level),
+            width=6*inch, height=3*inch
+        ))
         story.append(Spacer(1, 10))
         
         # Risk summary table
@@ -270,72 +471,102 @@ class MentalHealthPDFGenerator:
             'CSSRS\n(Suicide Risk)': patient_data['cssrs_score'] / 25 * 100
         }
         
-        radar_img = self.create_clinical_scores_chart(clinical_scores)
-        story.append(Image(radar_img, width=6*inch, height=6*inch))
+        story.append(self._chart_image(
+            ('radar',) + tuple(round(value, 2) for value in clinical_scores.values()),
+            lambda: self.create_clinical_scores_chart(clinical_scores),
+            width=6*inch, height=6*inch
+        ))
         story.append(Spacer(1, 20))
         
         # Risk Factors Analysis
         story.append(Paragraph("RISK FACTOR ANALYSIS", self.section_style))
         
-        risk_factors = {
-            'Depression (PHQ-9)': patient_data['phq9_score'] / 27 * 0.20,
-            'Anxiety (GAD-7)': patient_data['gad7_score'] / 21 * 0.15,
-            'Hopelessness': patient_data['hopelessness_score'] / 20 * 0.25,
-            'Suicide Risk (CSSRS)': patient_data['cssrs_score'] / 25 * 0.30,
-            'Previous Attempts': patient_data['previous_suicide_attempts'] / 5 * 0.35,
-            'Social Isolation': patient_data['social_isolation'] / 10 * 0.10,
-            'Substance Use': patient_data['substance_use'] / 10 * 0.12,
-            'Life Events': patient_data['recent_life_events'] / 8 * 0.08
-        }
+        if contributions is None:
+            contributions = explain(patient_data)[0]
+        risk_factors = contributions_by_factor(contributions)
         
-        factors_img = self.create_risk_factors_chart(risk_factors)
-        story.append(Image(factors_img, width=6*inch, height=4*inch))
+        story.append(self._chart_image(
+            ('factors',) + tuple(round(value, 3) for value in risk_factors.values()),
+            lambda: self.create_risk_factors_chart(risk_factors),
+            width=6*inch, height=4*inch
+        ))
         story.append(Spacer(1, 20))
         
         # Clinical Recommendations
         story.append(Paragraph("CLINICAL RECOMMENDATIONS", self.section_style))
         
-        for i, rec in enumerate(recommendations, 1):
-            story.append(Paragraph(f"{i}. {rec}", self.normal_style))
+        # The level's standard recommendation lines are formatted once; custom lists here
+        level_texts = LEVEL_TEXTS.get(risk_level, DEFAULT_LEVEL_TEXTS)
+        if list(recommendations) == level_texts['recommendations']:
+            lines = level_texts['lines']
+        else:
+            lines = [f"{i}. {rec}" for i, rec in enumerate(recommendations, 1)]
+        for line in lines:
+            story.append(Paragraph(line, self.normal_style))
         
         story.append(Spacer(1, 20))
         
         # Important Notes
         story.append(Paragraph("IMPORTANT NOTES", self.section_style))
-        
-        notes = [
-            "• This assessment is for clinical reference only and should not replace professional judgment",
-            "• All treatment decisions should be made by qualified mental health professionals",
-            "• For emergency situations, contact 911 or emergency services immediately",
-            "• This report should be kept confidential and secure in accordance with HIPAA guidelines",
-            "• Regular reassessment is recommended to monitor risk level changes"
-        ]
-        
-        for note in notes:
-            story.append(Paragraph(note, self.normal_style))
+        story.extend(Paragraph(note, self.normal_style) for note in REPORT_NOTES)
         
         story.append(Spacer(1, 20))
         
         # Footer
-        story.append(Paragraph("Generated by Mental Health Risk Assessment System", 
-                              ParagraphStyle('Footer', parent=self.styles['Normal'], 
-                                           fontSize=9, alignment=TA_CENTER, 
-                                           textColor=colors.grey)))
+        story.append(Paragraph(REPORT_FOOTER, self.footer_style))
+        
+        return story
+    
+    def write_pdf_report(self, output, patient_data, risk_score, risk_level, recommendations, contributions=None):
+        """Write a PDF report straight to a file handle or socket and return the bytes written
+        
+        Nothing is buffered on top of ReportLab's own document assembly, so the caller
+        decides where the bytes go (disk, socket, or an in-memory buffer).
+        """
+        writer = _CountingWriter(output)
+        doc = self._create_doc(writer)
         
         # Build PDF
-        doc.build(story)
+        doc.build(self.build_report_story(patient_data, risk_score, risk_level, recommendations, contributions))
+        return writer.bytes_written
+    
+    def generate_pdf_report(self, patient_data, risk_score, risk_level, recommendations, contributions=None):
+        """Generate comprehensive PDF report in an in-memory buffer"""
+        buffer = io.BytesIO()
+        self.write_pdf_report(buffer, patient_data, risk_score, risk_level, recommendations, contributions)
         buffer.seek(0)
         return buffer
     
+    def generate_combined_report(self, patients, output):
+        """Generate one PDF with a report per patient, written to a path or file handle
+        
+        patients is an iterable of dicts with the generate_pdf_report arguments
+        (patient_data, risk_score, risk_level, recommendations and optionally contributions).
+        ReportLab keeps every page of a document until it is saved, so each patient is
+        built as a document of its own and its pages are copied to the output straight
+        away; only one patient's report is held in memory at a time. Identical charts
+        are rendered once, but embedded once per patient. Returns the number of reports
+        written.
+        """
+        if isinstance(output, str):
+            with open(output, 'wb') as f:
+                return self.generate_combined_report(patients, f)
+        
+        combined = _PdfConcatenator(output)
+        count = 0
+        for patient in patients:
+            report = self.generate_pdf_report(
+                patient['patient_data'], patient['risk_score'], patient['risk_level'],
+                patient['recommendations'], patient.get('contributions')
+            )
+            combined.append(report.getvalue())
+            count += 1
+        combined.close()
+        return count
+    
     def get_recommended_action(self, risk_level):
         """Get recommended action based on risk level"""
-        actions = {
-            'Low': 'Regular Check-ins and Standard Care',
-            'Moderate': 'Enhanced Monitoring and Safety Planning',
-            'High': 'Immediate Psychiatric Evaluation and Crisis Intervention',
-            'Critical': 'Emergency Intervention and 24/7 Monitoring'
-        }
-        return actions.get(risk_level, 'Consult with mental health professional')
+        return LEVEL_TEXTS.get(risk_level, DEFAULT_LEVEL_TEXTS)['action']
 
 if __name__ == "__main__":
     # Test the PDF generator
@@ -368,10 +599,8 @@ if __name__ == "__main__":
         'Family/caregiver notification'
     ]
     
-    pdf_buffer = generator.generate_pdf_report(patient_data, risk_score, risk_level, recommendations)
-    
     # Save test PDF
     with open('test_report.pdf', 'wb') as f:
-        f.write(pdf_buffer.getvalue())
+        bytes_written = generator.write_pdf_report(f, patient_data, risk_score, risk_level, recommendations)
     
-    print("Test PDF generated successfully!") 
\ No newline at end of file
+    print(f"Test PDF generated successfully! ({bytes_written:,} bytes)")
@@ -0,0 +1,585 @@
+import os
+import json
+import time
+import random
+import asyncio
+import sqlite3
+import argparse
+import threading
+from datetime import datetime
+from urllib.parse import urlsplit
+from concurrent.futures import ProcessPoolExecutor
+from risk_engine import feature_matrix, contribution_matrix, heuristic_scores, risk_levels
+from batch_cli import read_chunks, init_pdf_worker, render_pdf
+
+QUEUE_PATH = 'delivery_queue.db'
+SPOOL_DIR = 'delivery_spool'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    report_id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    spool_path TEXT,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS deliveries (
+    id INTEGER PRIMARY KEY,
+    report_id TEXT NOT NULL REFERENCES reports (report_id),
+    destination TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    updated_at REAL NOT NULL,
+    UNIQUE (report_id, destination)
+);
+CREATE INDEX IF NOT EXISTS idx_deliveries_status ON deliveries (status, report_id);
+CREATE INDEX IF NOT EXISTS idx_reports_created ON reports (created_at, report_id);
+"""
+
+# Reports read from the queue table per query while delivering a backlog
+PENDING_PAGE_SIZE = 1000
+
+
+class DeliveryError(Exception):
+    """A destination rejected or failed to receive a report"""
+
+
+class DeliveryQueue:
+    """Persistent SQLite queue of reports and their per-destination delivery state
+
+    A report is rendered once into the spool directory; each of its deliveries then moves
+    pending -> in_flight -> delivered / failed. Anything still in flight when the process
+    stops is put back to pending on the next open, so a restart resumes where it left off.
+    """
+
+    def __init__(self, path=QUEUE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        with self._conn:
+            self._conn.execute("UPDATE deliveries SET status = 'pending' WHERE status = 'in_flight'")
+
+    def close(self):
+        self._conn.close()
+
+    def enqueue(self, report_id, payload, destinations):
+        """Add one report for delivery to each named destination"""
+        self.enqueue_many([(report_id, payload)], destinations)
+
+    def enqueue_many(self, reports, destinations):
+        """Add (report_id, payload) pairs for delivery to each named destination, in one transaction"""
+        now = time.time()
+        rows = [(report_id, json.dumps(payload), now) for report_id, payload in reports]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO reports (report_id, payload, created_at) VALUES (?, ?, ?)", rows
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO deliveries (report_id, destination, updated_at) VALUES (?, ?, ?)",
+                [(row[0], destination, now) for row in rows for destination in destinations]
+            )
+
+    def pending_page(self, after=None, page_size=PENDING_PAGE_SIZE):
+        """One page of reports with undelivered destinations, oldest first
+
+        Returns the page's (report_id, payload, spool_path, destinations) tuples and the cursor
+        to pass as `after` for the next page, or None once the backlog is exhausted. Paging
+        continues after the last report seen, so reports whose deliveries change state
+        meanwhile are neither skipped nor repeated.
+        """
+        cursor = after or (float('-inf'), '')
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT r.report_id, r.payload, r.spool_path, r.created_at, "
+                "(SELECT group_concat(d.destination, char(10)) FROM deliveries d "
+                " WHERE d.report_id = r.report_id AND d.status = 'pending') "
+                "FROM reports r "
+                "WHERE (r.created_at > ? OR (r.created_at = ? AND r.report_id > ?)) "
+                "AND EXISTS (SELECT 1 FROM deliveries d WHERE d.report_id = r.report_id AND d.status = 'pending') "
+                "ORDER BY r.created_at, r.report_id LIMIT ?",
+                (cursor[0], cursor[0], cursor[1], page_size)
+            ).fetchall()
+        # Deliveries can leave 'pending' between the two subqueries
+        reports = [(report_id, json.loads(payload), spool_path, destinations.split('\n'))
+                   for report_id, payload, spool_path, created_at, destinations in rows if destinations]
+        return reports, ((rows[-1][3], rows[-1][0]) if len(rows) == page_size else None)
+
+    def pending_reports(self, page_size=PENDING_PAGE_SIZE):
+        """Reports with undelivered destinations: (report_id, payload, spool_path, destinations)
+
+        Yields them oldest first, reading page_size reports per query, so only one page of a
+        large backlog is in memory at a time.
+        """
+        after = None
+        while True:
+            reports, after = self.pending_page(after, page_size)
+            yield from reports
+            if after is None:
+                return
+
+    def mark_rendered(self, report_id, spool_path):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE reports SET spool_path = ? WHERE report_id = ?", (spool_path, report_id))
+
+    def update(self, report_id, destination, status, error=None):
+        """Record a delivery state change; each non-pending transition counts as an attempt"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE deliveries SET status = ?, last_error = ?, updated_at = ?, "
+                "attempts = attempts + (CASE WHEN ? = 'in_flight' THEN 1 ELSE 0 END) "
+                "WHERE report_id = ? AND destination = ?",
+                (status, error, time.time(), status, report_id, destination)
+            )
+
+    def outstanding(self, report_id):
+        """Deliveries of a report that are not yet delivered or permanently failed"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM deliveries WHERE report_id = ? AND status IN ('pending', 'in_flight')",
+                (report_id,)
+            ).fetchone()[0]
+
+    def counts(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT destination, status, COUNT(*) FROM deliveries GROUP BY destination, status"
+            ).fetchall()
+        counts = {}
+        for destination, status, n in rows:
+            counts.setdefault(destination, {})[status] = n
+        return counts
+
+
+def _read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _write_file(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+class ConnectionPool:
+    """Reuses open asyncio streams to one host instead of reconnecting per report"""
+
+    def __init__(self, host, port, size=4):
+        self.host = host
+        self.port = port
+        self.size = size
+        self.opened = 0
+        self._idle = asyncio.LifoQueue()
+        self._slots = asyncio.Semaphore(size)
+
+    async def acquire(self):
+        await self._slots.acquire()
+        while not self._idle.empty():
+            reader, writer = self._idle.get_nowait()
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer
+            # The server hung up on this idle connection; close our end before replacing it
+            await self._close_writer(writer)
+        try:
+            self.opened += 1
+            return await asyncio.open_connection(self.host, self.port)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    @staticmethod
+    async def _close_writer(writer):
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+
+    def release(self, connection, reusable=True):
+        if reusable:
+            self._idle.put_nowait(connection)
+        else:
+            connection[1].close()
+        self._slots.release()
+
+    async def close(self):
+        while not self._idle.empty():
+            _, writer = self._idle.get_nowait()
+            await self._close_writer(writer)
+
+
+class LocalDirectoryDestination:
+    """Writes reports into a directory tree, one subdirectory per risk level"""
+
+    def __init__(self, root, concurrency=8):
+        self.name = f"dir:{root}"
+        self.root = root
+        self.concurrency = concurrency
+
+    @staticmethod
+    def _copy(source, target):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_path = f"{target}.tmp"
+        with open(source, 'rb') as src, open(tmp_path, 'wb') as dst:
+            while True:
+                block = src.read(1 << 20)
+                if not block:
+                    break
+                dst.write(block)
+        os.replace(tmp_path, target)
+
+    async def deliver(self, report_id, spool_path, risk_level):
+        target = os.path.join(self.root, risk_level.lower(), f"{report_id}.pdf")
+        # File I/O runs in the loop's default thread pool so it never blocks the loop
+        await asyncio.get_running_loop().run_in_executor(None, self._copy, spool_path, target)
+
+    async def close(self):
+        pass
+
+
+class SFTPStandInDestination:
+    """Uploads over the stand-in SFTP protocol on pooled, persistent connections
+
+    The protocol is a line-framed subset of an SFTP session: `PUT <path> <size>` followed by
+    the file bytes, answered with `OK` or `ERR <reason>`; see serve_sftp_stand_in().
+    """
+
+    def __init__(self, url, concurrency=4):
+        parts = urlsplit(url)
+        self.name = f"sftp:{parts.hostname}:{parts.port}{parts.path}"
+        self.remote_dir = parts.path.strip('/')
+        self.concurrency = concurrency
+        self.pool = ConnectionPool(parts.hostname, parts.port, size=concurrency)
+
+    async def deliver(self, report_id, spool_path, risk_level):
+        # Read off the event loop, so other deliveries keep going during disk I/O
+        data = await asyncio.to_thread(_read_file, spool_path)
+        remote_path = '/'.join(filter(None, [self.remote_dir, risk_level.lower(), f"{report_id}.pdf"]))
+        reader, writer = await self.pool.acquire()
+        reusable = False
+        try:
+            writer.write(f"PUT {remote_path} {len(data)}\n".encode() + data)
+            await writer.drain()
+            reply = (await reader.readline()).decode().strip()
+            reusable = bool(reply)
+        finally:
+            self.pool.release((reader, writer), reusable)
+        if reply != 'OK':
+            raise DeliveryError(f"SFTP upload of {remote_path} failed: {reply or 'connection closed'}")
+
+    async def close(self):
+        await self.pool.close()
+
+
+class HTTPStandInDestination:
+    """PUTs reports to an HTTP endpoint over pooled keep-alive connections"""
+
+    def __init__(self, url, concurrency=8):
+        parts = urlsplit(url)
+        self.name = f"http:{parts.hostname}:{parts.port}{parts.path}"
+        self.host = parts.hostname
+        self.base_path = parts.path.rstrip('/')
+        self.concurrency = concurrency
+        self.pool = ConnectionPool(parts.hostname, parts.port or 80, size=concurrency)
+
+    async def deliver(self, report_id, spool_path, risk_level):
+        # Read off the event loop, so other deliveries keep going during disk I/O
+        data = await asyncio.to_thread(_read_file, spool_path)
+        path = f"{self.base_path}/{risk_level.lower()}/{report_id}.pdf"
+        reader, writer = await self.pool.acquire()
+        reusable = False
+        try:
+            writer.write(
+                f"PUT {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/pdf\r\n"
+                f"Content-Length: {len(data)}\r\nConnection: keep-alive\r\n\r\n".encode() + data
+            )
+            await writer.drain()
+            status_line = (await reader.readline()).decode()
+            try:
+                status = int(status_line.split()[1]) if status_line else 0
+                headers = {}
+                while True:
+                    line = (await reader.readline()).decode().strip()
+                    if not line:
+                        break
+                    key, _, value = line.partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                await reader.readexactly(int(headers.get('content-length', 0)))
+            except (ValueError, IndexError):
+                # A garbled reply leaves the connection unusable; fail this attempt so it is retried
+                raise DeliveryError(f"HTTP PUT {path} got a malformed response: {status_line.strip()!r}") from None
+            reusable = bool(status_line) and headers.get('connection', '').lower() != 'close'
+        finally:
+            self.pool.release((reader, writer), reusable)
+
+        if not 200 <= status < 300:
+            raise DeliveryError(f"HTTP PUT {path} failed: {status_line.strip() or 'connection closed'}")
+
+    async def close(self):
+        await self.pool.close()
+
+
+class ReportDeliveryPipeline:
+    """Renders queued reports in a process pool and delivers them concurrently from the event loop
+
+    Rendering of later reports overlaps with delivery of earlier ones. Each destination has its
+    own concurrency limit, and failed deliveries are retried with exponential backoff and jitter
+    before being marked failed in the queue.
+    """
+
+    def __init__(self, delivery_queue, destinations, spool_dir=SPOOL_DIR, render_workers=None,
+                 max_attempts=5, backoff=0.5, max_backoff=30.0):
+        self.queue = delivery_queue
+        self.destinations = {destination.name: destination for destination in destinations}
+        self.spool_dir = spool_dir
+        self.render_workers = render_workers or os.cpu_count()
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.stats = {'rendered': 0, 'delivered': 0, 'retries': 0, 'failed': 0}
+
+    async def _deliver(self, report_id, spool_path, risk_level, destination, limit):
+        for attempt in range(1, self.max_attempts + 1):
+            async with limit:
+                self.queue.update(report_id, destination.name, 'in_flight')
+                try:
+                    await destination.deliver(report_id, spool_path, risk_level)
+                except (OSError, DeliveryError, asyncio.IncompleteReadError) as e:
+                    error = str(e) or type(e).__name__
+                else:
+                    self.queue.update(report_id, destination.name, 'delivered')
+                    self.stats['delivered'] += 1
+                    return True
+
+            if attempt == self.max_attempts:
+                break
+            # Back off outside the concurrency slot so other reports keep flowing
+            self.queue.update(report_id, destination.name, 'pending', error)
+            self.stats['retries'] += 1
+            delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+            await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+
+        self.queue.update(report_id, destination.name, 'failed', error)
+        self.stats['failed'] += 1
+        return False
+
+    async def _process(self, report_id, payload, spool_path, destination_names, pool, render_slots, limits):
+        if spool_path is None or not os.path.exists(spool_path):
+            spool_path = os.path.join(self.spool_dir, f"{report_id}.pdf")
+            job = (spool_path, payload['patient_data'], payload['risk_score'], payload['risk_level'],
+                   payload['contributions'])
+            async with render_slots:
+                try:
+                    await asyncio.get_running_loop().run_in_executor(pool, render_pdf, job)
+                except Exception as e:
+                    for name in destination_names:
+                        self.queue.update(report_id, name, 'failed', f"Rendering failed: {e}")
+                    self.stats['failed'] += len(destination_names)
+                    return
+            self.queue.mark_rendered(report_id, spool_path)
+            self.stats['rendered'] += 1
+
+        await asyncio.gather(*[
+            self._deliver(report_id, spool_path, payload['risk_level'], self.destinations[name], limits[name])
+            for name in destination_names if name in self.destinations
+        ])
+        if self.queue.outstanding(report_id) == 0:
+            await asyncio.to_thread(os.remove, spool_path)
+
+    async def run(self):
+        """Deliver everything pending in the queue and return the run statistics"""
+        os.makedirs(self.spool_dir, exist_ok=True)
+        start = time.perf_counter()
+        limits = {name: asyncio.Semaphore(destination.concurrency)
+                  for name, destination in self.destinations.items()}
+        # Keep the render pool busy without rendering far ahead of delivery
+        render_slots = asyncio.Semaphore(self.render_workers * 2)
+        # Bound the reports in progress so a large backlog does not become millions of tasks
+        window = asyncio.Semaphore(self.render_workers * 4 + sum(d.concurrency for d in self.destinations.values()))
+        tasks = set()
+
+        with ProcessPoolExecutor(max_workers=self.render_workers, initializer=init_pdf_worker) as pool:
+            try:
+                after = None
+                while True:
+                    # Page queries run in a worker thread so in-flight deliveries keep going meanwhile
+                    reports, after = await asyncio.to_thread(self.queue.pending_page, after)
+                    for report_id, payload, spool_path, destination_names in reports:
+                        await window.acquire()
+                        task = asyncio.create_task(self._process(report_id, payload, spool_path,
+                                                                 destination_names, pool, render_slots, limits))
+                        tasks.add(task)
+                        task.add_done_callback(lambda done: (tasks.discard(done), window.release()))
+                    if after is None:
+                        break
+                await asyncio.gather(*tasks)
+            finally:
+                for destination in self.destinations.values():
+                    await destination.close()
+
+        elapsed = time.perf_counter() - start
+        self.stats['elapsed_seconds'] = elapsed
+        self.stats['deliveries_per_sec'] = self.stats['delivered'] / elapsed if elapsed > 0 else 0.0
+        return self.stats
+
+
+def enqueue_file(delivery_queue, path, destinations, limit=None, chunksize=10000):
+    """Score a patient file and queue one report per patient for every destination"""
+    batch = datetime.now().strftime('%Y%m%d%H%M%S')
+    queued = 0
+    for chunk in read_chunks(path, chunksize):
+        if limit is not None:
+            chunk = chunk.iloc[:limit - queued]
+        contributions = contribution_matrix(feature_matrix(chunk))
+        scores = heuristic_scores(None, contributions)
+        levels = risk_levels(scores)
+        # to_json turns numpy scalars into plain JSON values in one pass
+        records = json.loads(chunk.to_json(orient='records'))
+        # One transaction per chunk instead of one per report
+        delivery_queue.enqueue_many([
+            (f"patient_{patient_data.get('patient_id', queued + i)}_{batch}", {
+                'patient_data': patient_data,
+                'risk_score': float(scores[i]),
+                'risk_level': levels[i],
+                'contributions': contributions[i].tolist()
+            })
+            for i, patient_data in enumerate(records)
+        ], destinations)
+        queued += len(chunk)
+        if limit is not None and queued >= limit:
+            break
+    return queued
+
+
+# Local stand-in servers, so delivery can be exercised without real SFTP or HTTP hosts
+
+async def serve_sftp_stand_in(root, host='127.0.0.1', port=2222, failure_rate=0.0):
+    """Accept stand-in SFTP uploads into `root`, failing a fraction of them at random"""
+    async def handle(reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command, path, size = line.decode().split()
+                data = await reader.readexactly(int(size))
+                if command != 'PUT' or '..' in path.split('/'):
+                    writer.write(b"ERR bad request\n")
+                elif random.random() < failure_rate:
+                    writer.write(b"ERR remote storage unavailable\n")
+                else:
+                    target = os.path.join(root, *path.split('/'))
+                    await asyncio.to_thread(_write_file, target, data)
+                    writer.write(b"OK\n")
+                await writer.drain()
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
+
+
+async def serve_http_stand_in(root, host='127.0.0.1', port=8080, failure_rate=0.0):
+    """Accept keep-alive HTTP PUT uploads into `root`, answering 503 for a fraction of them"""
+    async def handle(reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode().split()
+                headers = {}
+                while True:
+                    line = (await reader.readline()).decode().strip()
+                    if not line:
+                        break
+                    key, _, value = line.partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                data = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                if method != 'PUT' or '..' in path.split('/'):
+                    status = '400 Bad Request'
+                elif random.random() < failure_rate:
+                    status = '503 Service Unavailable'
+                else:
+                    target = os.path.join(root, *path.strip('/').split('/'))
+                    await asyncio.to_thread(_write_file, target, data)
+                    status = '201 Created'
+                writer.write(f"HTTP/1.1 {status}\r\nContent-Length: 0\r\nConnection: keep-alive\r\n\r\n".encode())
+                await writer.drain()
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
+
+
+async def _main(args):
+    servers = []
+    if args.serve_stand_ins:
+        for url, serve in ((args.sftp, serve_sftp_stand_in), (args.http, serve_http_stand_in)):
+            if url:
+                parts = urlsplit(url)
+                servers.append(await serve(os.path.join(args.stand_in_root, parts.scheme), parts.hostname,
+                                           parts.port, args.failure_rate))
+
+    destinations = []
+    if args.local_dir:
+        destinations.append(LocalDirectoryDestination(args.local_dir))
+    if args.sftp:
+        destinations.append(SFTPStandInDestination(args.sftp, concurrency=args.concurrency))
+    if args.http:
+        destinations.append(HTTPStandInDestination(args.http, concurrency=args.concurrency))
+
+    delivery_queue = DeliveryQueue(args.queue)
+    try:
+        if args.input:
+            queued = enqueue_file(delivery_queue, args.input, [d.name for d in destinations], limit=args.limit)
+            print(f"Queued {queued:,} reports for {len(destinations)} destinations")
+
+        pipeline = ReportDeliveryPipeline(delivery_queue, destinations, spool_dir=args.spool_dir,
+                                          render_workers=args.render_workers, max_attempts=args.max_attempts)
+        stats = await pipeline.run()
+        counts = delivery_queue.counts()
+    finally:
+        delivery_queue.close()
+        for server in servers:
+            server.close()
+            await server.wait_closed()
+
+    print(f"Rendered {stats['rendered']:,} reports, {stats['delivered']:,} deliveries, "
+          f"{stats['retries']:,} retries, {stats['failed']:,} failed in {stats['elapsed_seconds']:.1f}s "
+          f"({stats['deliveries_per_sec']:,.1f} deliveries/sec)")
+    for destination, statuses in counts.items():
+        print(f"  {destination}: " + ", ".join(f"{status} {n:,}" for status, n in sorted(statuses.items())))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render and deliver PDF reports to several destinations")
+    parser.add_argument('input', nargs='?', help="Patient file to queue (.csv, .jsonl or .parquet); "
+                                                 "omit to resume the existing queue")
+    parser.add_argument('--limit', type=int, default=None, help="Queue at most this many patients")
+    parser.add_argument('--local-dir', help="Deliver into this directory tree")
+    parser.add_argument('--sftp', help="Stand-in SFTP target, e.g. sftp://127.0.0.1:2222/reports")
+    parser.add_argument('--http', help="Stand-in HTTP target, e.g. http://127.0.0.1:8080/reports")
+    parser.add_argument('--serve-stand-ins', action='store_true',
+                        help="Run local stand-in SFTP/HTTP servers for the given URLs")
+    parser.add_argument('--stand-in-root', default='delivered_stand_ins')
+    parser.add_argument('--failure-rate', type=float, default=0.0,
+                        help="Fraction of uploads the stand-in servers reject, to exercise retries")
+    parser.add_argument('--queue', default=QUEUE_PATH)
+    parser.add_argument('--spool-dir', default=SPOOL_DIR)
+    parser.add_argument('--render-workers', type=int, default=None)
+    parser.add_argument('--concurrency', type=int, default=8, help="Connections per remote destination")
+    parser.add_argument('--max-attempts', type=int, default=5)
+    args = parser.parse_args()
+
+    if not (args.local_dir or args.sftp or args.http):
+        parser.error("Specify at least one destination: --local-dir, --sftp or --http")
+
+    asyncio.run(_main(args))
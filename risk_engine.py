@@ -0,0 +1,230 @@
+import numpy as np
+
+# Weights used by the heuristic risk scorer (every backend in scoring_backends)
+RISK_WEIGHTS = {
+    'phq9_score': 0.20,
+    'gad7_score': 0.15,
+    'hopelessness_score': 0.25,
+    'cssrs_score': 0.30,
+    'previous_suicide_attempts': 0.35,
+    'social_isolation': 0.10,
+    'substance_use': 0.12,
+    'recent_life_events': 0.08,
+    'family_suicide': 0.20,
+    'treatment_compliance': 0.05
+}
+
+# Column order of every feature matrix built from patient records
+RISK_FACTORS = list(RISK_WEIGHTS.keys())
+
+# Risk levels from lowest to highest
+RISK_LEVELS = ['Low', 'Moderate', 'High', 'Critical']
+
+# Upper bounds of Low/Moderate/High on the 0-1 heuristic score scale
+RISK_LEVEL_CUTOFFS = (0.2, 0.4, 0.6)
+
+# Upper bounds of Low/Moderate/High on the 0-100 outcome scale of the data generator
+OUTCOME_RISK_CUTOFFS = (15, 35, 55)
+
+# Clinical recommendations for each risk level
+RECOMMENDATIONS = {
+    "Low": [
+        "Regular therapy sessions",
+        "Medication management",
+        "Lifestyle recommendations",
+        "Support group referral",
+        "Regular reassessment"
+    ],
+    "Moderate": [
+        "Weekly therapy sessions",
+        "Safety planning",
+        "Medication review",
+        "Family involvement",
+        "Crisis hotline information"
+    ],
+    "High": [
+        "Immediate psychiatric evaluation",
+        "24/7 monitoring or hospitalization",
+        "Crisis intervention team activation",
+        "Remove access to lethal means",
+        "Family/caregiver notification"
+    ],
+    "Critical": [
+        "🚨 IMMEDIATE EMERGENCY INTERVENTION",
+        "Call 911 or emergency services",
+        "24/7 monitoring required",
+        "Psychiatric hospitalization",
+        "Crisis team activation"
+    ]
+}
+
+# Short recommended action for each risk level, as shown in the app and exports
+RECOMMENDED_ACTIONS = {
+    "Low": "Regular Check-ins",
+    "Moderate": "Close Monitoring",
+    "High": "Immediate Intervention",
+    "Critical": "Immediate Intervention"
+}
+
+# Longer form of the recommended action, as printed in PDF reports
+REPORT_ACTIONS = {
+    "Low": "Regular Check-ins and Standard Care",
+    "Moderate": "Enhanced Monitoring and Safety Planning",
+    "High": "Immediate Psychiatric Evaluation and Crisis Intervention",
+    "Critical": "Emergency Intervention and 24/7 Monitoring"
+}
+
+# Display color of each risk level in charts and reports
+RISK_COLORS = {
+    "Low": "#2ecc71",
+    "Moderate": "#f39c12",
+    "High": "#e67e22",
+    "Critical": "#e74c3c"
+}
+
+# Everything shown for a risk level, assembled once at import so per-assessment code
+# only does a lookup; unknown levels fall back to DEFAULT_LEVEL_ASSETS
+LEVEL_ASSETS = {
+    level: {
+        'recommendations': RECOMMENDATIONS[level],
+        'action': RECOMMENDED_ACTIONS[level],
+        'report_action': REPORT_ACTIONS[level],
+        'color': RISK_COLORS[level]
+    }
+    for level in RISK_LEVELS
+}
+DEFAULT_LEVEL_ASSETS = {
+    'recommendations': ["Consult with mental health professional"],
+    'action': "Consult with mental health professional",
+    'report_action': "Consult with mental health professional",
+    'color': RISK_COLORS["Critical"]
+}
+
+# Protective factors, whose normalized value is inverted (1 - value)
+INVERTED_FACTORS = ('treatment_compliance',)
+
+# Count-like factors, whose normalized value is capped at 1
+CAPPED_FACTORS = ('previous_suicide_attempts', 'family_suicide')
+
+# Maximum value of each factor, used to bring everything onto a 0-1 scale
+FACTOR_SCALES = {
+    'phq9_score': 27,
+    'gad7_score': 21,
+    'hopelessness_score': 20,
+    'cssrs_score': 25,
+    'previous_suicide_attempts': 5,
+    'social_isolation': 10,
+    'substance_use': 10,
+    'recent_life_events': 8,
+    'family_suicide': 5,
+    'treatment_compliance': 100
+}
+
+# Valid input range of each factor, as offered by the app's sliders
+FACTOR_RANGES = {
+    'phq9_score': (0, 27),
+    'gad7_score': (0, 21),
+    'hopelessness_score': (0, 20),
+    'cssrs_score': (0, 25),
+    'previous_suicide_attempts': (0, 5),
+    'social_isolation': (0, 10),
+    'substance_use': (0, 10),
+    'recent_life_events': (0, 8),
+    'family_suicide': (0, 1),
+    'treatment_compliance': (0, 100)
+}
+
+# Display names of each factor in charts and reports
+FACTOR_LABELS = {
+    'phq9_score': 'Depression (PHQ-9)',
+    'gad7_score': 'Anxiety (GAD-7)',
+    'hopelessness_score': 'Hopelessness',
+    'cssrs_score': 'Suicide Risk (CSSRS)',
+    'previous_suicide_attempts': 'Previous Attempts',
+    'social_isolation': 'Social Isolation',
+    'substance_use': 'Substance Use',
+    'recent_life_events': 'Life Events',
+    'family_suicide': 'Family History of Suicide',
+    'treatment_compliance': 'Treatment Non-compliance'
+}
+
+# Column names of each factor's contribution in exports
+CONTRIBUTION_COLUMNS = {
+    'phq9_score': 'Depression_Contribution',
+    'gad7_score': 'Anxiety_Contribution',
+    'hopelessness_score': 'Hopelessness_Contribution',
+    'cssrs_score': 'Suicide_Risk_Contribution',
+    'previous_suicide_attempts': 'Previous_Attempts_Contribution',
+    'social_isolation': 'Social_Isolation_Contribution',
+    'substance_use': 'Substance_Use_Contribution',
+    'recent_life_events': 'Life_Events_Contribution',
+    'family_suicide': 'Family_History_Contribution',
+    'treatment_compliance': 'Treatment_Noncompliance_Contribution'
+}
+
+_LEVEL_NAMES = np.array(RISK_LEVELS, dtype=object)
+_WEIGHTS = np.array([RISK_WEIGHTS[factor] for factor in RISK_FACTORS], dtype=np.float64)
+_SCALES = np.array([FACTOR_SCALES[factor] for factor in RISK_FACTORS], dtype=np.float64)
+_INVERTED = np.array([factor in INVERTED_FACTORS for factor in RISK_FACTORS])
+_CAPPED = np.array([factor in CAPPED_FACTORS for factor in RISK_FACTORS])
+_INVERTED_COLUMNS = np.flatnonzero(_INVERTED).tolist()
+_CAPPED_COLUMNS = np.flatnonzero(_CAPPED).tolist()
+_CUTOFFS = np.array(RISK_LEVEL_CUTOFFS, dtype=np.float64)
+
+
+def feature_matrix(records, dtype=np.float64):
+    """Build a contiguous (n, len(RISK_FACTORS)) matrix from a DataFrame or a list of dicts"""
+    if isinstance(records, dict):
+        records = [records]
+    if isinstance(records, list):
+        matrix = np.array([[record[factor] for factor in RISK_FACTORS] for record in records],
+                          dtype=dtype)
+    else:
+        matrix = records[RISK_FACTORS].to_numpy(dtype=dtype)
+    return np.ascontiguousarray(matrix.reshape(-1, len(RISK_FACTORS)))
+
+
+def normalize_factors(matrix):
+    """Normalize a raw feature matrix onto the 0-1 scale used by the heuristic scorer"""
+    normalized = np.asarray(matrix, dtype=np.float64) / _SCALES
+    # Treatment compliance is protective, so it is inverted
+    normalized[:, _INVERTED] = 1 - normalized[:, _INVERTED]
+    # Count-like factors are capped at 1
+    normalized[:, _CAPPED] = np.minimum(normalized[:, _CAPPED], 1)
+    return normalized
+
+
+def contribution_matrix(matrix):
+    """Weighted contribution of every factor for every row, shape (n, len(RISK_FACTORS))
+
+    This is the single source of per-factor contributions: scores, charts and every
+    export are derived from it, so they always agree.
+    """
+    return normalize_factors(matrix) * _WEIGHTS
+
+
+def explain(records):
+    """Contribution matrix for a patient dict, list of dicts or DataFrame"""
+    return contribution_matrix(feature_matrix(records))
+
+
+def contributions_by_factor(row, names=FACTOR_LABELS):
+    """Map one row of a contribution matrix to {name: contribution}"""
+    return {names[factor]: float(value) for factor, value in zip(RISK_FACTORS, row)}
+
+
+def heuristic_scores(matrix, contributions=None):
+    """Score a raw feature matrix with the weighted heuristic, without the random jitter"""
+    if contributions is None:
+        contributions = contribution_matrix(matrix)
+    return np.clip(contributions.sum(axis=1), 0, 1)
+
+
+def risk_level_codes(scores, cutoffs=RISK_LEVEL_CUTOFFS):
+    """Map an array of scores to indices into RISK_LEVELS using ascending cutoffs"""
+    return np.searchsorted(cutoffs, scores, side='right').astype(np.int8)
+
+
+def risk_levels(scores, cutoffs=RISK_LEVEL_CUTOFFS):
+    """Map an array of scores to risk level names using ascending cutoffs"""
+    return _LEVEL_NAMES[np.searchsorted(cutoffs, scores, side='right')]
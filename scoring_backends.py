@@ -0,0 +1,383 @@
+import os
+import sys
+import time
+import warnings
+import argparse
+import numpy as np
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+    prange = range
+from risk_engine import (RISK_FACTORS, RISK_WEIGHTS, RISK_LEVELS, RISK_LEVEL_CUTOFFS, FACTOR_SCALES, FACTOR_RANGES,
+                         INVERTED_FACTORS, CAPPED_FACTORS, feature_matrix, contribution_matrix, risk_level_codes)
+# Constants of the fused kernel, in RISK_FACTORS order, shared with risk_engine's scorer
+from risk_engine import _WEIGHTS, _SCALES, _INVERTED, _CAPPED, _INVERTED_COLUMNS, _CAPPED_COLUMNS, _CUTOFFS
+
+# Environment variable naming the backend every entry point uses unless told otherwise
+BACKEND_ENV_VAR = 'RISK_SCORING_BACKEND'
+DEFAULT_BACKEND = 'numpy'
+
+# Rows per block of the fused NumPy fallback; a block's buffer stays in cache
+FUSED_BLOCK_ROWS = 16384
+
+
+class ScoringBackend:
+    """Interface of a heuristic scoring implementation
+
+    Every backend takes a raw (n, len(RISK_FACTORS)) feature matrix and returns the risk
+    scores, int8 indices into RISK_LEVELS and the per-factor contribution matrix. The
+    default score() derives scores and levels from contributions(); backends override
+    whichever steps they can do faster.
+    """
+
+    name = None
+
+    def contributions(self, matrix):
+        raise NotImplementedError
+
+    def score(self, matrix):
+        """(scores, level_codes, contributions) for a raw feature matrix"""
+        contributions = self.contributions(matrix)
+        scores = np.clip(contributions.sum(axis=1), 0, 1)
+        return scores, risk_level_codes(scores), contributions
+
+    def score_levels(self, matrix):
+        """(scores, level_codes) only, for callers that do not need contributions"""
+        scores, codes, _ = self.score(matrix)
+        return scores, codes
+
+    def score_records(self, records):
+        """Score a patient dict, list of dicts or DataFrame"""
+        return self.score(feature_matrix(records))
+
+    def score_patient(self, patient_data):
+        """(risk_score, risk_level) of one patient dict"""
+        scores, codes, _ = self.score_records(patient_data)
+        return float(scores[0]), RISK_LEVELS[codes[0]]
+
+
+class PythonBackend(ScoringBackend):
+    """Reference implementation: the weighted formula in plain Python, one row at a time"""
+
+    name = 'python'
+
+    def __init__(self):
+        self.factors = [(RISK_WEIGHTS[factor], FACTOR_SCALES[factor], factor in INVERTED_FACTORS,
+                         factor in CAPPED_FACTORS) for factor in RISK_FACTORS]
+
+    def _score_row(self, row):
+        contributions = []
+        for value, (weight, scale, inverted, capped) in zip(row, self.factors):
+            normalized = value / scale
+            if inverted:
+                normalized = 1 - normalized
+            if capped:
+                normalized = min(normalized, 1)
+            contributions.append(normalized * weight)
+        score = sum(contributions)
+        # Clamp without min()/max() so a NaN score stays NaN, as with np.clip
+        if score < 0.0:
+            score = 0.0
+        elif score > 1.0:
+            score = 1.0
+        # Written as `not <` so NaN lands in the top level, like searchsorted
+        level = 0
+        for cutoff in RISK_LEVEL_CUTOFFS:
+            if not score < cutoff:
+                level += 1
+        return score, level, contributions
+
+    def score(self, matrix):
+        rows = [self._score_row(row) for row in np.asarray(matrix, dtype=np.float64).tolist()]
+        scores = np.array([score for score, _, _ in rows], dtype=np.float64)
+        codes = np.array([level for _, level, _ in rows], dtype=np.int8)
+        contributions = np.array([row for _, _, row in rows], dtype=np.float64).reshape(-1, len(RISK_FACTORS))
+        return scores, codes, contributions
+
+    def contributions(self, matrix):
+        return self.score(matrix)[2]
+
+
+class NumpyBackend(ScoringBackend):
+    """Vectorized risk_engine implementation, used by default"""
+
+    name = 'numpy'
+
+    def contributions(self, matrix):
+        return contribution_matrix(matrix)
+
+
+class LookupTableBackend(ScoringBackend):
+    """Contributions gathered from per-factor tables of every whole-number input value
+
+    Every factor's input range is a small set of integers (0-27, 0-100, ...), so each
+    contribution can be precomputed once and looked up instead of normalized and weighted.
+    Rows with fractional or out-of-range values are computed by the NumPy path.
+    """
+
+    name = 'lookup'
+
+    def __init__(self):
+        self.offsets = np.array([FACTOR_RANGES[factor][0] for factor in RISK_FACTORS], dtype=np.int64)
+        self.sizes = np.array([FACTOR_RANGES[factor][1] - FACTOR_RANGES[factor][0] + 1 for factor in RISK_FACTORS],
+                              dtype=np.int64)
+        # All tables concatenated; column j's value v lives at starts[j] + v - offsets[j]
+        self.starts = np.concatenate(([0], np.cumsum(self.sizes)[:-1]))
+        values = np.full((int(self.sizes.max()), len(RISK_FACTORS)), np.nan)
+        for j, size in enumerate(self.sizes):
+            values[:size, j] = np.arange(size) + self.offsets[j]
+        table = contribution_matrix(np.nan_to_num(values))
+        self.table = np.concatenate([table[:size, j] for j, size in enumerate(self.sizes)])
+
+    def contributions(self, matrix):
+        matrix = np.asarray(matrix, dtype=np.float64)
+        with np.errstate(invalid='ignore'):
+            index = matrix.astype(np.int64) - self.offsets
+        in_table = ((index >= 0) & (index < self.sizes) & (matrix == np.floor(matrix))).all(axis=1)
+        if in_table.all():
+            return self.table[index + self.starts]
+        contributions = np.empty(matrix.shape, dtype=np.float64)
+        contributions[in_table] = self.table[index[in_table] + self.starts]
+        contributions[~in_table] = contribution_matrix(matrix[~in_table])
+        return contributions
+
+
+def _fused_rows(matrix, weights, scales, inverted, capped, cutoffs, scores, codes, contributions,
+                write_contributions):
+    """Normalize, weight, sum, clamp and bin every row in one pass with no temporaries
+
+    Compiled by numba with prange splitting the rows across threads. Without numba this is
+    the same loop in plain Python; it is kept importable so the kernel can be checked
+    against the reference on small inputs.
+    """
+    for i in prange(matrix.shape[0]):
+        total = 0.0
+        for j in range(matrix.shape[1]):
+            normalized = matrix[i, j] / scales[j]
+            if inverted[j]:
+                normalized = 1.0 - normalized
+            if capped[j] and normalized > 1.0:
+                normalized = 1.0
+            contribution = normalized * weights[j]
+            if write_contributions:
+                contributions[i, j] = contribution
+            total += contribution
+        if total < 0.0:
+            total = 0.0
+        elif total > 1.0:
+            total = 1.0
+        scores[i] = total
+        level = 0
+        for cutoff in cutoffs:
+            if not total < cutoff:
+                level += 1
+        codes[i] = level
+
+
+# Compiled lazily on first call and cached on disk by numba
+_fused_kernel = njit(parallel=True, cache=True)(_fused_rows) if njit is not None else None
+
+
+def _fused_blocks(matrix, scores, codes, contributions, block_rows):
+    """NumPy fallback of the fused kernel: the same steps in place, one cache-sized block at a time
+
+    Only a block-sized buffer is allocated (none when contributions are wanted, as they
+    are written directly), instead of several full-size intermediate matrices.
+    """
+    n = len(matrix)
+    buffer = None if contributions is not None else np.empty((min(block_rows, n), len(RISK_FACTORS)))
+    for start in range(0, n, block_rows):
+        end = min(start + block_rows, n)
+        out = contributions[start:end] if contributions is not None else buffer[:end - start]
+        np.divide(matrix[start:end], _SCALES, out=out)
+        for j in _INVERTED_COLUMNS:
+            np.subtract(1.0, out[:, j], out=out[:, j])
+        for j in _CAPPED_COLUMNS:
+            np.minimum(out[:, j], 1.0, out=out[:, j])
+        np.multiply(out, _WEIGHTS, out=out)
+        total = scores[start:end]
+        np.sum(out, axis=1, out=total)
+        np.clip(total, 0, 1, out=total)
+        codes[start:end] = np.searchsorted(_CUTOFFS, total, side='right')
+
+
+class FusedBackend(ScoringBackend):
+    """Single-pass scoring for the largest batches, JIT-compiled when numba is installed
+
+    With numba, one parallel loop normalizes, weights, sums, clamps and bins each row and
+    writes straight into the outputs. Without it, the NumPy fallback runs the same steps
+    in place over blocks of rows. score_levels() skips the contribution matrix entirely.
+    """
+
+    name = 'fused'
+
+    def __init__(self, block_rows=FUSED_BLOCK_ROWS):
+        self.kernel = _fused_kernel
+        self.block_rows = block_rows
+
+    def score(self, matrix, with_contributions=True):
+        matrix = np.asarray(matrix)
+        if matrix.dtype not in (np.float32, np.float64):
+            matrix = matrix.astype(np.float64)
+        matrix = np.ascontiguousarray(matrix)
+        n, k = matrix.shape
+        scores = np.empty(n, dtype=np.float64)
+        codes = np.empty(n, dtype=np.int8)
+        contributions = np.empty((n, k), dtype=np.float64) if with_contributions else None
+        if self.kernel is not None:
+            self.kernel(matrix, _WEIGHTS, _SCALES, _INVERTED, _CAPPED, _CUTOFFS, scores, codes,
+                        contributions if with_contributions else np.empty((0, k)), with_contributions)
+        else:
+            _fused_blocks(matrix, scores, codes, contributions, self.block_rows)
+        return scores, codes, contributions
+
+    def score_levels(self, matrix):
+        return self.score(matrix, with_contributions=False)[:2]
+
+    def contributions(self, matrix):
+        return self.score(matrix)[2]
+
+
+class NumbaBackend(FusedBackend):
+    """The fused kernel, JIT-compiled only; unavailable rather than falling back without numba"""
+
+    name = 'numba'
+
+    def __init__(self, block_rows=FUSED_BLOCK_ROWS):
+        super().__init__(block_rows)
+        if self.kernel is None:
+            raise ImportError("The numba backend requires numba: pip install numba")
+
+
+BACKENDS = {
+    'python': PythonBackend,
+    'numpy': NumpyBackend,
+    'lookup': LookupTableBackend,
+    'fused': FusedBackend,
+    'numba': NumbaBackend
+}
+
+_instances = {}
+
+
+def get_backend(name=None):
+    """The backend called `name`, else the one named by RISK_SCORING_BACKEND, else numpy
+
+    Backends are built once per process. An optional backend whose dependency is missing
+    falls back to numpy with a warning, so a config setting never stops the app.
+    """
+    name = (name or os.environ.get(BACKEND_ENV_VAR) or DEFAULT_BACKEND).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown scoring backend '{name}' (expected one of {', '.join(BACKENDS)})")
+    if name not in _instances:
+        try:
+            _instances[name] = BACKENDS[name]()
+        except ImportError as e:
+            warnings.warn(f"{e}; using the {DEFAULT_BACKEND} backend instead")
+            return get_backend(DEFAULT_BACKEND)
+    return _instances[name]
+
+
+def available_backends():
+    """Names of the backends that can run on this host"""
+    names = []
+    for name in BACKENDS:
+        try:
+            BACKENDS[name]()
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def parity_matrix(n=20000, seed=0):
+    """Test inputs: every factor's bounds plus random whole and fractional values in range"""
+    rng = np.random.default_rng(seed)
+    lows = np.array([FACTOR_RANGES[factor][0] for factor in RISK_FACTORS], dtype=np.float64)
+    highs = np.array([FACTOR_RANGES[factor][1] for factor in RISK_FACTORS], dtype=np.float64)
+    whole = rng.integers(lows, highs + 1, size=(n, len(RISK_FACTORS))).astype(np.float64)
+    fractional = rng.uniform(lows, highs, size=(n // 10, len(RISK_FACTORS)))
+    return np.ascontiguousarray(np.vstack([lows, highs, whole, fractional]))
+
+
+def check_parity(matrix=None, backends=None, reference='python', atol=1e-12):
+    """Compare every backend against the reference on the same inputs
+
+    Scores must agree to within atol (backends may add the contributions in a different
+    order) and contributions likewise. Levels must be identical, except for rows whose
+    reference score lies within atol of a cutoff, where the summation order decides.
+    Returns {backend: {'max_score_diff', 'max_contribution_diff', 'level_mismatches', 'ok'}}.
+    """
+    matrix = parity_matrix() if matrix is None else np.asarray(matrix, dtype=np.float64)
+    backends = available_backends() if backends is None else backends
+    ref_scores, ref_codes, ref_contributions = BACKENDS[reference]().score(matrix)
+    near_cutoff = (np.abs(ref_scores[:, np.newaxis] - np.array(RISK_LEVEL_CUTOFFS)) <= atol).any(axis=1)
+
+    results = {}
+    for name in backends:
+        scores, codes, contributions = BACKENDS[name]().score(matrix)
+        score_diff = float(np.abs(scores - ref_scores).max()) if len(scores) else 0.0
+        contribution_diff = float(np.abs(contributions - ref_contributions).max()) if len(scores) else 0.0
+        mismatches = int(((codes != ref_codes) & ~near_cutoff).sum())
+        results[name] = {
+            'max_score_diff': score_diff,
+            'max_contribution_diff': contribution_diff,
+            'level_mismatches': mismatches,
+            'ok': score_diff <= atol and contribution_diff <= atol and mismatches == 0
+                  and scores.dtype == np.float64 and codes.dtype == np.int8
+        }
+    return results
+
+
+def benchmark(matrix, backends=None, repeats=3, python_rows=50000, scores_only=False):
+    """Rows per second of every available backend on this host, fastest first
+
+    The pure-Python reference is timed on at most python_rows rows to keep runs short.
+    With scores_only, backends are timed producing scores and levels without contributions.
+    """
+    backends = available_backends() if backends is None else backends
+    results = []
+    for name in backends:
+        backend = BACKENDS[name]()
+        rows = matrix[:python_rows] if name == 'python' else matrix
+        # Warm-up call so JIT compilation and table building are not timed
+        run = backend.score_levels if scores_only else backend.score
+        run(rows[:100])
+        best = float('inf')
+        for _ in range(repeats):
+            start = time.perf_counter()
+            run(rows)
+            best = min(best, time.perf_counter() - start)
+        results.append((name, len(rows) / best))
+    return sorted(results, key=lambda result: result[1], reverse=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check scoring backend parity and rank backends by throughput")
+    parser.add_argument('--rows', type=int, default=1000000, help="Rows scored in the benchmark")
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--scores-only', action='store_true', help="Benchmark scores and levels without contributions")
+    args = parser.parse_args()
+
+    print(f"Backends available here: {', '.join(available_backends())} "
+          f"(configured: {os.environ.get(BACKEND_ENV_VAR) or DEFAULT_BACKEND})")
+
+    print("\nParity against the python reference:")
+    parity = check_parity()
+    for name, result in parity.items():
+        print(f"  {name:>7}: {'OK' if result['ok'] else 'MISMATCH'} "
+              f"(max score diff {result['max_score_diff']:.1e}, "
+              f"max contribution diff {result['max_contribution_diff']:.1e}, "
+              f"{result['level_mismatches']} level mismatches)")
+
+    from data_generator import MentalHealthDataGenerator
+    matrix = feature_matrix(MentalHealthDataGenerator(seed=42).generate_dataset(args.rows))
+
+    print(f"\nThroughput on {args.rows:,} generated patients{' (scores only)' if args.scores_only else ''}:")
+    results = benchmark(matrix, repeats=args.repeats, scores_only=args.scores_only)
+    for rank, (name, rows_per_sec) in enumerate(results, 1):
+        print(f"  {rank}. {name:>7}: {rows_per_sec:,.0f} rows/s")
+
+    if not all(result['ok'] for result in parity.values()):
+        sys.exit(1)
@@ -0,0 +1,285 @@
+import os
+import json
+import time
+import struct
+import argparse
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+from risk_engine import RISK_FACTORS, RISK_LEVELS, feature_matrix, heuristic_scores
+from scoring_backends import get_backend
+
+REFERENCE_PATH = 'reference.features'
+
+# The block starts with a length-prefixed JSON header describing every array in it
+HEADER_BYTES = 4096
+ALIGNMENT = 64
+
+# Bins of the reference risk score histogram over [0, 1]
+SCORE_BINS = 200
+
+# Shared arrays of each pool worker, attached once per process by attach_worker
+_worker_arrays = None
+
+
+def _layout(specs):
+    """Byte offsets of each (shape, dtype) array, every array aligned to a cache line"""
+    fields = {}
+    offset = HEADER_BYTES
+    for name, (shape, dtype) in specs.items():
+        dtype = np.dtype(dtype)
+        offset = -(-offset // ALIGNMENT) * ALIGNMENT
+        fields[name] = {'shape': [int(n) for n in shape], 'dtype': dtype.str, 'offset': offset}
+        offset += int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+    return fields, max(offset, HEADER_BYTES + 1)
+
+
+class SharedArrays:
+    """Named numpy arrays in one shared-memory block or memory-mapped file
+
+    Other processes attach by name (or path) alone: the block describes itself, and
+    attach() builds numpy views directly on the shared pages, so nothing is copied or
+    parsed and memory stays flat however many workers attach. Attached arrays are
+    read-only. Drop any views before close(); the creator calls unlink() when done.
+    """
+
+    def __init__(self, base, fields, meta, handle, shm=None, owner=False, writeable=False):
+        self.fields = fields
+        self.meta = meta
+        self.handle = handle
+        self._base = base
+        self._shm = shm
+        self._owner = owner
+        self.arrays = {}
+        for name, field in fields.items():
+            dtype = np.dtype(field['dtype'])
+            size = int(np.prod(field['shape'], dtype=np.int64)) * dtype.itemsize
+            array = base[field['offset']:field['offset'] + size].view(dtype).reshape(field['shape'])
+            array.flags.writeable = writeable
+            self.arrays[name] = array
+
+    @classmethod
+    def allocate(cls, specs, path=None, meta=None):
+        """Create a zeroed block for {name: (shape, dtype)}; a file at `path`, else shared memory"""
+        fields, size = _layout(specs)
+        header = json.dumps({'fields': fields, 'meta': meta or {}}).encode()
+        if len(header) + 8 > HEADER_BYTES:
+            raise ValueError("Too many arrays or too much metadata for the block header")
+
+        if path is None:
+            shm = shared_memory.SharedMemory(create=True, size=size)
+            base = np.frombuffer(shm.buf, dtype=np.uint8)
+            handle = shm.name
+        else:
+            shm = None
+            base = np.memmap(path, dtype=np.uint8, mode='w+', shape=(size,))
+            handle = os.path.abspath(path)
+        base[:8] = np.frombuffer(struct.pack('<Q', len(header)), dtype=np.uint8)
+        base[8:8 + len(header)] = np.frombuffer(header, dtype=np.uint8)
+        return cls(base, fields, meta or {}, handle, shm=shm, owner=True, writeable=True)
+
+    @classmethod
+    def from_arrays(cls, arrays, path=None, meta=None):
+        """Copy existing arrays into a new block, once"""
+        arrays = {name: np.asarray(array) for name, array in arrays.items()}
+        shared = cls.allocate({name: (array.shape, array.dtype) for name, array in arrays.items()}, path, meta)
+        for name, array in arrays.items():
+            shared.arrays[name][...] = array
+        return shared
+
+    @classmethod
+    def attach(cls, handle):
+        """Zero-copy, read-only views of a block created by another process (or an earlier run)"""
+        if os.path.sep in handle or os.path.exists(handle):
+            shm = None
+            base = np.memmap(handle, dtype=np.uint8, mode='r')
+        else:
+            shm = shared_memory.SharedMemory(name=handle)
+            base = np.frombuffer(shm.buf, dtype=np.uint8)
+        length = struct.unpack('<Q', base[:8].tobytes())[0]
+        header = json.loads(base[8:8 + length].tobytes())
+        return cls(base, header['fields'], header['meta'], handle, shm=shm)
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    def __contains__(self, name):
+        return name in self.arrays
+
+    def keys(self):
+        return self.arrays.keys()
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self.arrays.values())
+
+    def flush(self):
+        if isinstance(self._base, np.memmap):
+            self._base.flush()
+
+    def close(self):
+        self.flush()
+        self.arrays = {}
+        self._base = None
+        if self._shm is not None:
+            self._shm.close()
+
+    def unlink(self):
+        """Free a shared-memory block; only the creating process should call this"""
+        if self._shm is not None and self._owner:
+            self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        self.unlink()
+
+
+def attach_worker(handle):
+    """Pool initializer: attach the shared arrays once per worker process"""
+    global _worker_arrays
+    _worker_arrays = SharedArrays.attach(handle)
+
+
+def worker_arrays():
+    return _worker_arrays
+
+
+def _count_rows(path, block_size=1 << 24):
+    """Data rows of a CSV file, counted without parsing it"""
+    lines = 0
+    last = b'\n'
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            lines += block.count(b'\n')
+            last = block[-1:]
+    # Header line out, unterminated last line in
+    return lines - 1 + (last != b'\n')
+
+
+def build_reference(dataset, path=None, chunksize=500000):
+    """Load the reference cohort once into a SharedArrays block
+
+    Holds the float32 feature matrix (RISK_FACTORS columns), heuristic scores, level codes
+    and crisis outcomes of every reference patient, plus aggregates workers would otherwise
+    recompute: per-factor mean and std, patients and crisis events per risk level and a
+    histogram of scores. `dataset` is a CSV path or a DataFrame, read in chunks straight
+    into the block.
+    """
+    if isinstance(dataset, pd.DataFrame):
+        n_rows, chunks = len(dataset), [dataset]
+    else:
+        n_rows = _count_rows(dataset)
+        chunks = pd.read_csv(dataset, usecols=RISK_FACTORS + ['crisis_event'], chunksize=chunksize)
+
+    k = len(RISK_FACTORS)
+    shared = SharedArrays.allocate({
+        'features': ((n_rows, k), np.float32),
+        'scores': ((n_rows,), np.float64),
+        'level_codes': ((n_rows,), np.int8),
+        'crisis_event': ((n_rows,), np.int8),
+        'factor_mean': ((k,), np.float64),
+        'factor_std': ((k,), np.float64),
+        'level_patients': ((len(RISK_LEVELS),), np.int64),
+        'level_crisis_events': ((len(RISK_LEVELS),), np.int64),
+        'score_histogram': ((SCORE_BINS,), np.int64)
+    }, path=path, meta={'factors': RISK_FACTORS, 'n_rows': n_rows})
+
+    sums = np.zeros(k)
+    squares = np.zeros(k)
+    start = 0
+    for chunk in chunks:
+        matrix = feature_matrix(chunk)
+        end = start + len(matrix)
+        scores, codes = get_backend().score_levels(matrix)
+        crisis = chunk['crisis_event'].to_numpy(dtype=np.int8)
+
+        shared['features'][start:end] = matrix
+        shared['scores'][start:end] = scores
+        shared['level_codes'][start:end] = codes
+        shared['crisis_event'][start:end] = crisis
+
+        sums += matrix.sum(axis=0)
+        squares += np.square(matrix).sum(axis=0)
+        shared['level_patients'][:] += np.bincount(codes, minlength=len(RISK_LEVELS))
+        shared['level_crisis_events'][:] += np.bincount(codes, weights=crisis, minlength=len(RISK_LEVELS)).astype(np.int64)
+        shared['score_histogram'][:] += np.histogram(scores, bins=SCORE_BINS, range=(0.0, 1.0))[0]
+        start = end
+
+    if start != n_rows:
+        shared.close()
+        shared.unlink()
+        raise ValueError(f"Expected {n_rows:,} rows but read {start:,}")
+
+    mean = sums / max(n_rows, 1)
+    shared['factor_mean'][:] = mean
+    shared['factor_std'][:] = np.sqrt(np.maximum(squares / max(n_rows, 1) - mean ** 2, 0.0))
+    shared.flush()
+    return shared
+
+
+def score_percentiles(reference, scores):
+    """Share of reference patients scoring below each score, from the shared histogram"""
+    histogram = reference['score_histogram']
+    cumulative = np.concatenate(([0], np.cumsum(histogram))) / max(histogram.sum(), 1)
+    return np.interp(scores, np.linspace(0.0, 1.0, SCORE_BINS + 1), cumulative)
+
+
+def _memory_kb():
+    """Private (unshared) and proportional resident memory of this process in KB"""
+    private = pss = 0
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            name, _, value = line.partition(':')
+            if name in ('Private_Clean', 'Private_Dirty'):
+                private += int(value.split()[0])
+            elif name == 'Pss':
+                pss = int(value.split()[0])
+    return private, pss
+
+
+def _worker_probe(patients):
+    """Touch the whole reference matrix and report this worker's memory"""
+    features = _worker_arrays['features']
+    column_means = features.mean(axis=0, dtype=np.float64)
+    percentiles = score_percentiles(_worker_arrays, heuristic_scores(feature_matrix(patients)))
+    private, pss = _memory_kb()
+    return os.getpid(), private, pss, column_means, percentiles
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load the reference cohort once for zero-copy sharing between workers")
+    parser.add_argument('dataset', nargs='?', default='mental_health_dataset.csv',
+                        help="Dataset CSV to load, or an existing .features file to attach to")
+    parser.add_argument('--output', default=REFERENCE_PATH,
+                        help="Memory-mapped reference file; workers attach to it by path")
+    parser.add_argument('--shm', action='store_true',
+                        help="Use a shared-memory block for this run instead of writing a file")
+    parser.add_argument('--workers', type=int, default=4, help="Worker processes to attach in the check")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.dataset.endswith('.features'):
+        reference = SharedArrays.attach(args.dataset)
+    else:
+        reference = build_reference(args.dataset, path=None if args.shm else args.output)
+    elapsed = time.perf_counter() - start
+    print(f"{reference.meta['n_rows']:,} reference patients, {reference.nbytes / 1024**2:.1f} MB "
+          f"in {'shared memory ' if args.shm else ''}{reference.handle} ({elapsed:.1f}s)")
+
+    # Every worker attaches to the same pages: private memory stays small while the
+    # proportional share of the matrix is split between them
+    sample = {factor: [0.0] for factor in RISK_FACTORS}
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=attach_worker,
+                             initargs=(reference.handle,)) as pool:
+        for pid, private, pss, _, _ in pool.map(_worker_probe, [sample] * args.workers):
+            print(f"  worker {pid}: {private / 1024:.1f} MB private, {pss / 1024:.1f} MB proportional")
+
+    reference.close()
+    reference.unlink()
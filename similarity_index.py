@@ -0,0 +1,121 @@
+import os
+import json
+import argparse
+import numpy as np
+import pandas as pd
+import joblib
+from datetime import datetime
+from sklearn.neighbors import KDTree
+from risk_engine import RISK_FACTORS, RISK_LEVELS, feature_matrix, normalize_factors
+
+
+class SimilarPatientIndex:
+    """Persistent KD-tree over the reference cohort for nearest-neighbour patient lookup"""
+
+    TREE_FILE = 'tree.joblib'
+    META_FILE = 'meta.json'
+    OUTCOME_FILES = {
+        'patient_id': 'patient_id.npy',
+        'crisis_event': 'crisis_event.npy',
+        'risk_score': 'risk_score.npy',
+        'risk_level': 'risk_level.npy'
+    }
+
+    def __init__(self, tree, outcomes, meta):
+        self.tree = tree
+        self.outcomes = outcomes
+        self.meta = meta
+
+    @classmethod
+    def build(cls, dataset, index_dir, leaf_size=40, chunksize=500000):
+        """Build the index from a dataset CSV path or DataFrame and persist it to index_dir"""
+        if isinstance(dataset, pd.DataFrame):
+            chunks = [dataset]
+        else:
+            columns = RISK_FACTORS + ['patient_id', 'crisis_event', 'risk_score', 'risk_level']
+            chunks = pd.read_csv(dataset, usecols=columns, chunksize=chunksize)
+
+        features, patient_ids, crisis_events, risk_scores, risk_levels = [], [], [], [], []
+        for chunk in chunks:
+            features.append(normalize_factors(feature_matrix(chunk)))
+            patient_ids.append(chunk['patient_id'].to_numpy(dtype=np.int64))
+            crisis_events.append(chunk['crisis_event'].to_numpy(dtype=np.int8))
+            risk_scores.append(chunk['risk_score'].to_numpy(dtype=np.float32))
+            risk_levels.append(pd.Categorical(chunk['risk_level'], categories=RISK_LEVELS).codes.astype(np.int8))
+
+        tree = KDTree(np.concatenate(features), leaf_size=leaf_size)
+        del features
+
+        outcomes = {
+            'patient_id': np.concatenate(patient_ids),
+            'crisis_event': np.concatenate(crisis_events),
+            'risk_score': np.concatenate(risk_scores),
+            'risk_level': np.concatenate(risk_levels)
+        }
+        meta = {
+            'factors': RISK_FACTORS,
+            'n_rows': int(len(outcomes['patient_id'])),
+            'leaf_size': leaf_size,
+            'built_at': datetime.now().isoformat(timespec='seconds')
+        }
+
+        os.makedirs(index_dir, exist_ok=True)
+        joblib.dump(tree, os.path.join(index_dir, cls.TREE_FILE))
+        for name, filename in cls.OUTCOME_FILES.items():
+            np.save(os.path.join(index_dir, filename), outcomes[name])
+        with open(os.path.join(index_dir, cls.META_FILE), 'w') as f:
+            json.dump(meta, f, indent=2)
+
+        return cls(tree, outcomes, meta)
+
+    @classmethod
+    def load(cls, index_dir):
+        """Load a persisted index, memory-mapping the tree and outcome arrays"""
+        with open(os.path.join(index_dir, cls.META_FILE)) as f:
+            meta = json.load(f)
+        if meta['factors'] != RISK_FACTORS:
+            raise ValueError(f"Index at {index_dir} was built for different risk factors; rebuild it")
+
+        # Copy-on-write mapping: pages are shared with the page cache and never copied
+        # because queries only read the tree arrays
+        tree = joblib.load(os.path.join(index_dir, cls.TREE_FILE), mmap_mode='c')
+        outcomes = {
+            name: np.load(os.path.join(index_dir, filename), mmap_mode='r')
+            for name, filename in cls.OUTCOME_FILES.items()
+        }
+        return cls(tree, outcomes, meta)
+
+    def __len__(self):
+        return self.meta['n_rows']
+
+    def query(self, patient_data, k=5):
+        """Return the k most similar reference patients with their outcomes
+
+        risk_score is on the 0-1 scale used by risk_engine and the app; the index stores the
+        dataset's 0-100 outcome scores and converts them here.
+        """
+        k = min(k, len(self))
+        distances, indices = self.tree.query(normalize_factors(feature_matrix(patient_data)), k=k)
+        distances, indices = distances[0], indices[0]
+
+        return pd.DataFrame({
+            'patient_id': self.outcomes['patient_id'][indices],
+            'distance': distances,
+            'risk_score': self.outcomes['risk_score'][indices].astype(np.float64) / 100,
+            'risk_level': [RISK_LEVELS[code] for code in self.outcomes['risk_level'][indices]],
+            'crisis_event': self.outcomes['crisis_event'][indices]
+        })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the similar-patient index from a generated dataset")
+    parser.add_argument('dataset', nargs='?', default='mental_health_dataset.csv')
+    parser.add_argument('--index-dir', default='similarity_index')
+    parser.add_argument('--leaf-size', type=int, default=40)
+    args = parser.parse_args()
+
+    start = datetime.now()
+    index = SimilarPatientIndex.build(args.dataset, args.index_dir, leaf_size=args.leaf_size)
+    elapsed = (datetime.now() - start).total_seconds()
+
+    print(f"Indexed {len(index)} patients into {args.index_dir} in {elapsed:.1f}s")
@@ -1,8 +1,26 @@
+import os
+import json
+import hashlib
 import streamlit as st
 import pandas as pd
 import numpy as np
-from datetime import datetime
+import plotly.express as px
+import plotly.graph_objects as go
+from collections import OrderedDict
 from pdf_generator import MentalHealthPDFGenerator
+from similarity_index import SimilarPatientIndex
+from risk_engine import (RISK_FACTORS, RISK_LEVEL_CUTOFFS, FACTOR_LABELS, LEVEL_ASSETS, DEFAULT_LEVEL_ASSETS,
+                         explain)
+from assessment_result import AssessmentResult
+from scoring_backends import get_backend
+from assessment_store import AssessmentStore, STORE_PATH, MIN_TREND_SPAN_DAYS
+from audit_log import AuditLog, AUDIT_PATH
+from what_if import sensitivity_curves, risk_surface
+
+SIMILARITY_INDEX_DIR = 'similarity_index'
+
+# Assessments kept in each browser session, the oldest dropped first
+SESSION_HISTORY_SIZE = 10
 
 # Page configuration
 st.set_page_config(
@@ -43,47 +61,13 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 class SimpleRiskAssessment:
-    def __init__(self):
-        self.risk_weights = {
-            'phq9_score': 0.20,
-            'gad7_score': 0.15,
-            'hopelessness_score': 0.25,
-            'cssrs_score': 0.30,
-            'previous_suicide_attempts': 0.35,
-            'social_isolation': 0.10,
-            'substance_use': 0.12,
-            'recent_life_events': 0.08,
-            'family_suicide': 0.20,
-            'treatment_compliance': 0.05
-        }
+    def __init__(self, backend=None):
+        # Shared heuristic scorer, chosen by RISK_SCORING_BACKEND unless given
+        self.scoring_backend = get_backend(backend)
     
     def calculate_risk_score(self, patient_data):
         """Calculate risk score based on patient data"""
-        risk_score = 0
-        
-        for factor, weight in self.risk_weights.items():
-            if factor in patient_data:
-                # Normalize values based on their ranges
-                if factor == 'phq9_score':
-                    normalized_value = patient_data[factor] / 27
-                elif factor == 'gad7_score':
-                    normalized_value = patient_data[factor] / 21
-                elif factor == 'hopelessness_score':
-                    normalized_value = patient_data[factor] / 20
-                elif factor == 'cssrs_score':
-                    normalized_value = patient_data[factor] / 25
-                elif factor == 'social_isolation':
-                    normalized_value = patient_data[factor] / 10
-                elif factor == 'substance_use':
-                    normalized_value = patient_data[factor] / 10
-                elif factor == 'recent_life_events':
-                    normalized_value = patient_data[factor] / 8
-                elif factor == 'treatment_compliance':
-                    normalized_value = (100 - patient_data[factor]) / 100
-                else:
-                    normalized_value = min(patient_data[factor] / 5, 1)
-                
-                risk_score += normalized_value * weight
+        risk_score, _ = self.scoring_backend.score_patient(patient_data)
         
         # Add some randomness for realism
         risk_score += np.random.normal(0, 0.05)
@@ -93,48 +77,291 @@ class SimpleRiskAssessment:
     
     def determine_risk_level(self, risk_score):
         """Determine risk level based on score"""
-        if risk_score < 0.2:
+        low_cutoff, moderate_cutoff, high_cutoff = RISK_LEVEL_CUTOFFS
+        if risk_score < low_cutoff:
             return "Low"
-        elif risk_score < 0.4:
+        elif risk_score < moderate_cutoff:
             return "Moderate"
-        elif risk_score < 0.6:
+        elif risk_score < high_cutoff:
             return "High"
         else:
             return "Critical"
     
     def get_recommendations(self, risk_level):
         """Get clinical recommendations based on risk level"""
-        recommendations = {
-            "Low": [
-                "Regular therapy sessions",
-                "Medication management",
-                "Lifestyle recommendations",
-                "Support group referral",
-                "Regular reassessment"
-            ],
-            "Moderate": [
-                "Weekly therapy sessions",
-                "Safety planning",
-                "Medication review",
-                "Family involvement",
-                "Crisis hotline information"
-            ],
-            "High": [
-                "Immediate psychiatric evaluation",
-                "24/7 monitoring or hospitalization",
-                "Crisis intervention team activation",
-                "Remove access to lethal means",
-                "Family/caregiver notification"
-            ],
-            "Critical": [
-                "🚨 IMMEDIATE EMERGENCY INTERVENTION",
-                "Call 911 or emergency services",
-                "24/7 monitoring required",
-                "Psychiatric hospitalization",
-                "Crisis team activation"
-            ]
-        }
-        return recommendations.get(risk_level, ["Consult with mental health professional"])
+        return LEVEL_ASSETS.get(risk_level, DEFAULT_LEVEL_ASSETS)['recommendations']
+
+@st.cache_resource
+def load_similarity_index(index_dir=SIMILARITY_INDEX_DIR):
+    """Load the similar-patient index once per server process"""
+    if not os.path.exists(os.path.join(index_dir, SimilarPatientIndex.META_FILE)):
+        return None
+    return SimilarPatientIndex.load(index_dir)
+
+@st.cache_resource
+def load_assessment_store(path=STORE_PATH):
+    """Open the longitudinal assessment store once per server process"""
+    return AssessmentStore(path)
+
+@st.cache_resource
+def load_audit_log(path=AUDIT_PATH):
+    """Start the audit log writer once per server process; sessions share its queue"""
+    return AuditLog(path)
+
+def render_what_if(patient_data):
+    """Sensitivity curves and a two-factor heatmap for the patient's current inputs"""
+    factor_names = {FACTOR_LABELS[factor]: factor for factor in RISK_FACTORS}
+    mode = st.radio("View", ["Sensitivity curves", "Two-factor heatmap"], horizontal=True)
+    
+    if mode == "Sensitivity curves":
+        selected = st.multiselect("Factors", list(factor_names),
+                                  default=[FACTOR_LABELS['treatment_compliance'], FACTOR_LABELS['social_isolation']])
+        if not selected:
+            return
+        curves = sensitivity_curves(patient_data, [factor_names[label] for label in selected])
+        curves['factor'] = curves['factor'].map(FACTOR_LABELS)
+        fig = px.line(curves, x='value', y='risk_score', facet_col='factor', facet_col_wrap=2,
+                      hover_data=['risk_level'], labels={'value': 'Factor value', 'risk_score': 'Risk score'})
+        fig.update_xaxes(matches=None, showticklabels=True)
+        fig.for_each_annotation(lambda a: a.update(text=a.text.split('=')[-1]))
+        for cutoff in RISK_LEVEL_CUTOFFS:
+            fig.add_hline(y=cutoff, line_dash='dot', line_color='grey')
+        st.plotly_chart(fig, use_container_width=True)
+        st.caption("Dotted lines mark the Moderate, High and Critical cutoffs; other factors stay at the current inputs.")
+    else:
+        col1, col2 = st.columns(2)
+        with col1:
+            x_label = st.selectbox("X factor", list(factor_names),
+                                   index=RISK_FACTORS.index('treatment_compliance'))
+        with col2:
+            y_label = st.selectbox("Y factor", list(factor_names),
+                                   index=RISK_FACTORS.index('social_isolation'))
+        if x_label == y_label:
+            st.warning("Choose two different factors.")
+            return
+        x_factor, y_factor = factor_names[x_label], factor_names[y_label]
+        x_values, y_values, scores, levels = risk_surface(patient_data, x_factor, y_factor)
+        fig = go.Figure(go.Heatmap(x=x_values, y=y_values, z=scores, customdata=levels, zmin=0, zmax=1,
+                                   colorscale='RdYlGn_r', colorbar=dict(title='Risk'),
+                                   hovertemplate=f"{x_label}: %{{x}}<br>{y_label}: %{{y}}<br>"
+                                                 "Risk: %{z:.1%} (%{customdata})<extra></extra>"))
+        fig.add_trace(go.Scatter(x=[patient_data[x_factor]], y=[patient_data[y_factor]], mode='markers',
+                                 marker=dict(symbol='x', size=12, color='black'), name='Current'))
+        fig.update_layout(xaxis_title=x_label, yaxis_title=y_label)
+        st.plotly_chart(fig, use_container_width=True)
+
+def input_key(patient_id, patient_data):
+    """Stable hash of the sidebar inputs; identical inputs share one cached assessment"""
+    payload = json.dumps([patient_id, patient_data], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+def session_assessments():
+    """This session's recent assessments by input key, oldest first"""
+    if 'assessments' not in st.session_state:
+        st.session_state['assessments'] = OrderedDict()
+    return st.session_state['assessments']
+
+def run_assessment(risk_assessor, patient_id, patient_data):
+    """Score, record and build every artifact of one assessment
+    
+    Runs once per distinct set of inputs. The returned entry is all the results section
+    needs, so redrawing it does no scoring, store or audit writes, or report rendering.
+    """
+    # Calculate risk
+    risk_score = risk_assessor.calculate_risk_score(patient_data)
+    risk_level = risk_assessor.determine_risk_level(risk_score)
+    
+    # Per-factor contributions, shared by the chart and every export
+    contributions = explain(patient_data)[0]
+    result = AssessmentResult(risk_score, risk_level, contributions, patient=dict(patient_data),
+                              patient_id=patient_id or None)
+    entry = {
+        'result': result,
+        'recommendations': risk_assessor.get_recommendations(risk_level),
+        'risk_df': pd.DataFrame(list(result.factor_contributions.items()), columns=['Risk Factor', 'Contribution']),
+        'trend': None,
+        'history': None,
+        'neighbours': None
+    }
+    
+    # Every assessment goes to the audit trail; this only queues it
+    load_audit_log().log_assessment(result, backend=risk_assessor.scoring_backend.name)
+    
+    # Record the assessment in the patient's longitudinal history
+    if patient_id:
+        assessment_store = load_assessment_store()
+        entry['trend'] = assessment_store.record(patient_id, result.risk_score, result.risk_level, patient_data,
+                                                 result.assessed_datetime)
+        entry['window'] = assessment_store.window
+        entry['history'] = assessment_store.history(patient_id, limit=50)
+    
+    similarity_index = load_similarity_index()
+    if similarity_index is not None:
+        entry['neighbours'] = similarity_index.query(patient_data, k=10)
+    
+    # Export artifacts
+    entry['csv_data'] = result.report_frame().to_csv(index=False)
+    entry['text_report'] = result.text_report()
+    pdf_generator = MentalHealthPDFGenerator()
+    # The buffer itself is kept and handed to the download button, without a getvalue() copy
+    entry['pdf_buffer'] = pdf_generator.generate_pdf_report(
+        result.patient, result.risk_score, result.risk_level, result.recommendations, result.contributions
+    )
+    return entry
+
+def recent_assessments(assessments):
+    """One row per assessment kept in the session, newest first"""
+    return pd.DataFrame([{
+        'Assessed': entry['result'].assessed_datetime.strftime('%H:%M:%S'),
+        'Patient ID': entry['result'].patient_id or '',
+        'Risk Probability': f"{entry['result'].risk_score:.1%}",
+        'Risk Level': entry['result'].risk_level
+    } for entry in reversed(assessments.values())])
+
+def render_assessment(entry):
+    """Draw the results section from a cached assessment entry"""
+    result = entry['result']
+    patient = result.patient
+    risk_level = result.risk_level
+    stamp = result.assessed_datetime.strftime('%Y%m%d_%H%M%S')
+    
+    # Display results
+    st.markdown('<h2>Risk Assessment Results</h2>', unsafe_allow_html=True)
+    
+    # Metrics
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.metric("Risk Probability", f"{result.risk_score:.1%}")
+    
+    with col2:
+        risk_class = f"risk-{risk_level.lower()}" if risk_level.lower() in ['high', 'moderate', 'low'] else "risk-high"
+        st.markdown(f'<div class="metric-card"><h3>Risk Level</h3><p class="{risk_class}">{risk_level}</p></div>', 
+                   unsafe_allow_html=True)
+    
+    with col3:
+        st.metric("Recommended Action", LEVEL_ASSETS.get(risk_level, DEFAULT_LEVEL_ASSETS)['action'])
+    
+    with col4:
+        st.metric("Assessment Date", result.assessed_datetime.strftime('%Y-%m-%d'))
+    
+    # Patient Summary
+    st.subheader("Patient Summary")
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.markdown("**Demographics**")
+        st.write(f"Age: {patient['age']}")
+        st.write(f"Gender: {patient['gender']}")
+        st.write(f"Ethnicity: {patient['ethnicity']}")
+    
+    with col2:
+        st.markdown("**Clinical Scores**")
+        st.write(f"PHQ-9 (Depression): {patient['phq9_score']}/27")
+        st.write(f"GAD-7 (Anxiety): {patient['gad7_score']}/21")
+        st.write(f"Hopelessness: {patient['hopelessness_score']}/20")
+        st.write(f"CSSRS (Suicide Risk): {patient['cssrs_score']}/25")
+    
+    # Risk Factors Analysis
+    st.subheader("Risk Factors Analysis")
+    
+    # Create a simple bar chart using st.bar_chart
+    st.bar_chart(entry['risk_df'].set_index('Risk Factor'))
+    
+    # Longitudinal risk tracking
+    trend = entry['trend']
+    if trend is not None:
+        st.subheader("Risk History")
+        
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Assessments on Record", trend['assessments'])
+        with col2:
+            st.metric(f"Rolling Mean (last {entry['window']})", f"{trend['rolling_mean']:.1%}")
+        with col3:
+            if trend['slope_per_day'] is None:
+                st.metric("Trend", "n/a", help=f"Shown once assessments span at least {MIN_TREND_SPAN_DAYS:g} day")
+            else:
+                st.metric("Trend", f"{trend['slope_per_day']*100:+.2f} pts/day")
+        
+        history = entry['history']
+        if len(history) > 1:
+            st.line_chart(history.set_index('assessed_at')['risk_score'])
+    
+    # Similar historical patients
+    st.subheader("Similar Historical Patients")
+    
+    neighbours = entry['neighbours']
+    if neighbours is None:
+        st.info("Similar-patient lookup is unavailable. Build the index with `python similarity_index.py`.")
+    else:
+        # Scores are 0-1 like the rest of the app; shown as percentages
+        st.dataframe(neighbours.assign(risk_score=neighbours['risk_score'].map('{:.1%}'.format)), hide_index=True)
+        st.write(f"Crisis events among the {len(neighbours)} most similar patients: "
+                 f"{int(neighbours['crisis_event'].sum())} ({neighbours['crisis_event'].mean():.0%})")
+    
+    # Clinical Recommendations
+    st.subheader("Clinical Recommendations")
+    
+    if risk_level in ["High", "Critical"]:
+        st.error("🚨 **IMMEDIATE ACTION REQUIRED**")
+    elif risk_level == "Moderate":
+        st.warning("⚠️ **ENHANCED MONITORING**")
+    else:
+        st.success("✅ **STANDARD CARE**")
+    
+    for i, rec in enumerate(entry['recommendations'], 1):
+        st.write(f"{i}. {rec}")
+    
+    # Export functionality
+    st.subheader("Export Assessment")
+    
+    # Provide three download options
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        st.download_button(
+            label="📊 Download CSV Report",
+            data=entry['csv_data'],
+            file_name=f"mental_health_assessment_{stamp}.csv",
+            mime="text/csv",
+            help="Download detailed assessment data in CSV format"
+        )
+    
+    with col2:
+        st.download_button(
+            label="📄 Download Text Report",
+            data=entry['text_report'],
+            file_name=f"mental_health_report_{stamp}.txt",
+            mime="text/plain",
+            help="Download comprehensive assessment report in text format"
+        )
+    
+    with col3:
+        st.download_button(
+            label="📋 Download PDF Report",
+            data=entry['pdf_buffer'],
+            file_name=f"mental_health_report_{stamp}.pdf",
+            mime="application/pdf",
+            help="Download professional PDF report with graphs and visualizations"
+        )
+    
+    # Show preview of the report
+    with st.expander("📋 Preview Report"):
+        st.text(entry['text_report'])
+    
+    # Show PDF preview
+    with st.expander("📋 PDF Report Preview"):
+        st.markdown("**PDF Report includes:**")
+        st.markdown("""
+        - 🎯 **Risk Assessment Summary** with gauge chart
+        - 👤 **Complete Patient Information** in organized tables
+        - 📊 **Clinical Assessment Visualization** (radar chart)
+        - 📈 **Risk Factor Analysis** with bar charts
+        - 💡 **Clinical Recommendations** with action items
+        - ⚠️ **Important Notes** and disclaimers
+        """)
+        st.success("✅ PDF report is ready for download with professional formatting and visualizations!")
 
 def main():
     st.markdown('<h1 class="main-header">🧠 Mental Health Risk Assessment System</h1>', unsafe_allow_html=True)
@@ -145,6 +372,7 @@ def main():
     
     # Sidebar for patient information
     st.sidebar.header("Patient Information")
+    patient_id = st.sidebar.text_input("Patient ID (optional)", help="Enter an ID to track this patient's risk over time").strip()
     
     # Demographics
     st.sidebar.subheader("Demographics")
@@ -172,255 +400,50 @@ def main():
     compliance = st.sidebar.slider("Treatment Compliance (%)", 0, 100, 75)
     family_suicide = st.sidebar.checkbox("Family History of Suicide")
     
-    # Assessment button
+    # Create patient data
+    patient_data = {
+        'age': age,
+        'gender': gender,
+        'ethnicity': ethnicity,
+        'phq9_score': phq9_score,
+        'gad7_score': gad7_score,
+        'hopelessness_score': hopelessness_score,
+        'cssrs_score': cssrs_score,
+        'social_isolation': social_isolation,
+        'substance_use': substance_use,
+        'recent_life_events': life_events,
+        'previous_suicide_attempts': previous_attempts,
+        'treatment_compliance': compliance,
+        'family_suicide': int(family_suicide)
+    }
+    
+    # Assessment button: score once per distinct set of inputs; the result is kept in the
+    # session, so reruns from other widgets only redraw it
+    assessments = session_assessments()
+    key = input_key(patient_id, patient_data)
     if st.sidebar.button("Assess Risk", type="primary"):
-        # Create patient data
-        patient_data = {
-            'age': age,
-            'gender': gender,
-            'ethnicity': ethnicity,
-            'phq9_score': phq9_score,
-            'gad7_score': gad7_score,
-            'hopelessness_score': hopelessness_score,
-            'cssrs_score': cssrs_score,
-            'social_isolation': social_isolation,
-            'substance_use': substance_use,
-            'recent_life_events': life_events,
-            'previous_suicide_attempts': previous_attempts,
-            'treatment_compliance': compliance,
-            'family_suicide': int(family_suicide)
-        }
-        
-        # Calculate risk
-        risk_score = risk_assessor.calculate_risk_score(patient_data)
-        risk_level = risk_assessor.determine_risk_level(risk_score)
-        recommendations = risk_assessor.get_recommendations(risk_level)
-        
-        # Display results
-        st.markdown('<h2>Risk Assessment Results</h2>', unsafe_allow_html=True)
-        
-        # Metrics
-        col1, col2, col3, col4 = st.columns(4)
-        
-        with col1:
-            st.metric("Risk Probability", f"{risk_score:.1%}")
-        
-        with col2:
-            risk_class = f"risk-{risk_level.lower()}" if risk_level.lower() in ['high', 'moderate', 'low'] else "risk-high"
-            st.markdown(f'<div class="metric-card"><h3>Risk Level</h3><p class="{risk_class}">{risk_level}</p></div>', 
-                       unsafe_allow_html=True)
-        
-        with col3:
-            if risk_level in ["High", "Critical"]:
-                st.metric("Recommended Action", "Immediate Intervention")
-            elif risk_level == "Moderate":
-                st.metric("Recommended Action", "Close Monitoring")
-            else:
-                st.metric("Recommended Action", "Regular Check-ins")
-        
-        with col4:
-            st.metric("Assessment Date", datetime.now().strftime('%Y-%m-%d'))
-        
-        # Patient Summary
-        st.subheader("Patient Summary")
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.markdown("**Demographics**")
-            st.write(f"Age: {age}")
-            st.write(f"Gender: {gender}")
-            st.write(f"Ethnicity: {ethnicity}")
-        
-        with col2:
-            st.markdown("**Clinical Scores**")
-            st.write(f"PHQ-9 (Depression): {phq9_score}/27")
-            st.write(f"GAD-7 (Anxiety): {gad7_score}/21")
-            st.write(f"Hopelessness: {hopelessness_score}/20")
-            st.write(f"CSSRS (Suicide Risk): {cssrs_score}/25")
-        
-        # Risk Factors Analysis
-        st.subheader("Risk Factors Analysis")
-        
-        risk_factors = {
-            'Depression (PHQ-9)': phq9_score / 27 * 0.20,
-            'Anxiety (GAD-7)': gad7_score / 21 * 0.15,
-            'Hopelessness': hopelessness_score / 20 * 0.25,
-            'Suicide Risk (CSSRS)': cssrs_score / 25 * 0.30,
-            'Previous Attempts': previous_attempts / 5 * 0.35,
-            'Social Isolation': social_isolation / 10 * 0.10,
-            'Substance Use': substance_use / 10 * 0.12,
-            'Life Events': life_events / 8 * 0.08
-        }
-        
-        # Create a simple bar chart using st.bar_chart
-        risk_df = pd.DataFrame(list(risk_factors.items()), columns=['Risk Factor', 'Contribution'])
-        st.bar_chart(risk_df.set_index('Risk Factor'))
-        
-        # Clinical Recommendations
-        st.subheader("Clinical Recommendations")
-        
-        if risk_level in ["High", "Critical"]:
-            st.error("🚨 **IMMEDIATE ACTION REQUIRED**")
-        elif risk_level == "Moderate":
-            st.warning("⚠️ **ENHANCED MONITORING**")
+        if key in assessments:
+            assessments.move_to_end(key)
         else:
-            st.success("✅ **STANDARD CARE**")
-        
-        for i, rec in enumerate(recommendations, 1):
-            st.write(f"{i}. {rec}")
-        
-        # Export functionality
-        st.subheader("Export Assessment")
-        
-        # Create comprehensive report data
-        report_data = {
-            'Assessment_Date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'Risk_Probability': f"{risk_score:.3f}",
-            'Risk_Level': risk_level,
-            'Risk_Percentage': f"{risk_score*100:.1f}%",
-            'Recommended_Action': "Immediate Intervention" if risk_level in ["High", "Critical"] else "Close Monitoring" if risk_level == "Moderate" else "Regular Check-ins",
-            'Age': age,
-            'Gender': gender,
-            'Ethnicity': ethnicity,
-            'PHQ9_Score': phq9_score,
-            'GAD7_Score': gad7_score,
-            'Hopelessness_Score': hopelessness_score,
-            'CSSRS_Score': cssrs_score,
-            'Social_Isolation': social_isolation,
-            'Substance_Use': substance_use,
-            'Recent_Life_Events': life_events,
-            'Previous_Suicide_Attempts': previous_attempts,
-            'Treatment_Compliance': f"{compliance}%",
-            'Family_History_Suicide': "Yes" if family_suicide else "No"
-        }
-        
-        # Add risk factor contributions
-        risk_factors = {
-            'Depression_Contribution': f"{phq9_score / 27 * 0.20:.3f}",
-            'Anxiety_Contribution': f"{gad7_score / 21 * 0.15:.3f}",
-            'Hopelessness_Contribution': f"{hopelessness_score / 20 * 0.25:.3f}",
-            'Suicide_Risk_Contribution': f"{cssrs_score / 25 * 0.30:.3f}",
-            'Previous_Attempts_Contribution': f"{previous_attempts / 5 * 0.35:.3f}",
-            'Social_Isolation_Contribution': f"{social_isolation / 10 * 0.10:.3f}",
-            'Substance_Use_Contribution': f"{substance_use / 10 * 0.12:.3f}",
-            'Life_Events_Contribution': f"{life_events / 8 * 0.08:.3f}"
-        }
-        report_data.update(risk_factors)
-        
-        # Add clinical recommendations
-        recommendations_text = "; ".join(recommendations)
-        report_data['Clinical_Recommendations'] = recommendations_text
-        
-        # Create CSV download
-        report_df = pd.DataFrame([report_data])
-        csv_data = report_df.to_csv(index=False)
-        
-        # Create a more detailed text report
-        text_report = f"""
-MENTAL HEALTH RISK ASSESSMENT REPORT
-====================================
-Assessment Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-
-PATIENT INFORMATION:
-- Age: {age}
-- Gender: {gender}
-- Ethnicity: {ethnicity}
-
-CLINICAL ASSESSMENT:
-- PHQ-9 Score (Depression): {phq9_score}/27
-- GAD-7 Score (Anxiety): {gad7_score}/21
-- Hopelessness Score: {hopelessness_score}/20
-- CSSRS Score (Suicide Risk): {cssrs_score}/25
-
-BEHAVIORAL INDICATORS:
-- Social Isolation: {social_isolation}/10
-- Substance Use: {substance_use}/10
-- Recent Life Events: {life_events}/8
-
-TREATMENT HISTORY:
-- Previous Suicide Attempts: {previous_attempts}
-- Treatment Compliance: {compliance}%
-- Family History of Suicide: {"Yes" if family_suicide else "No"}
-
-RISK ASSESSMENT RESULTS:
-- Risk Probability: {risk_score:.3f} ({risk_score*100:.1f}%)
-- Risk Level: {risk_level}
-- Recommended Action: {"Immediate Intervention" if risk_level in ["High", "Critical"] else "Close Monitoring" if risk_level == "Moderate" else "Regular Check-ins"}
-
-RISK FACTOR CONTRIBUTIONS:
-- Depression (PHQ-9): {phq9_score / 27 * 0.20:.3f}
-- Anxiety (GAD-7): {gad7_score / 21 * 0.15:.3f}
-- Hopelessness: {hopelessness_score / 20 * 0.25:.3f}
-- Suicide Risk (CSSRS): {cssrs_score / 25 * 0.30:.3f}
-- Previous Attempts: {previous_attempts / 5 * 0.35:.3f}
-- Social Isolation: {social_isolation / 10 * 0.10:.3f}
-- Substance Use: {substance_use / 10 * 0.12:.3f}
-- Life Events: {life_events / 8 * 0.08:.3f}
-
-CLINICAL RECOMMENDATIONS:
-{chr(10).join(f"{i+1}. {rec}" for i, rec in enumerate(recommendations))}
-
-IMPORTANT NOTES:
-- This assessment is for clinical reference only
-- All decisions should be made by qualified mental health professionals
-- For emergency situations, contact 911 or emergency services immediately
-- This report should be kept confidential and secure
-
-Generated by Mental Health Risk Assessment System
-        """
-        
-        # Generate PDF report
-        pdf_generator = MentalHealthPDFGenerator()
-        pdf_buffer = pdf_generator.generate_pdf_report(
-            patient_data, risk_score, risk_level, recommendations
-        )
-        
-        # Provide three download options
-        col1, col2, col3 = st.columns(3)
-        
-        with col1:
-            st.download_button(
-                label="📊 Download CSV Report",
-                data=csv_data,
-                file_name=f"mental_health_assessment_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                mime="text/csv",
-                help="Download detailed assessment data in CSV format"
-            )
-        
-        with col2:
-            st.download_button(
-                label="📄 Download Text Report",
-                data=text_report,
-                file_name=f"mental_health_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
-                mime="text/plain",
-                help="Download comprehensive assessment report in text format"
-            )
-        
-        with col3:
-            st.download_button(
-                label="📋 Download PDF Report",
-                data=pdf_buffer.getvalue(),
-                file_name=f"mental_health_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
-                mime="application/pdf",
-                help="Download professional PDF report with graphs and visualizations"
-            )
-        
-        # Show preview of the report
-        with st.expander("📋 Preview Report"):
-            st.text(text_report)
-        
-        # Show PDF preview
-        with st.expander("📋 PDF Report Preview"):
-            st.markdown("**PDF Report includes:**")
-            st.markdown("""
-            - 🎯 **Risk Assessment Summary** with gauge chart
-            - 👤 **Complete Patient Information** in organized tables
-            - 📊 **Clinical Assessment Visualization** (radar chart)
-            - 📈 **Risk Factor Analysis** with bar charts
-            - 💡 **Clinical Recommendations** with action items
-            - ⚠️ **Important Notes** and disclaimers
-            """)
-            st.success("✅ PDF report is ready for download with professional formatting and visualizations!")
+            assessments[key] = run_assessment(risk_assessor, patient_id, patient_data)
+            while len(assessments) > SESSION_HISTORY_SIZE:
+                assessments.popitem(last=False)
+        st.session_state['current_assessment'] = key
+    
+    current_key = st.session_state.get('current_assessment')
+    if current_key in assessments:
+        if current_key != key:
+            st.info("The inputs have changed since this assessment. Click 'Assess Risk' to update it.")
+        render_assessment(assessments[current_key])
+        
+        if len(assessments) > 1:
+            with st.expander("🕘 Recent Assessments"):
+                st.dataframe(recent_assessments(assessments), hide_index=True)
+    
+    # What-if scenarios for the current inputs, evaluated as whole grids so widget changes
+    # here only re-score a few hundred points instead of re-running the assessment
+    with st.expander("🔀 What-If Scenarios"):
+        render_what_if(patient_data)
     
     # Information section
     st.sidebar.markdown("---")
@@ -437,7 +460,7 @@ Generated by Mental Health Risk Assessment System
     """)
     
     # Show sample data if no assessment has been run
-    if 'risk_score' not in locals():
+    if current_key not in assessments:
         st.info("👈 Use the sidebar to enter patient information and click 'Assess Risk' to begin.")
 
 if __name__ == "__main__":
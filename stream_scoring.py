@@ -0,0 +1,364 @@
+import io
+import csv
+import sys
+import json
+import time
+import queue
+import socket
+import argparse
+import threading
+import numpy as np
+from collections import OrderedDict
+from risk_engine import RISK_FACTORS, RISK_LEVELS
+from ingestion import validate_batch
+from scoring_backends import BACKENDS, get_backend
+from cohort_aggregates import CohortAggregator
+
+# Marks the end of the stream on every queue
+_END = object()
+
+
+class StageCounter:
+    """Throughput counters for one pipeline stage"""
+
+    def __init__(self, name):
+        self.name = name
+        self.records = 0
+        self.batches = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.started = time.perf_counter()
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.started
+        return {
+            'stage': self.name,
+            'records': self.records,
+            'batches': self.batches,
+            'errors': self.errors,
+            'records_per_sec': self.records / elapsed if elapsed > 0 else 0.0,
+            'utilization': self.busy_seconds / elapsed if elapsed > 0 else 0.0
+        }
+
+
+def stdin_lines():
+    """Lines from standard input"""
+    for line in sys.stdin:
+        yield line
+
+
+def tail_lines(path, follow=True, poll_interval=0.2, stop_event=None):
+    """Lines from a file, waiting for new ones like `tail -f` when follow is set
+
+    Only complete lines are yielded while following; an unterminated last line is
+    yielded once the end of the file is reached with follow off.
+    """
+    with open(path) as f:
+        partial = ''
+        while stop_event is None or not stop_event.is_set():
+            line = f.readline()
+            if line.endswith('\n'):
+                yield partial + line
+                partial = ''
+            elif line:
+                # The writer is mid-line; hold the fragment until the rest arrives
+                partial += line
+            elif not follow:
+                if partial:
+                    yield partial
+                return
+            else:
+                time.sleep(poll_interval)
+
+
+def socket_lines(host, port):
+    """Lines from clients connecting to a local TCP socket, one connection after another"""
+    with socket.create_server((host, port)) as server:
+        while True:
+            conn, _ = server.accept()
+            with conn, conn.makefile('r') as stream:
+                for line in stream:
+                    yield line
+
+
+def parse_records(lines, fmt='jsonl'):
+    """Turn raw JSON-lines or CSV lines into patient dicts; unparsable lines yield None"""
+    if fmt == 'jsonl':
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                record = None
+            # Valid JSON that is not an object (a number, list, ...) is rejected the same way
+            yield record if isinstance(record, dict) else None
+    else:
+        header = None
+        for line in lines:
+            if not line.strip():
+                continue
+            row = next(csv.reader([line]))
+            if header is None:
+                header = row
+                continue
+            record = dict(zip(header, row))
+            for factor in RISK_FACTORS:
+                try:
+                    record[factor] = float(record[factor])
+                except (KeyError, ValueError):
+                    # Left as-is; schema validation in the score stage reports the problem
+                    pass
+            yield record
+
+
+class StreamingRiskScorer:
+    """Three-stage threaded pipeline: parse -> score micro-batches -> emit records and alerts
+
+    Stages are joined by bounded queues, so a slow consumer blocks the stages upstream
+    (backpressure) rather than letting records pile up in memory. If a stage fails, the
+    others stop and run() re-raises its exception. The last risk level is remembered for
+    the max_tracked_patients most recently seen patients, to alert on level changes.
+    """
+
+    def __init__(self, output, alerts=None, batch_size=1000, batch_timeout=0.05, queue_size=8, on_batch=None,
+                 backend=None, max_tracked_patients=100000):
+        self.output = output
+        self.backend = get_backend(backend)
+        self.alerts = alerts
+        self.on_batch = on_batch
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.parsed = queue.Queue(maxsize=queue_size * batch_size)
+        self.scored = queue.Queue(maxsize=queue_size)
+        self.counters = {name: StageCounter(name) for name in ('parse', 'score', 'emit')}
+        self.max_tracked_patients = max_tracked_patients
+        self.last_levels = OrderedDict()
+        self.error = None
+        self._failed = threading.Event()
+
+    def _fail(self, error):
+        if self.error is None:
+            self.error = error
+        self._failed.set()
+
+    def _put(self, q, item):
+        """Blocking put that gives up once any stage has failed"""
+        while True:
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                if self._failed.is_set():
+                    return
+
+    def _get(self, q):
+        """Blocking get that returns _END once any stage has failed"""
+        while True:
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                if self._failed.is_set():
+                    return _END
+
+    def _parse_stage(self, records):
+        try:
+            self._parse_records(records)
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            self._put(self.parsed, _END)
+
+    def _parse_records(self, records):
+        counter = self.counters['parse']
+        records = iter(records)
+        while not self._failed.is_set():
+            # Busy time includes waiting on the source, since parsing happens while reading
+            start = time.perf_counter()
+            record = next(records, _END)
+            counter.busy_seconds += time.perf_counter() - start
+            if record is _END:
+                break
+            if record is None:
+                counter.errors += 1
+                continue
+            counter.records += 1
+            self._put(self.parsed, record)
+
+    def _next_batch(self):
+        """Collect up to batch_size records, waiting at most batch_timeout after the first"""
+        batch = [self._get(self.parsed)]
+        if batch[0] is _END:
+            return [], True
+        deadline = time.perf_counter() + self.batch_timeout
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                record = self.parsed.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if record is _END:
+                return batch, True
+            batch.append(record)
+        return batch, False
+
+    def _score_stage(self):
+        try:
+            self._score_batches()
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            self._put(self.scored, _END)
+
+    def _score_batches(self):
+        counter = self.counters['score']
+        finished = False
+        while not finished and not self._failed.is_set():
+            batch, finished = self._next_batch()
+            if not batch:
+                continue
+            start = time.perf_counter()
+            validated = validate_batch(batch, require_columns=False)
+            rejected = []
+            if validated.n_invalid:
+                # Invalid records are reported with their problems rather than scored
+                invalid = np.flatnonzero(~validated.valid)
+                rejected = [{'alert': 'invalid_record', 'errors': validated.row_errors(i), 'record': batch[i]}
+                            for i in invalid]
+                batch = [batch[i] for i in np.flatnonzero(validated.valid)]
+                counter.errors += len(invalid)
+            scores, codes, _ = self.backend.score(validated.valid_matrix())
+            for record, score, code in zip(batch, scores, codes):
+                record['risk_score'] = round(float(score), 4)
+                record['risk_level'] = RISK_LEVELS[code]
+            counter.busy_seconds += time.perf_counter() - start
+            counter.records += len(batch)
+            counter.batches += 1
+            self._put(self.scored, (batch, rejected))
+
+    def _emit_stage(self):
+        try:
+            self._emit_batches()
+        except BaseException as e:
+            self._fail(e)
+
+    def _emit_batches(self):
+        counter = self.counters['emit']
+        while True:
+            item = self._get(self.scored)
+            if item is _END:
+                break
+            batch, rejected = item
+            start = time.perf_counter()
+            lines = []
+            alert_lines = [json.dumps(alert) for alert in rejected]
+            for record in batch:
+                lines.append(json.dumps(record))
+                patient_id = record.get('patient_id')
+                if patient_id is None:
+                    continue
+                previous = self.last_levels.get(patient_id)
+                if previous is not None and previous != record['risk_level']:
+                    alert_lines.append(json.dumps({
+                        'alert': 'risk_level_change',
+                        'patient_id': patient_id,
+                        'previous_level': previous,
+                        'risk_level': record['risk_level'],
+                        'risk_score': record['risk_score']
+                    }))
+                self.last_levels[patient_id] = record['risk_level']
+                self.last_levels.move_to_end(patient_id)
+                if len(self.last_levels) > self.max_tracked_patients:
+                    self.last_levels.popitem(last=False)
+
+            if lines:
+                self.output.write('\n'.join(lines) + '\n')
+                self.output.flush()
+            if alert_lines and self.alerts is not None:
+                self.alerts.write('\n'.join(alert_lines) + '\n')
+                self.alerts.flush()
+            if self.on_batch is not None and batch:
+                self.on_batch(batch)
+
+            counter.busy_seconds += time.perf_counter() - start
+            counter.records += len(batch)
+            counter.batches += 1
+
+    def run(self, records):
+        """Run the pipeline until the record stream ends and return the stage summaries
+
+        Re-raises the first exception of any stage instead of waiting on the others.
+        """
+        threads = [
+            threading.Thread(target=self._parse_stage, args=(records,), daemon=True),
+            threading.Thread(target=self._score_stage, daemon=True),
+            threading.Thread(target=self._emit_stage, daemon=True)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            while thread.is_alive() and not self._failed.is_set():
+                thread.join(0.1)
+        if self.error is not None:
+            raise self.error
+        return [counter.summary() for counter in self.counters.values()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score a live feed of patient assessments")
+    parser.add_argument('source', nargs='?', default='-',
+                        help="'-' for stdin, a file path, or tcp://host:port to listen on a local socket")
+    parser.add_argument('--format', choices=['jsonl', 'csv'], default='jsonl')
+    parser.add_argument('--follow', action='store_true', help="Keep reading as the file grows")
+    parser.add_argument('--output', default='-', help="Scored records (JSON lines), '-' for stdout")
+    parser.add_argument('--alerts', default='-', help="Level-change alerts (JSON lines), '-' for stderr")
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--batch-timeout', type=float, default=0.05)
+    parser.add_argument('--queue-size', type=int, default=8)
+    parser.add_argument('--max-tracked-patients', type=int, default=100000,
+                        help="Patients whose last risk level is remembered for change alerts")
+    parser.add_argument('--aggregates', default=None,
+                        help="Maintain cohort aggregates for the dashboard and snapshot them to this path")
+    parser.add_argument('--snapshot-interval', type=float, default=5.0)
+    parser.add_argument('--backend', choices=list(BACKENDS), default=None,
+                        help="Scoring backend (default: $RISK_SCORING_BACKEND, else numpy)")
+    args = parser.parse_args()
+
+    if args.source == '-':
+        lines = stdin_lines()
+    elif args.source.startswith('tcp://'):
+        host, port = args.source[len('tcp://'):].rsplit(':', 1)
+        lines = socket_lines(host, int(port))
+    else:
+        lines = tail_lines(args.source, follow=args.follow)
+
+    output = sys.stdout if args.output == '-' else open(args.output, 'a', buffering=io.DEFAULT_BUFFER_SIZE * 16)
+    alerts = sys.stderr if args.alerts == '-' else open(args.alerts, 'a')
+
+    on_batch = None
+    if args.aggregates:
+        aggregator = CohortAggregator()
+        last_snapshot = [time.perf_counter()]
+
+        def on_batch(batch):
+            aggregator.update(batch)
+            if time.perf_counter() - last_snapshot[0] >= args.snapshot_interval:
+                aggregator.save(args.aggregates)
+                last_snapshot[0] = time.perf_counter()
+
+    scorer = StreamingRiskScorer(output, alerts, batch_size=args.batch_size, batch_timeout=args.batch_timeout,
+                                 queue_size=args.queue_size, on_batch=on_batch, backend=args.backend,
+                                 max_tracked_patients=args.max_tracked_patients)
+    try:
+        summaries = scorer.run(parse_records(lines, args.format))
+    except KeyboardInterrupt:
+        summaries = [counter.summary() for counter in scorer.counters.values()]
+    if args.aggregates:
+        aggregator.save(args.aggregates)
+
+    for summary in summaries:
+        print(f"{summary['stage']}: {summary['records']:,} records, {summary['batches']:,} batches, "
+              f"{summary['errors']:,} errors, {summary['records_per_sec']:,.0f} records/sec, "
+              f"{summary['utilization']:.0%} busy", file=sys.stderr)
@@ -0,0 +1,26 @@
+import pandas as pd
+from assessment_result import AssessmentBatch
+from risk_engine import RISK_FACTORS, feature_matrix
+
+PATIENTS = pd.DataFrame([
+    dict({factor: 2 for factor in RISK_FACTORS}, patient_id='a', age=40, gender='Female', ethnicity='Asian'),
+    dict({factor: 5 for factor in RISK_FACTORS}, patient_id='b', age=61, gender='Male', ethnicity='White')
+])
+
+
+def test_batch_items_keep_their_inputs():
+    item = AssessmentBatch.score(PATIENTS)[1]
+    assert item.patient_id == 'b'
+    assert '- Age: 61' in item.text_report()
+    row = item.report_frame().iloc[0]
+    assert row['Age'] == 61 and row['Gender'] == 'Male'
+
+
+def test_items_of_a_matrix_batch_and_concat():
+    item = AssessmentBatch.score(feature_matrix(PATIENTS))[0]
+    assert item.patient['phq9_score'] == 2
+    assert '- Age: N/A' in item.text_report()
+
+    batch = AssessmentBatch.concat([AssessmentBatch.score(PATIENTS), AssessmentBatch.score(PATIENTS)])
+    assert batch[3].patient['age'] == 61
+    assert len(batch.report_frame()) == 4
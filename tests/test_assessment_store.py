@@ -0,0 +1,50 @@
+import sqlite3
+import numpy as np
+from datetime import datetime, timedelta
+from assessment_store import AssessmentStore
+
+START = datetime(2024, 1, 1, 9, 0)
+
+
+def test_slope_matches_least_squares(tmp_path):
+    store = AssessmentStore(str(tmp_path / 'store.db'))
+    days = np.array([0, 0.5, 3, 7.25, 8, 15])
+    scores = np.array([0.30, 0.35, 0.32, 0.45, 0.41, 0.55])
+    for day, score in zip(days, scores):
+        trend = store.record('p1', score, 'Moderate', assessed_at=START + timedelta(days=float(day)))
+    assert trend['assessments'] == 6
+    assert abs(trend['slope_per_day'] - np.polyfit(days, scores, 1)[0]) < 1e-12
+    assert abs(trend['mean'] - scores.mean()) < 1e-12
+    assert abs(trend['rolling_mean'] - scores[-5:].mean()) < 1e-12
+
+
+def test_no_slope_until_visits_span_a_day(tmp_path):
+    store = AssessmentStore(str(tmp_path / 'store.db'))
+    store.record('p1', 0.2, 'Moderate', assessed_at=START)
+    trend = store.record('p1', 0.5, 'High', assessed_at=START + timedelta(seconds=5))
+    assert trend['slope_per_day'] is None
+    trend = store.record('p1', 0.4, 'High', assessed_at=START + timedelta(days=2))
+    assert trend['slope_per_day'] is not None and abs(trend['slope_per_day']) < 1
+
+
+def test_old_raw_sum_trends_are_rebuilt(tmp_path):
+    path = str(tmp_path / 'store.db')
+    with sqlite3.connect(path) as conn:
+        conn.executescript("""
+            CREATE TABLE assessments (id INTEGER PRIMARY KEY, patient_id TEXT NOT NULL, assessed_at REAL NOT NULL,
+                                      risk_score REAL NOT NULL, risk_level TEXT NOT NULL, inputs TEXT);
+            CREATE TABLE patient_trends (patient_id TEXT PRIMARY KEY, n INTEGER NOT NULL, first_at REAL NOT NULL,
+                                         last_at REAL NOT NULL, last_score REAL NOT NULL, last_level TEXT NOT NULL,
+                                         window_sum REAL NOT NULL, sum_t REAL NOT NULL, sum_tt REAL NOT NULL,
+                                         sum_y REAL NOT NULL, sum_ty REAL NOT NULL);
+        """)
+        conn.executemany("INSERT INTO assessments (patient_id, assessed_at, risk_score, risk_level) VALUES (?, ?, ?, ?)",
+                         [('p1', (START + timedelta(days=day)).timestamp(), score, 'Low')
+                          for day, score in [(0, 0.1), (2, 0.2), (4, 0.3)]])
+
+    store = AssessmentStore(path)
+    trend = store.trend('p1')
+    assert trend['assessments'] == 3
+    assert abs(trend['slope_per_day'] - 0.05) < 1e-12
+    trend = store.record('p1', 0.4, 'Moderate', assessed_at=START + timedelta(days=6))
+    assert abs(trend['slope_per_day'] - 0.05) < 1e-12
@@ -0,0 +1,65 @@
+import threading
+from audit_log import AuditLog, read_audit_log, _STOP
+
+
+def test_failed_write_is_retried(tmp_path):
+    path = str(tmp_path / 'audit.jsonl')
+    with AuditLog(path, flush_interval=0.01, retry_backoff=0.001) as audit:
+        write = audit._sink.write
+        attempts = []
+
+        def flaky(records):
+            attempts.append(len(records))
+            if len(attempts) < 3:
+                raise OSError('disk busy')
+            write(records)
+
+        audit._sink.write = flaky
+        audit.record(patient_id='p1', risk_score=0.5, risk_level='High')
+        audit.flush()
+        assert len(attempts) == 3
+        assert audit.stats()['failed'] == 0
+    assert read_audit_log(path)['patient_id'].tolist() == ['p1']
+
+
+def test_abandoned_batch_is_counted_and_writer_stays_alive(tmp_path):
+    path = str(tmp_path / 'audit.jsonl')
+    with AuditLog(path, flush_interval=0.01, write_retries=2, retry_backoff=0.001) as audit:
+        def fail(records):
+            raise KeyError('sink failed')
+
+        write = audit._sink.write
+        audit._sink.write = fail
+        audit.record(patient_id='p1', risk_score=0.5, risk_level='High')
+        audit.flush()
+        assert isinstance(audit.error, KeyError)
+        stats = audit.stats()
+        assert stats['writer_alive']
+        assert stats['failed'] == 1 and stats['written'] == 0
+
+        audit._sink.write = write
+        audit.record(patient_id='p2', risk_score=0.1, risk_level='Low')
+        audit.flush()
+        assert audit.stats()['written'] == 1 and audit.stats()['failed'] == 1
+    assert read_audit_log(path)['patient_id'].tolist() == ['p2']
+
+
+def test_dead_writer_does_not_block(tmp_path):
+    audit = AuditLog(str(tmp_path / 'audit.jsonl'), max_queue=2, block_timeout=30)
+    # Stop the writer thread as if it had died
+    audit._queue.put(_STOP)
+    audit._thread.join(5)
+    assert not audit._thread.is_alive()
+
+    finished = threading.Event()
+
+    def use():
+        for i in range(5):
+            audit.record(patient_id=i)
+        audit.flush()
+        audit.close()
+        finished.set()
+
+    threading.Thread(target=use, daemon=True).start()
+    assert finished.wait(5)
+    assert audit.dropped == 5
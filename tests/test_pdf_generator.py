@@ -0,0 +1,84 @@
+import io
+import re
+from concurrent.futures import ThreadPoolExecutor
+from pdf_generator import MentalHealthPDFGenerator
+from risk_engine import RECOMMENDATIONS
+
+PATIENT = {
+    'age': 35,
+    'gender': 'Female',
+    'ethnicity': 'White',
+    'phq9_score': 15,
+    'gad7_score': 12,
+    'hopelessness_score': 8,
+    'cssrs_score': 6,
+    'social_isolation': 6,
+    'substance_use': 4,
+    'recent_life_events': 3,
+    'previous_suicide_attempts': 1,
+    'treatment_compliance': 70,
+    'family_suicide': 0
+}
+
+
+def _is_pdf(buffer):
+    return buffer.getvalue().startswith(b'%PDF')
+
+
+def test_custom_recommendations_then_standard_report():
+    # A longer recommendation list flows differently; later reports must not inherit its layout
+    custom = RECOMMENDATIONS['High'] + ['extra rec 0', 'extra rec 1']
+    assert _is_pdf(MentalHealthPDFGenerator().generate_pdf_report(PATIENT, 0.5, 'High', custom))
+    assert _is_pdf(MentalHealthPDFGenerator().generate_pdf_report(PATIENT, 0.5, 'High', RECOMMENDATIONS['High']))
+
+
+def test_repeated_reports_from_one_generator():
+    generator = MentalHealthPDFGenerator()
+    for level, score in [('Low', 0.1), ('Critical', 0.8), ('Low', 0.1)]:
+        assert _is_pdf(generator.generate_pdf_report(PATIENT, score, level, RECOMMENDATIONS[level]))
+
+
+def test_concurrent_reports():
+    # Charts are drawn on private Figures, so threads do not share pyplot state
+    def report(i):
+        level, score = [('Low', 0.1), ('High', 0.5), ('Critical', 0.8)][i % 3]
+        patient = dict(PATIENT, phq9_score=i % 28)
+        return _is_pdf(MentalHealthPDFGenerator().generate_pdf_report(patient, score, level, RECOMMENDATIONS[level]))
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        assert all(pool.map(report, range(12)))
+
+
+def _page_count(pdf):
+    return int(re.search(rb'/Count (\d+) /Kids', pdf).group(1))
+
+
+def test_combined_report_concatenates_patient_reports():
+    generator = MentalHealthPDFGenerator()
+    patients = [{'patient_data': dict(PATIENT, phq9_score=i), 'risk_score': score, 'risk_level': level,
+                 'recommendations': RECOMMENDATIONS[level]}
+                for i, (level, score) in enumerate([('Low', 0.1), ('High', 0.5), ('Critical', 0.8)])]
+    single_pages = sum(_page_count(generator.generate_pdf_report(
+        p['patient_data'], p['risk_score'], p['risk_level'], p['recommendations']).getvalue()) for p in patients)
+
+    output = io.BytesIO()
+    assert generator.generate_combined_report(iter(patients), output) == 3
+    pdf = output.getvalue()
+    assert pdf.startswith(b'%PDF') and pdf.endswith(b'%%EOF\n')
+    assert _page_count(pdf) == single_pages
+
+    # Every xref entry points at the object it names
+    xref_at = int(pdf[pdf.rindex(b'startxref') + 9:].split()[0])
+    entries = pdf[xref_at:pdf.index(b'trailer', xref_at)].split(b'\n')[3:-1]
+    for number, entry in enumerate(entries, 1):
+        offset = int(entry.split()[0])
+        assert pdf[offset:].startswith(b'%d 0 obj' % number)
+
+
+def test_chart_cache_is_bounded_by_bytes():
+    generator = MentalHealthPDFGenerator()
+    generator.CHART_CACHE_BYTES = 100000
+    for i in range(6):
+        generator.generate_pdf_report(dict(PATIENT, phq9_score=i), 0.1 * i, 'High', RECOMMENDATIONS['High'])
+    assert generator._chart_cache_bytes == sum(png.nbytes for png in generator._chart_cache.values())
+    assert generator._chart_cache_bytes <= 100000 or len(generator._chart_cache) == 1
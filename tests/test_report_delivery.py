@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from report_delivery import DeliveryQueue, DeliveryError, HTTPStandInDestination
+
+
+def test_pending_reports_pages_through_the_backlog(tmp_path):
+    queue = DeliveryQueue(str(tmp_path / 'queue.db'))
+    for i in range(25):
+        queue.enqueue(f"report_{i:02d}", {'i': i}, ['dir', 'http'])
+    queue.update('report_03', 'dir', 'delivered')
+    queue.update('report_03', 'http', 'delivered')
+
+    seen = []
+    for report_id, payload, _, destinations in queue.pending_reports(page_size=4):
+        seen.append(report_id)
+        assert payload == {'i': int(report_id[-2:])}
+        assert sorted(destinations) == ['dir', 'http']
+        # Deliveries finishing mid-iteration do not disturb the paging
+        if report_id == 'report_05':
+            queue.update('report_20', 'dir', 'delivered')
+            queue.update('report_20', 'http', 'delivered')
+    queue.close()
+
+    assert seen == [f"report_{i:02d}" for i in range(25) if i not in (3, 20)]
+
+
+def test_enqueue_many_queues_every_destination(tmp_path):
+    queue = DeliveryQueue(str(tmp_path / 'queue.db'))
+    queue.enqueue_many([(f"report_{i}", {'i': i}) for i in range(10)], ['dir', 'http'])
+    queue.enqueue_many([("report_0", {'i': 99})], ['dir'])
+
+    reports, after = queue.pending_page()
+    counts = queue.counts()
+    queue.close()
+
+    assert after is None
+    assert len(reports) == 10 and reports[0][1] == {'i': 0}
+    assert counts == {'dir': {'pending': 10}, 'http': {'pending': 10}}
+
+
+def test_malformed_http_status_is_a_delivery_error(tmp_path):
+    spool_path = tmp_path / 'report.pdf'
+    spool_path.write_bytes(b'%PDF-')
+
+    async def handle(reader, writer):
+        await reader.readuntil(b'\r\n\r\n')
+        await reader.readexactly(5)
+        writer.write(b"garbage\r\n\r\n")
+        await writer.drain()
+        writer.close()
+
+    async def deliver():
+        server = await asyncio.start_server(handle, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        destination = HTTPStandInDestination(f"http://127.0.0.1:{port}/reports")
+        try:
+            await destination.deliver('report_1', str(spool_path), 'High')
+        finally:
+            await destination.close()
+            server.close()
+            await server.wait_closed()
+
+    with pytest.raises(DeliveryError, match='malformed'):
+        asyncio.run(deliver())
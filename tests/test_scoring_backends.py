@@ -0,0 +1,134 @@
+import numpy as np
+import pytest
+from demo_model import SimpleMentalHealthDemo
+from risk_engine import RISK_FACTORS, RISK_LEVELS, RISK_LEVEL_CUTOFFS, heuristic_scores, risk_level_codes
+from scoring_backends import (BACKENDS, PythonBackend, FusedBackend, parity_matrix, check_parity,
+                              _fused_rows, _fused_blocks, _WEIGHTS, _SCALES, _INVERTED, _CAPPED, _CUTOFFS)
+
+COLUMNS = {factor: j for j, factor in enumerate(RISK_FACTORS)}
+
+
+def _row(**values):
+    # Full compliance contributes nothing, so the other factors alone set the score
+    row = np.zeros(len(RISK_FACTORS))
+    row[COLUMNS['treatment_compliance']] = 100
+    for factor, value in values.items():
+        row[COLUMNS[factor]] = value
+    return row
+
+
+def edge_matrix():
+    """Rows scoring exactly on each cutoff, out-of-range values and missing (NaN) values"""
+    rows = [
+        _row(),                              # 0.0
+        _row(phq9_score=27),                 # exactly 0.2
+        _row(hopelessness_score=32),         # exactly 0.4
+        _row(hopelessness_score=48),         # exactly 0.6
+        _row(phq9_score=26),                 # just below 0.2
+        _row(cssrs_score=25, phq9_score=27, hopelessness_score=20, previous_suicide_attempts=5),
+        _row(phq9_score=-10),                # clamps to 0
+        _row(phq9_score=500, cssrs_score=500),  # clamps to 1
+        _row(previous_suicide_attempts=9, family_suicide=7),  # capped factors past their scale
+        _row(treatment_compliance=-50),      # inverted factor out of range
+        _row(treatment_compliance=150),
+        _row(phq9_score=13.5, gad7_score=0.25),
+        _row(phq9_score=np.nan),
+        np.full(len(RISK_FACTORS), np.nan)
+    ]
+    return np.array(rows)
+
+
+def _backend(name):
+    try:
+        return BACKENDS[name]()
+    except ImportError as e:
+        pytest.skip(str(e))
+
+
+@pytest.fixture(scope='module')
+def reference():
+    matrix = np.vstack([edge_matrix(), parity_matrix(2000)])
+    return matrix, PythonBackend().score(matrix)
+
+
+@pytest.mark.parametrize('name', list(BACKENDS))
+def test_backend_matches_reference(name, reference):
+    matrix, (ref_scores, ref_codes, ref_contributions) = reference
+    scores, codes, contributions = _backend(name).score(matrix)
+    assert scores.dtype == np.float64 and codes.dtype == np.int8
+    np.testing.assert_allclose(scores, ref_scores, rtol=0, atol=1e-12)
+    np.testing.assert_allclose(contributions, ref_contributions, rtol=0, atol=1e-12)
+    np.testing.assert_array_equal(codes, ref_codes)
+
+
+@pytest.mark.parametrize('name', list(BACKENDS))
+def test_score_levels_matches_score(name, reference):
+    matrix, (ref_scores, ref_codes, _) = reference
+    scores, codes = _backend(name).score_levels(matrix)
+    np.testing.assert_allclose(scores, ref_scores, rtol=0, atol=1e-12)
+    np.testing.assert_array_equal(codes, ref_codes)
+
+
+@pytest.mark.parametrize('name', list(BACKENDS))
+def test_cutoff_rows_take_the_upper_level(name):
+    scores, codes, _ = _backend(name).score(edge_matrix()[:4])
+    assert scores.tolist() == [0.0] + list(RISK_LEVEL_CUTOFFS)
+    assert codes.tolist() == [0, 1, 2, 3]
+
+
+def test_check_parity_reports_ok():
+    assert all(result['ok'] for result in check_parity(parity_matrix(2000)).values())
+
+
+def test_risk_engine_matches_reference(reference):
+    matrix, (ref_scores, ref_codes, _) = reference
+    scores = heuristic_scores(matrix)
+    np.testing.assert_allclose(scores, ref_scores, rtol=0, atol=1e-12)
+    np.testing.assert_array_equal(risk_level_codes(scores), ref_codes)
+
+
+def test_level_codes_match_determine_risk_level():
+    values = [0.0, 1.0, np.nan]
+    for cutoff in RISK_LEVEL_CUTOFFS:
+        values += [np.nextafter(cutoff, 0), cutoff, np.nextafter(cutoff, 1)]
+    demo = SimpleMentalHealthDemo()
+    expected = [RISK_LEVELS.index(demo.determine_risk_level(value)) for value in values]
+    assert risk_level_codes(np.array(values)).tolist() == expected
+
+
+def test_fused_kernel_loop_and_numpy_fallback(reference):
+    # The kernel source runs as plain Python here, so its logic is covered even without numba
+    matrix, (ref_scores, ref_codes, ref_contributions) = reference
+    n, k = matrix.shape
+    for write_contributions in (True, False):
+        scores, codes, contributions = np.empty(n), np.empty(n, dtype=np.int8), np.empty((n, k))
+        _fused_rows(matrix, _WEIGHTS, _SCALES, _INVERTED, _CAPPED, _CUTOFFS, scores, codes, contributions,
+                    write_contributions)
+        np.testing.assert_allclose(scores, ref_scores, rtol=0, atol=1e-12)
+        np.testing.assert_array_equal(codes, ref_codes)
+        if write_contributions:
+            np.testing.assert_allclose(contributions, ref_contributions, rtol=0, atol=1e-12)
+
+    # Small blocks so the fallback crosses several block boundaries
+    for contributions in (np.empty((n, k)), None):
+        scores, codes = np.empty(n), np.empty(n, dtype=np.int8)
+        _fused_blocks(matrix, scores, codes, contributions, block_rows=7)
+        np.testing.assert_allclose(scores, ref_scores, rtol=0, atol=1e-12)
+        np.testing.assert_array_equal(codes, ref_codes)
+
+
+def test_fused_backend_accepts_float32_and_integer_input():
+    matrix = parity_matrix(500)
+    for converted in (matrix.astype(np.float32), matrix.round().astype(np.int64)):
+        ref_scores, ref_codes, _ = PythonBackend().score(converted.astype(np.float64))
+        scores, codes, _ = FusedBackend().score(converted)
+        np.testing.assert_allclose(scores, ref_scores, rtol=0, atol=1e-12)
+        np.testing.assert_array_equal(codes, ref_codes)
+
+
+def test_numba_kernel_matches_reference(reference):
+    pytest.importorskip('numba')
+    matrix, (ref_scores, ref_codes, _) = reference
+    scores, codes, _ = BACKENDS['numba']().score(matrix)
+    np.testing.assert_allclose(scores, ref_scores, rtol=0, atol=1e-12)
+    np.testing.assert_array_equal(codes, ref_codes)
@@ -0,0 +1,13 @@
+from data_generator import MentalHealthDataGenerator
+from similarity_index import SimilarPatientIndex
+
+
+def test_neighbour_scores_use_the_app_scale(tmp_path):
+    cohort = MentalHealthDataGenerator(seed=7).generate_dataset(500)
+    SimilarPatientIndex.build(cohort, str(tmp_path))
+    index = SimilarPatientIndex.load(str(tmp_path))
+
+    neighbours = index.query(cohort.iloc[0].to_dict(), k=5)
+    assert neighbours['patient_id'].iloc[0] == cohort['patient_id'].iloc[0]
+    assert neighbours['risk_score'].between(0, 1).all()
+    assert abs(neighbours['risk_score'].iloc[0] - cohort['risk_score'].iloc[0] / 100) < 1e-6
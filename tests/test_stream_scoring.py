@@ -0,0 +1,59 @@
+import io
+import json
+import threading
+import pytest
+from risk_engine import RISK_FACTORS
+from stream_scoring import StreamingRiskScorer, parse_records, tail_lines
+
+RECORD = dict({factor: 1 for factor in RISK_FACTORS}, patient_id='p1')
+
+
+def test_non_object_json_is_rejected():
+    lines = ['5\n', '[1]\n', '"text"\n', '{bad\n', json.dumps(RECORD) + '\n']
+    output = io.StringIO()
+    summaries = StreamingRiskScorer(output).run(parse_records(lines))
+    assert summaries[0]['errors'] == 4
+    assert len(output.getvalue().splitlines()) == 1
+
+
+def test_stage_failure_is_raised_from_run():
+    def fail(batch):
+        raise RuntimeError("emit failed")
+
+    lines = [json.dumps(RECORD) + '\n'] * 5000
+    scorer = StreamingRiskScorer(io.StringIO(), batch_size=10, queue_size=1, on_batch=fail)
+    with pytest.raises(RuntimeError, match="emit failed"):
+        scorer.run(parse_records(lines))
+
+
+def test_score_failure_is_raised_from_run(monkeypatch):
+    scorer = StreamingRiskScorer(io.StringIO())
+
+    def fail(matrix):
+        raise ValueError("score failed")
+
+    monkeypatch.setattr(scorer.backend, 'score', fail)
+    with pytest.raises(ValueError, match="score failed"):
+        scorer.run(parse_records([json.dumps(RECORD) + '\n'] * 100))
+
+
+def test_tail_holds_partial_lines_until_complete(tmp_path):
+    path = tmp_path / 'feed.jsonl'
+    path.write_text('{"a": 1}\n{"b":')
+    stop = threading.Event()
+    lines = tail_lines(str(path), poll_interval=0.01, stop_event=stop)
+    assert next(lines) == '{"a": 1}\n'
+    with open(path, 'a') as f:
+        f.write(' 2}\n')
+    assert next(lines) == '{"b": 2}\n'
+    stop.set()
+
+    path.write_text('{"a": 1}\n{"b": 2}')
+    assert list(tail_lines(str(path), follow=False)) == ['{"a": 1}\n', '{"b": 2}']
+
+
+def test_level_memory_is_bounded():
+    records = [dict(RECORD, patient_id=f"p{i}") for i in range(50)]
+    scorer = StreamingRiskScorer(io.StringIO(), max_tracked_patients=10)
+    scorer.run(parse_records([json.dumps(record) + '\n' for record in records]))
+    assert list(scorer.last_levels) == [f"p{i}" for i in range(40, 50)]
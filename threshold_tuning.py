@@ -0,0 +1,205 @@
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from itertools import combinations
+from concurrent.futures import ProcessPoolExecutor
+from risk_engine import (RISK_FACTORS, RISK_LEVELS, RISK_LEVEL_CUTOFFS, OUTCOME_RISK_CUTOFFS,
+                         feature_matrix)
+from shared_features import SharedArrays
+from scoring_backends import get_backend
+
+# Shared-memory arrays of each pool worker, attached once per process by _init_worker
+_worker_state = {}
+
+
+class SortedOutcomes:
+    """Scores sorted once with cumulative positive counts, for O(log n) confusion counts"""
+
+    def __init__(self, scores, labels):
+        order = np.argsort(scores, kind='stable')
+        self.scores = np.asarray(scores, dtype=np.float64)[order]
+        # cum_positives[i] = number of crisis events among the i lowest scores
+        self.cum_positives = np.concatenate(([0], np.cumsum(np.asarray(labels)[order], dtype=np.int64)))
+        self.n = len(self.scores)
+        self.positives = int(self.cum_positives[-1])
+
+    def counts_below(self, thresholds):
+        """Rows and crisis events with score strictly below each threshold"""
+        n_below = np.searchsorted(self.scores, thresholds, side='left')
+        return n_below, self.cum_positives[n_below]
+
+    def confusion(self, thresholds):
+        """TP/FP/FN/TN when flagging score >= threshold, for every threshold at once"""
+        n_below, pos_below = self.counts_below(np.asarray(thresholds, dtype=np.float64))
+        tp = self.positives - pos_below
+        fp = (self.n - n_below) - tp
+        fn = pos_below
+        tn = n_below - pos_below
+        return tp, fp, fn, tn
+
+
+def sweep_thresholds(scores, labels, thresholds):
+    """Binary classification metrics for every threshold in one sorted pass"""
+    outcomes = SortedOutcomes(scores, labels)
+    tp, fp, fn, tn = outcomes.confusion(thresholds)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tpr = tp / (tp + fn)
+        fpr = fp / (fp + tn)
+        precision = np.where(tp + fp > 0, tp / (tp + fp), np.nan)
+
+    return pd.DataFrame({
+        'threshold': thresholds,
+        'tp': tp, 'fp': fp, 'fn': fn, 'tn': tn,
+        'tpr': tpr, 'fpr': fpr, 'precision': precision,
+        'youden_j': tpr - fpr
+    })
+
+
+def evaluate_threshold_sets(outcomes, threshold_sets, min_level_share=0.01):
+    """Score candidate (low, moderate, high) cutoff sets against crisis outcomes
+
+    The objective is the mean Youden's J of the three cutoffs used as intervention
+    boundaries. A set is feasible only if every level holds at least min_level_share of
+    patients and the crisis rate does not decrease from Low to Critical.
+    """
+    threshold_sets = np.asarray(threshold_sets, dtype=np.float64)
+    m = len(threshold_sets)
+
+    # Counts below every cutoff, with 0 and n added as the outer edges of the levels
+    n_below, pos_below = outcomes.counts_below(threshold_sets.ravel())
+    n_below = n_below.reshape(m, 3)
+    pos_below = pos_below.reshape(m, 3)
+    edges_n = np.hstack([np.zeros((m, 1), dtype=np.int64), n_below, np.full((m, 1), outcomes.n)])
+    edges_pos = np.hstack([np.zeros((m, 1), dtype=np.int64), pos_below, np.full((m, 1), outcomes.positives)])
+    level_n = np.diff(edges_n, axis=1)
+    level_pos = np.diff(edges_pos, axis=1)
+
+    negatives = outcomes.n - outcomes.positives
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tpr = (outcomes.positives - pos_below) / outcomes.positives
+        fpr = ((outcomes.n - n_below) - (outcomes.positives - pos_below)) / negatives
+        level_rate = level_pos / level_n
+
+    objective = (tpr - fpr).mean(axis=1)
+    feasible = (level_n > 0).all(axis=1) & (level_n >= min_level_share * outcomes.n).all(axis=1)
+    with np.errstate(invalid='ignore'):
+        feasible &= (np.diff(level_rate, axis=1) >= 0).all(axis=1)
+    return objective, feasible, level_n, level_rate
+
+
+def candidate_threshold_sets(grid):
+    """All strictly increasing (low, moderate, high) cutoff triples from a grid"""
+    return np.array(list(combinations(np.unique(grid), 3)), dtype=np.float64)
+
+
+def _init_worker(handle, min_level_share):
+    _worker_state.update(shared=SharedArrays.attach(handle), min_level_share=min_level_share)
+
+
+def _evaluate_fold(bounds):
+    """Objective of every candidate set on one held-out fold, a slice of the shared permutation"""
+    shared = _worker_state['shared']
+    fold_indices = shared['permutation'][bounds[0]:bounds[1]]
+    outcomes = SortedOutcomes(shared['scores'][fold_indices], shared['labels'][fold_indices])
+    objective, feasible, _, _ = evaluate_threshold_sets(outcomes, shared['threshold_sets'],
+                                                        _worker_state['min_level_share'])
+    return objective, feasible
+
+
+def tune_thresholds(scores, labels, grid, n_folds=5, workers=None, min_level_share=0.01, seed=42):
+    """Cross-validate every candidate cutoff set in parallel and return the ranking
+
+    Scores, labels, candidate sets and the fold permutation are placed in shared memory
+    once; workers attach to them instead of each receiving a pickled copy, and every task
+    is just the (start, end) bounds of its fold.
+    """
+    threshold_sets = candidate_threshold_sets(grid)
+    permutation = np.random.RandomState(seed).permutation(len(scores))
+    # Same fold sizes as np.array_split: the first len % n_folds folds get one extra row
+    sizes = [len(scores) // n_folds + (i < len(scores) % n_folds) for i in range(n_folds)]
+    edges = np.concatenate(([0], np.cumsum(sizes)))
+
+    with SharedArrays.from_arrays({
+        'scores': np.asarray(scores, dtype=np.float64),
+        'labels': np.asarray(labels, dtype=np.int8),
+        'threshold_sets': threshold_sets,
+        'permutation': permutation
+    }) as shared:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(shared.handle, min_level_share)) as pool:
+            fold_results = list(pool.map(_evaluate_fold, zip(edges[:-1], edges[1:])))
+
+    fold_objectives = np.vstack([objective for objective, _ in fold_results])
+    # A set must be feasible on every fold to be recommended
+    feasible = np.vstack([feasible for _, feasible in fold_results]).all(axis=0)
+
+    results = pd.DataFrame(threshold_sets, columns=['low_cutoff', 'moderate_cutoff', 'high_cutoff'])
+    results['mean_objective'] = fold_objectives.mean(axis=0)
+    results['std_objective'] = fold_objectives.std(axis=0)
+    results['feasible'] = feasible
+    return results.sort_values(['feasible', 'mean_objective'], ascending=False, ignore_index=True)
+
+
+def level_summary(scores, labels, cutoffs):
+    """Patients and crisis rate per risk level for one cutoff set, plus its objective"""
+    objective, feasible, level_n, level_rate = evaluate_threshold_sets(SortedOutcomes(scores, labels), [cutoffs], 0)
+    return pd.DataFrame({
+        'risk_level': RISK_LEVELS,
+        'patients': level_n[0],
+        'crisis_rate': level_rate[0]
+    }), objective[0], feasible[0]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tune Low/Moderate/High/Critical cutoffs against crisis_event")
+    parser.add_argument('dataset', nargs='?', default='mental_health_dataset.csv',
+                        help="Dataset CSV, or a reference file from shared_features.py to skip parsing")
+    parser.add_argument('--score-column', default=None,
+                        help="Tune an existing score column (e.g. risk_score) instead of the heuristic score")
+    parser.add_argument('--grid-size', type=int, default=101)
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--min-level-share', type=float, default=0.01)
+    args = parser.parse_args()
+
+    if args.dataset.endswith('.features'):
+        reference = SharedArrays.attach(args.dataset)
+        scores, labels = reference['scores'], reference['crisis_event']
+        current_cutoffs = RISK_LEVEL_CUTOFFS
+    elif args.score_column:
+        data = pd.read_csv(args.dataset, usecols=[args.score_column, 'crisis_event'])
+        scores = data[args.score_column].to_numpy(dtype=np.float64)
+        labels = data['crisis_event'].to_numpy(dtype=np.int8)
+        current_cutoffs = OUTCOME_RISK_CUTOFFS if args.score_column == 'risk_score' else None
+    else:
+        data = pd.read_csv(args.dataset, usecols=RISK_FACTORS + ['crisis_event'])
+        scores, _ = get_backend().score_levels(feature_matrix(data))
+        labels = data['crisis_event'].to_numpy(dtype=np.int8)
+        current_cutoffs = RISK_LEVEL_CUTOFFS
+
+    grid = np.linspace(scores.min(), scores.max(), args.grid_size)
+    start = time.perf_counter()
+    results = tune_thresholds(scores, labels, grid, n_folds=args.folds, workers=args.workers,
+                              min_level_share=args.min_level_share)
+    elapsed = time.perf_counter() - start
+
+    print(f"Evaluated {len(results):,} cutoff sets over {args.folds} folds in {elapsed:.1f}s")
+    print("\nTop cutoff sets:")
+    print(results.head(10).to_string(index=False))
+
+    best = results.iloc[0]
+    if not best['feasible']:
+        print("\nNo feasible cutoff set found; try a finer grid or a lower --min-level-share")
+    else:
+        best_cutoffs = tuple(round(float(best[c]), 4) for c in ('low_cutoff', 'moderate_cutoff', 'high_cutoff'))
+        summary, objective, _ = level_summary(scores, labels, best_cutoffs)
+        print(f"\nRecommended cutoffs {best_cutoffs} (objective {objective:.4f}):")
+        print(summary.to_string(index=False))
+
+    if current_cutoffs is not None:
+        summary, objective, feasible = level_summary(scores, labels, current_cutoffs)
+        print(f"\nCurrent cutoffs {current_cutoffs} (objective {objective:.4f}"
+              f"{'' if feasible else ', not monotone or has empty levels'}):")
+        print(summary.to_string(index=False))
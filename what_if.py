@@ -0,0 +1,96 @@
+import argparse
+import numpy as np
+import pandas as pd
+from risk_engine import (RISK_FACTORS, FACTOR_RANGES, feature_matrix, contribution_matrix,
+                         heuristic_scores, risk_levels)
+
+
+def factor_values(factor, points=None):
+    """Grid of values across a factor's input range; every integer step by default"""
+    low, high = FACTOR_RANGES[factor]
+    if points is None:
+        return np.arange(low, high + 1, dtype=np.float64)
+    return np.linspace(low, high, points)
+
+
+def _score_variants(patient, columns, values):
+    """Score copies of one patient with the given columns replaced, all in one vectorized pass"""
+    base = feature_matrix(patient)[0]
+    matrix = np.repeat(base[np.newaxis, :], len(values[0]), axis=0)
+    for column, column_values in zip(columns, values):
+        matrix[:, column] = column_values
+    scores = heuristic_scores(None, contribution_matrix(matrix))
+    return scores, risk_levels(scores)
+
+
+def sensitivity_curves(patient, factors=RISK_FACTORS, points=None):
+    """Risk along each factor's full range, the others held at the patient's values
+
+    The grids of all factors are stacked into one matrix and scored together, so the
+    curves for every factor cost a single engine call.
+    """
+    grids = [factor_values(factor, points) for factor in factors]
+    sizes = [len(grid) for grid in grids]
+    # One row per grid point; each row varies exactly one factor
+    base = feature_matrix(patient)[0]
+    matrix = np.repeat(base[np.newaxis, :], sum(sizes), axis=0)
+    offsets = np.concatenate(([0], np.cumsum(sizes)))
+    for factor, grid, start, end in zip(factors, grids, offsets[:-1], offsets[1:]):
+        matrix[start:end, RISK_FACTORS.index(factor)] = grid
+    scores = heuristic_scores(None, contribution_matrix(matrix))
+
+    return pd.DataFrame({
+        'factor': np.repeat(list(factors), sizes),
+        'value': np.concatenate(grids),
+        'risk_score': scores,
+        'risk_level': risk_levels(scores),
+        'current_value': np.repeat(base[[RISK_FACTORS.index(factor) for factor in factors]], sizes)
+    })
+
+
+def risk_surface(patient, x_factor, y_factor, x_points=None, y_points=None):
+    """Risk over the full grid of two factors, e.g. 101 x 11 points, in one vectorized pass
+
+    Returns (x_values, y_values, scores, levels) with scores and levels shaped (len(y), len(x)),
+    ready for a heatmap.
+    """
+    if x_factor == y_factor:
+        raise ValueError("Choose two different factors for a risk surface")
+    x_values = factor_values(x_factor, x_points)
+    y_values = factor_values(y_factor, y_points)
+    xx, yy = np.meshgrid(x_values, y_values)
+    scores, levels = _score_variants(patient, [RISK_FACTORS.index(x_factor), RISK_FACTORS.index(y_factor)],
+                                     [xx.ravel(), yy.ravel()])
+    shape = (len(y_values), len(x_values))
+    return x_values, y_values, scores.reshape(shape), levels.reshape(shape)
+
+
+def level_boundaries(curves):
+    """Factor values at which each curve crosses into a different risk level"""
+    changed = curves['risk_level'].ne(curves['risk_level'].shift()) & curves['factor'].eq(curves['factor'].shift())
+    return curves.loc[changed, ['factor', 'value', 'risk_level']].reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="What-if risk sweep for one patient")
+    for factor in RISK_FACTORS:
+        parser.add_argument(f"--{factor.replace('_', '-')}", type=float, default=0.0)
+    parser.add_argument('--x', default='treatment_compliance', help="First factor to sweep")
+    parser.add_argument('--y', default='social_isolation', help="Second factor to sweep (heatmap)")
+    args = parser.parse_args()
+
+    patient = {factor: getattr(args, factor) for factor in RISK_FACTORS}
+
+    curves = sensitivity_curves(patient)
+    swing = curves.groupby('factor')['risk_score'].agg(lambda s: s.max() - s.min()).sort_values(ascending=False)
+    print("Risk swing across each factor's range (others held fixed):")
+    for factor, value in swing.items():
+        print(f"  {factor}: {value:.3f}")
+
+    boundaries = level_boundaries(curves)
+    if len(boundaries):
+        print("\nRisk level changes:")
+        print(boundaries.to_string(index=False))
+
+    x_values, y_values, scores, _ = risk_surface(patient, args.x, args.y)
+    print(f"\n{args.x} x {args.y}: {scores.size:,} points, risk {scores.min():.3f} - {scores.max():.3f}")